@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import mimetypes
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from config.firebase_config import bucket
+from config.db_config import init_db_pool, close_db_pool
+from app.services.events import UploadEvent
+from app.services.object_manifest import ObjectManifest
+from app.services.tiering import RateLimiter
+
+# image-rabbit.py isn't importable with a plain import statement
+uploads = importlib.import_module("app.routes.image-rabbit")
+
+logger = logging.getLogger(__name__)
+
+# Backfill Configuration
+BACKFILL_MANIFEST = os.getenv("BACKFILL_MANIFEST", "backfill-manifest.sqlite")
+BACKFILL_RATE = float(os.getenv("BACKFILL_RATE", "50"))
+BACKFILL_PAGE_SIZE = int(os.getenv("BACKFILL_PAGE_SIZE", "500"))
+BACKFILL_REPORT_INTERVAL = float(os.getenv("BACKFILL_REPORT_INTERVAL", "10"))
+
+@dataclass
+class BackfillStats:
+    """Progress counters for one backfill run"""
+    total: int = 0
+    started_at: float = field(default_factory=time.time)
+    published: int = 0
+    missing: int = 0
+
+    @property
+    def elapsed(self) -> float:
+        return max(time.time() - self.started_at, 1e-6)
+
+    def to_dict(self):
+        rate = self.published / self.elapsed
+        remaining = max(self.total - self.published - self.missing, 0)
+        return {
+            "total": self.total,
+            "published": self.published,
+            "missing": self.missing,
+            "remaining": remaining,
+            "events_per_second": round(rate, 1),
+            "eta_seconds": round(remaining / rate) if rate else None,
+        }
+
+async def existing_ids(pool, image_ids: List[str]) -> set:
+    """Ids of the page that still exist; the manifest may hold deleted images"""
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("SELECT id FROM images WHERE id = ANY($1::uuid[])", image_ids)
+    return {str(row["id"]) for row in rows}
+
+def synthetic_event(row, run_id: str) -> UploadEvent:
+    """upload.success payload for an already stored image"""
+    return UploadEvent(
+        event_id=str(uuid.uuid4()),
+        upload_id=run_id,
+        user_id=row["user_id"],
+        group_id=row["group_id"],
+        filename=os.path.basename(row["path"]),
+        original_filename=row["filename"],
+        file_size=row["size"] or 0,
+        content_type=mimetypes.guess_type(row["filename"] or "")[0] or "application/octet-stream",
+        firebase_path=row["path"],
+        public_url=bucket.blob(row["path"]).public_url,
+        success=True,
+        image_id=row["image_id"]
+    )
+
+async def report(stats: BackfillStats, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        logger.info(f"Backfill progress: {stats.to_dict()}")
+
+async def backfill(pool, manifest: ObjectManifest, stage: str, version: int, rate: float = BACKFILL_RATE,
+                   group_id: Optional[str] = None, limit: Optional[int] = None, dry_run: bool = False,
+                   report_interval: float = BACKFILL_REPORT_INTERVAL) -> BackfillStats:
+    """Publish upload.success for every image whose `stage` is older than `version`.
+
+    Nothing is marked here: the consumers record the version once the stage
+    succeeds, and the next manifest sync picks that up. Images whose stage
+    failed stay stale and are offered again by the next run.
+    """
+    run_id = f"backfill-{stage}-v{version}-{uuid.uuid4().hex[:8]}"
+    stats = BackfillStats(total=manifest.count_stale(stage, version, group_id))
+    if limit is not None:
+        stats.total = min(stats.total, limit)
+    logger.info(f"Backfill {run_id}: {stats.total} stale objects")
+
+    limiter = RateLimiter(rate)
+    # Consumers for other stages skip events carrying this header
+    headers = {"backfill_stage": stage, "backfill_version": version}
+    reporter = asyncio.create_task(report(stats, report_interval))
+    after = ""
+
+    try:
+        while stats.published + stats.missing < stats.total:
+            page = manifest.stale(stage, version, group_id, after=after,
+                                  limit=min(BACKFILL_PAGE_SIZE, stats.total - stats.published - stats.missing))
+            if not page:
+                break
+            after = page[-1]["image_id"]
+
+            found = await existing_ids(pool, [row["image_id"] for row in page])
+            missing = [row["image_id"] for row in page if row["image_id"] not in found]
+            if missing:
+                manifest.forget(missing)
+                stats.missing += len(missing)
+
+            for row in page:
+                if row["image_id"] not in found:
+                    continue
+                await limiter.acquire()
+                if not dry_run:
+                    await uploads.publish_event(uploads.ROUTING_KEY_SUCCESS, synthetic_event(row, run_id), headers)
+                stats.published += 1
+    finally:
+        reporter.cancel()
+
+    logger.info(f"Backfill {run_id} finished: {stats.to_dict()}")
+    return stats
+
+async def main(args):
+    """Sync the manifest, then enqueue stale images for one stage"""
+    manifest = ObjectManifest(args.manifest)
+    pool = await init_db_pool()
+    await uploads.init_rabbitmq()
+    try:
+        synced = await manifest.sync(pool)
+        logger.info(f"Manifest synced ({synced} rows read): {manifest.summary()}")
+        if args.sync_only:
+            return
+
+        stats = await backfill(
+            pool, manifest, args.stage, args.version,
+            rate=args.rate,
+            group_id=args.group_id,
+            limit=args.limit,
+            dry_run=args.dry_run
+        )
+        print(json.dumps(stats.to_dict()))
+    finally:
+        await uploads.close_rabbitmq()
+        await close_db_pool()
+        manifest.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run a processing stage over existing images")
+    parser.add_argument("--stage", help="stage to backfill, e.g. quality or faces")
+    parser.add_argument("--version", type=int, default=1, help="re-run images processed below this version")
+    parser.add_argument("--rate", type=float, default=BACKFILL_RATE, help="events per second")
+    parser.add_argument("--group-id", help="only images of this group")
+    parser.add_argument("--limit", type=int, help="stop after this many images")
+    parser.add_argument("--manifest", default=BACKFILL_MANIFEST)
+    parser.add_argument("--sync-only", action="store_true", help="update the manifest and exit")
+    parser.add_argument("--dry-run", action="store_true", help="count stale images without publishing")
+    args = parser.parse_args()
+    if not args.sync_only and not args.stage:
+        parser.error("--stage is required unless --sync-only is given")
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(main(args))
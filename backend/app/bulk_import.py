@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from config.db_config import init_db_pool, close_db_pool
+from app.services.image_rows import image_row_writer
+from app.services.import_manifest import (
+    FileInfo, ImportManifest, inspect_file, walk_images,
+    STATUS_DONE, STATUS_DUPLICATE, STATUS_FAILED, STATUS_UPLOADED,
+)
+
+# image-rabbit.py isn't importable with a plain import statement
+uploads = importlib.import_module("app.routes.image-rabbit")
+
+logger = logging.getLogger(__name__)
+
+# Bulk Import Configuration
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", str(os.cpu_count() or 1)))
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "32"))
+# Files per upload_id: one COPY of image rows and one batch event each
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "200"))
+IMPORT_REPORT_INTERVAL = float(os.getenv("IMPORT_REPORT_INTERVAL", "10"))
+MAX_FILE_SIZE = 10 * 1024 * 1024  # same limit as the upload endpoint
+
+ManifestEntry = Tuple[FileInfo, str, Optional[str], Optional[str], Optional[str]]
+
+@dataclass
+class ImportStats:
+    """Progress counters for one import run"""
+    started_at: float = field(default_factory=time.time)
+    files_seen: int = 0
+    files_skipped: int = 0
+    files_uploaded: int = 0
+    files_duplicate: int = 0
+    files_failed: int = 0
+    bytes_uploaded: int = 0
+
+    @property
+    def elapsed(self) -> float:
+        return max(time.time() - self.started_at, 1e-6)
+
+    def to_dict(self):
+        return {
+            "files_seen": self.files_seen,
+            "files_skipped": self.files_skipped,
+            "files_uploaded": self.files_uploaded,
+            "files_duplicate": self.files_duplicate,
+            "files_failed": self.files_failed,
+            "mb_uploaded": round(self.bytes_uploaded / 1024 / 1024, 1),
+            "elapsed_seconds": round(self.elapsed, 1),
+            "files_per_second": round(self.files_uploaded / self.elapsed, 1),
+            "mb_per_second": round(self.bytes_uploaded / 1024 / 1024 / self.elapsed, 2),
+        }
+
+class ImportBatch:
+    """Files sharing one upload_id; committed once every assigned file is done"""
+
+    def __init__(self):
+        self.upload_id = str(uuid.uuid4())
+        self.assigned = 0
+        self.closed = False
+        self.entries: List[ManifestEntry] = []
+        self.started_at = time.time()
+        # Set once the batch start event is out; no file event may precede it
+        self.started = asyncio.Event()
+
+    @property
+    def complete(self) -> bool:
+        return self.closed and len(self.entries) == self.assigned
+
+def read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+class BulkImporter:
+    """Three-stage pipeline: walk -> hash/inspect (process pool) -> upload (bounded).
+
+    Stages are connected by a bounded queue so hashing runs ahead of the
+    uploaders by at most a few files per uploader, and memory stays flat
+    however large the tree is.
+    """
+
+    def __init__(self, root: str, user_id: str, group_id: str, manifest: ImportManifest,
+                 workers: int = IMPORT_WORKERS, concurrency: int = IMPORT_CONCURRENCY,
+                 batch_size: int = IMPORT_BATCH_SIZE, max_file_size: int = MAX_FILE_SIZE):
+        self.root = root
+        self.user_id = user_id
+        self.group_id = group_id
+        self.manifest = manifest
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_file_size = max_file_size
+        self.process_pool = ProcessPoolExecutor(max_workers=workers)
+        self.io_executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        self.batch = ImportBatch()
+        self.stats = ImportStats()
+
+        # The API caps in-flight uploads for request fairness; an import owns the process
+        self.upload_semaphore = asyncio.Semaphore(concurrency)
+        self.upload_executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def produce(self):
+        """Stage 1: walk the tree and hand new or changed files to the process pool"""
+        loop = asyncio.get_running_loop()
+        for entry in walk_images(self.root):
+            stat = entry.stat()
+            self.stats.files_seen += 1
+            if self.manifest.is_finished(entry.path, stat.st_size, stat.st_mtime_ns):
+                self.stats.files_skipped += 1
+                continue
+            future = loop.run_in_executor(self.process_pool, inspect_file, entry.path)
+            await self.queue.put((entry.path, future))
+
+        for _ in range(self.concurrency):
+            await self.queue.put(None)
+
+    async def import_file(self, batch: ImportBatch, info: FileInfo) -> ManifestEntry:
+        """Upload one inspected file through the API's upload path"""
+        if info.error:
+            return info, STATUS_FAILED, None, None, info.error
+        if info.size > self.max_file_size:
+            return info, STATUS_FAILED, None, None, f"File is larger than {self.max_file_size} bytes"
+        if not self.manifest.claim_hash(info.sha256):
+            return info, STATUS_DUPLICATE, None, None, None
+
+        loop = asyncio.get_running_loop()
+        try:
+            content = await loop.run_in_executor(self.io_executor, read_bytes, info.path)
+            file_data = uploads.FileData(
+                filename=os.path.basename(info.path),
+                content=content,
+                content_type=info.content_type,
+                size=len(content)
+            )
+            result = await uploads.upload_single_file(
+                self.user_id, self.group_id, file_data, batch.upload_id, image_hash=info.phash,
+                semaphore=self.upload_semaphore, storage_executor=self.upload_executor
+            )
+        except Exception as e:
+            result = uploads.UploadResult(info.path, False, error=str(e))
+
+        if not result.success:
+            self.manifest.release_hash(info.sha256)
+            return info, STATUS_FAILED, None, None, result.error
+        return info, STATUS_UPLOADED, result.image_id, result.url, None
+
+    async def start_batch(self, batch: ImportBatch):
+        """Announce a batch before any of its files; the final count comes with the completion"""
+        try:
+            await uploads.publish_event(uploads.ROUTING_KEY_BATCH_START, uploads.BatchEvent(
+                batch_id=batch.upload_id,
+                user_id=self.user_id,
+                group_id=self.group_id,
+                total_files=self.batch_size,
+                status="started"
+            ))
+        finally:
+            batch.started.set()
+
+    async def commit(self, batch: ImportBatch):
+        """Persist a batch's image rows with one COPY, then checkpoint it"""
+        persisted = await uploads.persist_upload_rows(batch.upload_id)
+
+        entries = []
+        batch_bytes = 0
+        for info, status, image_id, url, error in batch.entries:
+            if status == STATUS_UPLOADED:
+                if persisted:
+                    status = STATUS_DONE
+                    batch_bytes += info.size
+                else:
+                    # Object is in storage without a row; upload it again next run
+                    status, error = STATUS_FAILED, "image row was not persisted"
+                    self.manifest.release_hash(info.sha256)
+            entries.append((info, status, image_id, url, error))
+
+        self.manifest.record(entries)
+
+        uploaded = sum(1 for e in entries if e[1] == STATUS_DONE)
+        self.stats.files_uploaded += uploaded
+        self.stats.bytes_uploaded += batch_bytes
+        self.stats.files_duplicate += sum(1 for e in entries if e[1] == STATUS_DUPLICATE)
+        self.stats.files_failed += sum(1 for e in entries if e[1] == STATUS_FAILED)
+
+        await uploads.publish_event(uploads.ROUTING_KEY_BATCH_COMPLETE, uploads.BatchEvent(
+            batch_id=batch.upload_id,
+            user_id=self.user_id,
+            group_id=self.group_id,
+            total_files=len(entries),
+            successful_uploads=uploaded,
+            failed_uploads=len(entries) - uploaded,
+            total_size_bytes=batch_bytes,
+            processing_time_seconds=time.time() - batch.started_at,
+            status="completed"
+        ))
+
+    async def upload_worker(self):
+        """Stage 2: upload files as they come out of the process pool"""
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            path, future = item
+
+            batch = self.batch
+            batch.assigned += 1
+            if batch.assigned >= self.batch_size:
+                batch.closed = True
+                self.batch = ImportBatch()
+
+            try:
+                if batch.assigned == 1:
+                    await self.start_batch(batch)
+                else:
+                    await batch.started.wait()
+                info = await future
+                entry = await self.import_file(batch, info)
+            except Exception as e:
+                logger.error(f"Failed to import {path}: {str(e)}")
+                entry = (FileInfo(path=path, size=0, mtime_ns=0), STATUS_FAILED, None, None, str(e))
+            batch.entries.append(entry)
+
+            if batch.complete:
+                await self.commit(batch)
+
+    async def report(self, interval: float):
+        """Log sustained and recent throughput while the import runs"""
+        last_files, last_bytes, last_time = 0, 0, time.time()
+        while True:
+            await asyncio.sleep(interval)
+            now = time.time()
+            window = max(now - last_time, 1e-6)
+            logger.info(
+                f"Import progress: {self.stats.to_dict()} | last {window:.0f}s: "
+                f"{(self.stats.files_uploaded - last_files) / window:.1f} files/s, "
+                f"{(self.stats.bytes_uploaded - last_bytes) / 1024 / 1024 / window:.2f} MB/s"
+            )
+            last_files, last_bytes, last_time = self.stats.files_uploaded, self.stats.bytes_uploaded, now
+
+    async def run(self, report_interval: float = IMPORT_REPORT_INTERVAL) -> ImportStats:
+        reporter = asyncio.create_task(self.report(report_interval))
+        try:
+            await asyncio.gather(self.produce(), *[self.upload_worker() for _ in range(self.concurrency)])
+
+            # Last, partially filled batch
+            self.batch.closed = True
+            if self.batch.entries:
+                await self.commit(self.batch)
+        finally:
+            reporter.cancel()
+            self.process_pool.shutdown()
+            self.upload_executor.shutdown()
+            self.io_executor.shutdown()
+        return self.stats
+
+async def main(args):
+    """Import every image under --root into one group, resuming from the manifest"""
+    manifest = ImportManifest(args.manifest or os.path.join(args.root, f".import-{args.group_id}.sqlite"))
+    await uploads.init_rabbitmq()
+    await init_db_pool()
+    try:
+        importer = BulkImporter(
+            args.root, args.user_id, args.group_id, manifest,
+            workers=args.workers,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size
+        )
+        stats = await importer.run(args.report_interval)
+        print(json.dumps(stats.to_dict()))
+    finally:
+        await image_row_writer.flush_all()
+        await close_db_pool()
+        await uploads.close_rabbitmq()
+        manifest.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import a local photo archive into a group")
+    parser.add_argument("root", help="directory to import (walked recursively)")
+    parser.add_argument("--user-id", required=True)
+    parser.add_argument("--group-id", required=True)
+    parser.add_argument("--manifest", help="checkpoint database (default: <root>/.import-<group>.sqlite)")
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="hashing processes")
+    parser.add_argument("--concurrency", type=int, default=IMPORT_CONCURRENCY, help="uploads in flight")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--report-interval", type=float, default=IMPORT_REPORT_INTERVAL)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(main(args))
@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+import json
+import logging
+
+from config.firebase_config import bucket
+from config.db_config import init_db_pool, close_db_pool
+from app.services.expiry import ExpirySweeper, EXPIRY_BATCH_SIZE, EXPIRY_DELETE_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+async def main(args):
+    """Run the expiry sweep once, or forever every --interval seconds"""
+    pool = await init_db_pool()
+    try:
+        while True:
+            sweeper = ExpirySweeper(
+                pool, bucket,
+                batch_size=args.batch_size,
+                concurrency=args.concurrency,
+                dry_run=args.dry_run
+            )
+            stats = await sweeper.run()
+            print(json.dumps(stats.to_dict()))
+
+            if not args.interval:
+                break
+            await asyncio.sleep(args.interval)
+    finally:
+        await close_db_pool()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete expired images and groups")
+    parser.add_argument("--batch-size", type=int, default=EXPIRY_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=EXPIRY_DELETE_CONCURRENCY)
+    parser.add_argument("--interval", type=float, default=0, help="repeat every N seconds (0 = run once)")
+    parser.add_argument("--dry-run", action="store_true", help="scan and report without deleting")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(main(args))
@@ -0,0 +1,174 @@
+import asyncio
+import importlib
+import aio_pika
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Dict, List, Optional
+
+from config.firebase_config import bucket
+from config.db_config import get_db_pool
+from app.services.batching import MicroBatcher
+from app.services.faces import AdaptiveBatchSize, analyse_images, init_worker, persist_faces
+from app.services import tracing
+from app.services.events import EVENT_WIRE_VERSION, HEADER_SCHEMA_VERSION, encode_event
+from app.services.face_cache import FACES_DETECTED_EVENT
+from app.services.object_manifest import record_stage_versions
+
+# consumer-example.py isn't importable with a plain import statement
+UploadEventConsumer = importlib.import_module("app.consumer-example").UploadEventConsumer
+
+logger = logging.getLogger(__name__)
+
+FACE_QUEUE = "face_analysis_queue"
+FACE_WORKERS = int(os.getenv("FACE_WORKERS", str(os.cpu_count() or 1)))
+FACE_LATENCY_BUDGET = float(os.getenv("FACE_LATENCY_BUDGET", "2.0"))
+FACE_BATCH_DELAY = float(os.getenv("FACE_BATCH_DELAY", "0.5"))
+FACE_MAX_BATCH_SIZE = int(os.getenv("FACE_MAX_BATCH_SIZE", "64"))
+# Bump when detection or embedding changes, then backfill the faces stage
+FACE_STAGE_VERSION = int(os.getenv("FACE_STAGE_VERSION", "1"))
+
+class FaceAnalysisWorker(UploadEventConsumer):
+    """Detects and embeds faces for uploaded images in micro-batches"""
+
+    stage = "faces"
+    stage_version = FACE_STAGE_VERSION
+
+    def setup_stage(self):
+        """Face analysis only; none of the quality stage's pool or batcher"""
+        self.face_pool = ProcessPoolExecutor(
+            max_workers=FACE_WORKERS,
+            initializer=partial(init_worker, 1)
+        )
+        self.batch_size = AdaptiveBatchSize(FACE_LATENCY_BUDGET, maximum=FACE_MAX_BATCH_SIZE)
+        self.face_batcher = MicroBatcher(
+            self.analyse_uploads,
+            max_batch_size=self.batch_size.size,
+            max_delay=FACE_BATCH_DELAY,
+            name="face analysis"
+        )
+        self.face_queue = None
+        self.consumer_tag = None
+
+    async def setup_queues(self):
+        """Own queue on upload.success so faces don't compete with the main consumer"""
+        face_queue = await self.channel.declare_queue(FACE_QUEUE, durable=True)
+        await face_queue.bind(self.exchange, "upload.success.#")
+        await self.retries.bind(face_queue)
+        return face_queue
+
+    def origin_queue(self, message) -> str:
+        return FACE_QUEUE
+
+    async def start_consuming(self):
+        # Let a full micro-batch be in flight at once
+        await self.channel.set_qos(prefetch_count=FACE_MAX_BATCH_SIZE)
+        self.face_queue = await self.setup_queues()
+        self.consumer_tag = await self.face_queue.consume(self.process_success_event)
+        logger.info("Face analysis worker consuming...")
+
+    async def handle_successful_upload(self, event_data: Dict[str, Any]) -> Optional[Awaitable]:
+        # Acked (or retried) once the batch holding this event is persisted
+        if event_data.get('image_id'):
+            event_data['_trace'] = tracing.current()
+            return await self.face_batcher.add(event_data)
+        return None
+
+    async def analyse_uploads(self, events: List[Dict[str, Any]]) -> List[Optional[Exception]]:
+        """Fetch, analyse and persist one micro-batch; returns each event's error"""
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+
+        def download(path: str) -> bytes:
+            return bucket.blob(path).download_as_bytes()
+
+        downloads = await asyncio.gather(
+            *[loop.run_in_executor(self.io_executor, download, e['firebase_path']) for e in events],
+            return_exceptions=True
+        )
+        errors: List[Optional[Exception]] = [None] * len(events)
+        fetched = []
+        for i, (event, content) in enumerate(zip(events, downloads)):
+            if isinstance(content, Exception):
+                logger.error(f"Failed to fetch {event['firebase_path']} for face analysis: {content}")
+                errors[i] = content
+            else:
+                fetched.append((event, content))
+
+        fetched_at = time.time()
+        tracing.record_batch("faces.fetch", [e.get('_trace') for e in events], start_time, fetched_at)
+
+        if not fetched:
+            return errors
+
+        # Split across worker processes so every core gets a batched tensor
+        chunk_count = min(FACE_WORKERS, len(fetched))
+        chunks = [fetched[i::chunk_count] for i in range(chunk_count)]
+        chunk_results = await asyncio.gather(*[
+            loop.run_in_executor(self.face_pool, analyse_images, [content for _, content in chunk])
+            for chunk in chunks
+        ])
+
+        faces = [
+            (event['image_id'], face)
+            for chunk, results in zip(chunks, chunk_results)
+            for (event, _), image_faces in zip(chunk, results)
+            for face in image_faces
+        ]
+        analysed_at = time.time()
+        traces = [e.get('_trace') for e, _ in fetched]
+        tracing.record_batch("faces.analyse", traces, fetched_at, analysed_at)
+
+        image_ids = [event['image_id'] for event, _ in fetched]
+        pool = await get_db_pool()
+        face_ids = await persist_faces(pool, image_ids, faces)
+        await record_stage_versions(pool, self.stage, self.stage_version, image_ids)
+        tracing.record_batch("faces.persist", traces, analysed_at, time.time())
+
+        # Let the API processes offer the new faces to their best-face cache
+        if face_ids:
+            await self.publish_faces_detected(face_ids, image_ids)
+
+        elapsed = time.time() - start_time
+        self.face_batcher.max_batch_size = self.batch_size.observe(len(events), elapsed)
+        logger.info(
+            f"Analysed {len(fetched)} images, {len(faces)} faces in {elapsed:.2f}s "
+            f"(next batch size {self.face_batcher.max_batch_size})"
+        )
+        return errors
+
+    async def publish_faces_detected(self, face_ids: List[str], image_ids: List[str]):
+        try:
+            body, content_type = encode_event({"face_ids": face_ids, "image_ids": image_ids})
+            await self.exchange.publish(
+                aio_pika.Message(
+                    body,
+                    content_type=content_type,
+                    headers={HEADER_SCHEMA_VERSION: EVENT_WIRE_VERSION, "event_type": FACES_DETECTED_EVENT}
+                ),
+                routing_key=FACES_DETECTED_EVENT
+            )
+        except Exception as e:
+            # Faces are persisted; the cache picks them up on its next full load
+            logger.error(f"Failed to publish {FACES_DETECTED_EVENT}: {str(e)}")
+
+    async def stop_stage(self):
+        if self.consumer_tag is not None:
+            await self.face_queue.cancel(self.consumer_tag)
+        await self.face_batcher.stop()
+        self.face_pool.shutdown()
+
+async def main():
+    worker = FaceAnalysisWorker()
+    await worker.connect()
+    await worker.start_consuming()
+    try:
+        await asyncio.Future()
+    finally:
+        await worker.stop()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
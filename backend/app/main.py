@@ -1,9 +1,15 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import images  # remove the leading dot if you're running this as the main app
+from app.routes import persons
+from app.routes import gallery
+from app.profiling import install_profiling
 
 app = FastAPI(title="Gallery App")
 
+# Opt-in request profiling (PROFILING_ENABLED=1)
+install_profiling(app)
+
 # ✅ Add CORS Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -15,6 +21,8 @@ app.add_middleware(
 
 # ✅ Include routes
 app.include_router(images.router, prefix="/images", tags=["Images"])
+app.include_router(gallery.router, prefix="/images", tags=["Gallery"])
+app.include_router(persons.router, prefix="/persons", tags=["Persons"])
 
 @app.get("/")
 def root():
@@ -6,6 +6,7 @@ import os
 
 # Import your upload router
 from app.routes.images import router as images_router, init_rabbitmq, close_rabbitmq
+from app.profiling import install_profiling
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +40,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Opt-in request profiling (PROFILING_ENABLED=1)
+install_profiling(app)
+
 # Include routers
 app.include_router(images_router, prefix="/images", tags=["Images"])
 
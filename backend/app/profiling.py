@@ -0,0 +1,272 @@
+import asyncio
+import hmac
+import itertools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, Optional
+
+from fastapi import APIRouter, FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+logger = logging.getLogger(__name__)
+
+# Profiling Configuration (off unless PROFILING_ENABLED=1)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "2000"))
+# Requests not picked for sampling start being sampled once they run this long
+PROFILE_PROMOTE_MS = float(os.getenv("PROFILE_PROMOTE_MS", "500"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "100"))
+PROFILE_MAX_DEPTH = 64
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+class ProfileSession:
+    """Stack samples collected while one request was in flight"""
+
+    def __init__(self, session_id: int, method: str, path: str):
+        self.id = session_id
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.status_code = None
+        self.reason = None
+        self.stacks: Counter = Counter()
+        # Where the request is served: its event loop, thread and task
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.task = asyncio.current_task()
+        self.finished = False
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, stack: str):
+        with self._lock:
+            if not self.finished:
+                self.stacks[stack] += 1
+
+    def close(self):
+        """Stop accepting samples; the profiler thread may still hold a reference"""
+        with self._lock:
+            self.finished = True
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = sum(self.stacks.values())
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 1),
+            "status_code": self.status_code,
+            "reason": self.reason,
+            "samples": samples,
+        }
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format, ready for flamegraph.pl or speedscope"""
+        with self._lock:
+            stacks = self.stacks.most_common()
+        return "\n".join(f"{stack} {count}" for stack, count in stacks) + "\n"
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _collapse(frame) -> str:
+    parts = []
+    while frame is not None and len(parts) < PROFILE_MAX_DEPTH:
+        parts.append(_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+def _await_chain(coro) -> str:
+    """Stack of a suspended task, outermost coroutine first"""
+    parts = []
+    while coro is not None and len(parts) < PROFILE_MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        parts.append(_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return ";".join(parts)
+
+class SamplingProfiler:
+    """Statistical profiler for the requests picked for profiling.
+
+    Whether a request is profiled is decided when it starts (PROFILE_SAMPLE_RATE);
+    requests still running after PROFILE_PROMOTE_MS are profiled from then on,
+    so slow requests come with stacks. A daemon thread wakes every
+    PROFILE_INTERVAL_MS while a profiled request is in flight. Each sample
+    belongs to that request alone: the event loop thread's stack when the
+    request's task is the one running, otherwise the chain of coroutines the
+    task is suspended in (prefixed "await"). Code a handler hands to a thread
+    pool shows up as the task awaiting it. Finished sessions are kept in a
+    bounded ring buffer when they were sampled or slow.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, buffer_size: int = PROFILE_BUFFER_SIZE,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, slow_ms: float = PROFILE_SLOW_MS,
+                 promote_ms: float = PROFILE_PROMOTE_MS):
+        self.interval = interval_ms / 1000.0
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.promote_ms = promote_ms
+        self.profiles: deque = deque(maxlen=buffer_size)
+        self._active: Dict[int, ProfileSession] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self._thread.start()
+
+    def _sample(self, session: ProfileSession, frames) -> Optional[str]:
+        if session.task is None:
+            return None
+        if asyncio.current_task(session.loop) is session.task:
+            frame = frames.get(session.thread_id)
+            return None if frame is None else f"run;{_collapse(frame)}"
+        chain = _await_chain(session.task.get_coro())
+        return f"await;{chain}" if chain else None
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.interval)
+
+            with self._lock:
+                sessions = list(self._active.values())
+                if not sessions:
+                    self._wakeup.clear()
+                    continue
+
+            frames = sys._current_frames()
+            for session in sessions:
+                stack = self._sample(session, frames)
+                if stack:
+                    session.add(stack)
+            del frames
+
+    def _activate(self, session: ProfileSession):
+        with self._lock:
+            if session.finished:
+                return
+            self._active[session.id] = session
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def start(self, method: str, path: str) -> ProfileSession:
+        session = ProfileSession(next(self._ids), method, path)
+        if random.random() < self.sample_rate:
+            session.reason = "sampled"
+            self._activate(session)
+        else:
+            session._timer = session.loop.call_later(self.promote_ms / 1000.0, self._activate, session)
+        return session
+
+    def finish(self, session: ProfileSession, status_code: Optional[int]):
+        if session._timer is not None:
+            session._timer.cancel()
+        session.close()
+        with self._lock:
+            self._active.pop(session.id, None)
+
+        session.duration_ms = (time.time() - session.started_at) * 1000
+        session.status_code = status_code
+        if session.duration_ms >= self.slow_ms:
+            session.reason = "slow"
+        elif session.reason is None:
+            return
+
+        self.profiles.append(session)
+        if session.reason == "slow":
+            logger.warning(
+                f"Slow request {session.method} {session.path}: {session.duration_ms:.0f}ms "
+                f"(profile {session.id})"
+            )
+
+    def get(self, session_id: int) -> Optional[ProfileSession]:
+        for session in self.profiles:
+            if session.id == session_id:
+                return session
+        return None
+
+class ProfilingMiddleware:
+    """ASGI middleware wrapping every HTTP request in a profile session"""
+
+    def __init__(self, app, profiler: SamplingProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/admin/profiles"):
+            await self.app(scope, receive, send)
+            return
+
+        session = self.profiler.start(scope["method"], scope["path"])
+        status = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.profiler.finish(session, status.get("code"))
+
+def _check_token(token: Optional[str]):
+    # Profiles expose code paths and request URLs; without a configured token nobody gets them
+    if not ADMIN_TOKEN or not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+def build_admin_router(profiler: SamplingProfiler) -> APIRouter:
+    router = APIRouter()
+
+    @router.get("/profiles")
+    async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+        """Captured profiles, newest first"""
+        _check_token(x_admin_token)
+        return {"profiles": [session.summary() for session in reversed(profiler.profiles)]}
+
+    @router.get("/profiles/{profile_id}")
+    async def download_profile(profile_id: int, x_admin_token: Optional[str] = Header(None)):
+        """Collapsed stacks of one profile"""
+        _check_token(x_admin_token)
+        session = profiler.get(profile_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Profile not found or evicted")
+        return PlainTextResponse(
+            session.collapsed(),
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+        )
+
+    return router
+
+def install_profiling(app: FastAPI, enabled: bool = PROFILING_ENABLED) -> Optional[SamplingProfiler]:
+    """Add the profiling middleware and admin routes; does nothing when disabled"""
+    if not enabled:
+        return None
+
+    profiler = SamplingProfiler()
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+    app.include_router(build_admin_router(profiler), prefix="/admin", tags=["Admin"])
+    logger.info(
+        f"Request profiling enabled: sample rate {profiler.sample_rate}, "
+        f"slow threshold {profiler.slow_ms}ms"
+    )
+    if not ADMIN_TOKEN:
+        logger.warning("ADMIN_TOKEN is not set; the /admin/profiles endpoints will refuse every request")
+    return profiler
@@ -0,0 +1,485 @@
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import json
+import numpy as np
+import logging
+import os
+import uuid
+
+from config.firebase_config import bucket
+from config.db_config import get_db_pool
+from app.services.phash import DEFAULT_MAX_DISTANCE, group_hash_index
+from app.services.zipstream import ZipEntry, ZipStream, parse_range, unique_names
+from app.services.subscriptions import event_subscriber
+from app.services.tiering import STATUS_COMPRESSED, TierMover, access_tracker, object_path
+from app.services.timeline import FIELD_TAKEN, FIELD_UPLOADED, timeline_index
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 200
+
+# Objects fetched ahead of the archive writer; bounds memory per download
+ARCHIVE_READ_AHEAD = int(os.getenv("ARCHIVE_READ_AHEAD", "4"))
+
+# Thread pool for blocking storage reads
+storage_executor = ThreadPoolExecutor(max_workers=16)
+
+# Thumbnails never change for a given image id, so clients may cache them forever
+THUMBNAIL_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Timeline responses may be reused briefly; the ETag changes as soon as images are added
+TIMELINE_CACHE_CONTROL = "private, max-age=60"
+
+# Signed URLs of the compressed originals; the stored expiry is kept a little
+# ahead of the real one so clients never get a URL about to lapse
+SIGNED_URL_TTL = timedelta(hours=8)
+SIGNED_URL_MARGIN = timedelta(minutes=10)
+
+# Signed URLs handed out by the original download redirect
+ORIGINAL_URL_TTL = timedelta(minutes=15)
+
+# Keyset pagination relies on:
+#   CREATE INDEX images_group_uploaded_idx ON images (group_id, uploaded_at DESC, id DESC);
+# Rows without uploaded_at have no keyset position and are left out.
+LIST_QUERY = """
+    SELECT id, filename, uploaded_at, size, date_taken, signed_url, expire_time,
+           thumb_byte IS NOT NULL AS has_thumb
+    FROM images
+    WHERE group_id = $1 AND uploaded_at IS NOT NULL
+      {cursor_filter}
+    ORDER BY uploaded_at DESC, id DESC
+    LIMIT {limit}
+"""
+
+class AccessRequest(BaseModel):
+    image_ids: List[str]
+    downloaded: bool = False
+
+def encode_cursor(uploaded_at: datetime, image_id) -> str:
+    """Opaque cursor for the (uploaded_at, id) position of a row"""
+    raw = f"{uploaded_at.isoformat()}|{image_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Parse a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        uploaded_at, image_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(uploaded_at), uuid.UUID(image_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def _parse_date(value: Optional[str], unit: str) -> Optional[np.datetime64]:
+    """Parse YYYY-MM / YYYY-MM-DD query values"""
+    if value is None:
+        return None
+    try:
+        return np.datetime64(value, unit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+
+async def refresh_signed_urls(pool, image_ids: List[uuid.UUID]) -> Dict[uuid.UUID, Tuple[str, datetime]]:
+    """Sign new URLs for the given images and store them with one UPDATE"""
+    now = datetime.now(timezone.utc)
+    expire_time = now + SIGNED_URL_TTL - SIGNED_URL_MARGIN
+
+    def sign(image_id: uuid.UUID) -> str:
+        return bucket.blob(f"compressed_{image_id}").generate_signed_url(expiration=SIGNED_URL_TTL, method="GET")
+
+    loop = asyncio.get_event_loop()
+    results = await asyncio.gather(
+        *[loop.run_in_executor(storage_executor, sign, image_id) for image_id in image_ids],
+        return_exceptions=True
+    )
+
+    refreshed = {}
+    for image_id, url in zip(image_ids, results):
+        if isinstance(url, Exception):
+            logger.error(f"Failed to sign URL for {image_id}: {str(url)}")
+        else:
+            refreshed[image_id] = (url, expire_time)
+
+    if refreshed:
+        async with pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE images SET signed_url = v.url, expire_time = v.expire_time
+                FROM unnest($1::uuid[], $2::text[], $3::timestamptz[]) AS v(id, url, expire_time)
+                WHERE images.id = v.id
+                """,
+                list(refreshed),
+                [url for url, _ in refreshed.values()],
+                [expires for _, expires in refreshed.values()]
+            )
+    return refreshed
+
+@router.get("/groups/{group_id}")
+async def list_group_images(
+    request: Request,
+    group_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """List a group's images newest first, paginated by an opaque cursor"""
+    params = [group_id]
+    cursor_filter = ""
+    if cursor:
+        uploaded_at, image_id = decode_cursor(cursor)
+        cursor_filter = "AND (uploaded_at, id) < ($2, $3)"
+        params += [uploaded_at, image_id]
+
+    query = LIST_QUERY.format(cursor_filter=cursor_filter, limit=limit + 1)  # one extra to check hasMore
+
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(query, *params)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    now = datetime.now(timezone.utc)
+
+    # Missing or expired signed URLs are re-signed for the whole page at once
+    def signed_url_valid(row) -> bool:
+        return bool(row["signed_url"] and row["expire_time"] and _aware(row["expire_time"]) > now)
+
+    refreshed = await refresh_signed_urls(pool, [row["id"] for row in rows if not signed_url_valid(row)])
+
+    images = []
+    for row in rows:
+        if row["id"] in refreshed:
+            signed_url, expire_time = refreshed[row["id"]]
+        elif signed_url_valid(row):
+            signed_url, expire_time = row["signed_url"], row["expire_time"]
+        else:
+            signed_url = expire_time = None  # signing failed; logged above
+        images.append({
+            "id": str(row["id"]),
+            "filename": row["filename"],
+            "uploaded_at": row["uploaded_at"],
+            "size": row["size"],
+            "date_taken": row["date_taken"],
+            "thumbnail_url": (
+                str(request.url_for("get_thumbnail", image_id=str(row["id"])))
+                if row["has_thumb"] else None
+            ),
+            "original_location": signed_url,
+            "expire_time": expire_time
+        })
+
+    next_cursor = encode_cursor(rows[-1]["uploaded_at"], rows[-1]["id"]) if has_more else None
+
+    return {"images": images, "hasMore": has_more, "next_cursor": next_cursor}
+
+@router.get("/groups/{group_id}/duplicates/{image_id}")
+async def list_near_duplicates(
+    request: Request,
+    group_id: str,
+    image_id: str,
+    distance: int = Query(DEFAULT_MAX_DISTANCE, ge=0, le=32)
+):
+    """Images in the group whose perceptual hash is within `distance` bits"""
+    pool = await get_db_pool()
+    await group_hash_index.sync(pool, group_id)
+
+    image_hash = group_hash_index.lookup(group_id, image_id)
+    if image_hash is None:
+        raise HTTPException(status_code=404, detail="Image not found or not hashed")
+
+    matches = group_hash_index.near(group_id, image_hash, distance, exclude=image_id)
+
+    return {
+        "image_id": image_id,
+        "distance": distance,
+        "duplicates": [
+            {
+                "id": duplicate_id,
+                "distance": match_distance,
+                "thumbnail_url": str(request.url_for("get_thumbnail", image_id=duplicate_id))
+            }
+            for duplicate_id, match_distance in matches
+        ]
+    }
+
+@router.get("/groups/{group_id}/timeline")
+async def group_timeline(
+    request: Request,
+    group_id: str,
+    granularity: str = Query("month", pattern="^(day|month)$"),
+    field: str = Query(FIELD_TAKEN, pattern=f"^({FIELD_TAKEN}|{FIELD_UPLOADED})$"),
+    start: Optional[str] = None,
+    end: Optional[str] = None
+):
+    """Image counts per day or month, newest first, optionally within [start, end)"""
+    pool = await get_db_pool()
+    timeline = await timeline_index.get(pool, group_id)
+
+    unit = "D" if granularity == "day" else "M"
+    start_at, end_at = _parse_date(start, unit), _parse_date(end, unit)
+
+    etag = timeline_index.etag(timeline, field, granularity, start, end)
+    headers = {"ETag": etag, "Cache-Control": TIMELINE_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    view = timeline.view(field)
+    buckets = view.counts(granularity, start_at, end_at)
+    body = {
+        "group_id": group_id,
+        "field": field,
+        "granularity": granularity,
+        "total": len(view),
+        "buckets": [{"date": bucket, "count": count} for bucket, count in reversed(buckets)]
+    }
+    return Response(content=json.dumps(body), media_type="application/json", headers=headers)
+
+@router.get("/groups/{group_id}/timeline/jump")
+async def jump_to_month(
+    group_id: str,
+    month: str,
+    field: str = Query(FIELD_TAKEN, pattern=f"^({FIELD_TAKEN}|{FIELD_UPLOADED})$")
+):
+    """Position (newest first) of the newest image in or before `month`"""
+    target = _parse_date(month, "M")
+    pool = await get_db_pool()
+    timeline = await timeline_index.get(pool, group_id)
+    view = timeline.view(field)
+
+    index = view.newest_before(target + 1)
+    if index < 0:
+        raise HTTPException(status_code=404, detail="No images in or before this month")
+
+    result = {
+        "month": str(target),
+        "position": len(view) - 1 - index,
+        "image_id": str(view.ids[index]),
+        "date": timeline.to_datetime(view.times[index]),
+        "cursor": None
+    }
+    if field == FIELD_UPLOADED and index + 1 < len(view):
+        # The list endpoint returns rows strictly older than the cursor, so
+        # point it at the next newer image to start the page at this one
+        result["cursor"] = encode_cursor(timeline.to_datetime(view.times[index + 1]), view.ids[index + 1])
+    return result
+
+@router.get("/thumbnails/{image_id}", name="get_thumbnail")
+async def get_thumbnail(request: Request, image_id: str):
+    """Serve a thumbnail with long-lived immutable caching"""
+    try:
+        image_uuid = uuid.UUID(image_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid image id")
+
+    etag = f'"{image_uuid.hex}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(
+            status_code=304,
+            headers={"ETag": etag, "Cache-Control": THUMBNAIL_CACHE_CONTROL}
+        )
+
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        thumb = await conn.fetchval("SELECT thumb_byte FROM images WHERE id = $1", image_uuid)
+
+    if thumb is None:
+        # Not generated yet; don't let anyone cache the miss
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+
+    return Response(
+        content=bytes(thumb),
+        media_type="image/jpeg",
+        headers={"ETag": etag, "Cache-Control": THUMBNAIL_CACHE_CONTROL}
+    )
+
+async def fetch_object(path: str, start: int, end: Optional[int]) -> bytes:
+    """Read [start, end) of a storage object"""
+    def download():
+        blob = bucket.blob(path)
+        if start == 0 and end is None:
+            return blob.download_as_bytes()
+        # The storage API's end offset is inclusive
+        return blob.download_as_bytes(start=start, end=None if end is None else end - 1)
+
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(storage_executor, download)
+
+@router.get("/images/{image_id}/original")
+async def download_original(image_id: str):
+    """Redirect to a short-lived signed URL of the full-size image"""
+    try:
+        image_uuid = uuid.UUID(image_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid image id")
+
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            "SELECT id, location, filename, status FROM images WHERE id = $1", image_uuid
+        )
+    if row is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # compressed_only tiering deleted the original; the compressed copy stands in
+    path = f"compressed_{row['id']}" if row["status"] == STATUS_COMPRESSED else object_path(row)
+    filename = row["filename"] or str(row["id"])
+
+    def sign() -> str:
+        return bucket.blob(path).generate_signed_url(
+            expiration=ORIGINAL_URL_TTL,
+            method="GET",
+            response_disposition=f'attachment; filename="{filename}"'
+        )
+
+    loop = asyncio.get_event_loop()
+    url = await loop.run_in_executor(storage_executor, sign)
+
+    access_tracker.record(str(row["id"]), downloaded=True)
+    return RedirectResponse(url, status_code=307)
+
+async def archive_entry_sources(rows) -> List[Tuple[str, Optional[int]]]:
+    """(object path, size) of every archive row.
+
+    Rows demoted with compressed_only tiering no longer have their original,
+    so they are served from compressed_<id> at that object's own size; the
+    size is None when neither copy exists.
+    """
+    def compressed_size(image_id) -> Optional[int]:
+        blob = bucket.get_blob(f"compressed_{image_id}")
+        return None if blob is None else blob.size
+
+    loop = asyncio.get_event_loop()
+    compressed = [row for row in rows if row["status"] == STATUS_COMPRESSED]
+    sizes = await asyncio.gather(*[
+        loop.run_in_executor(storage_executor, compressed_size, row["id"]) for row in compressed
+    ])
+    compressed_sizes = {row["id"]: size for row, size in zip(compressed, sizes)}
+
+    return [
+        (f"compressed_{row['id']}", compressed_sizes[row["id"]])
+        if row["status"] == STATUS_COMPRESSED
+        else (object_path(row), row["size"])
+        for row in rows
+    ]
+
+@router.get("/groups/{group_id}/archive")
+async def download_group_archive(request: Request, group_id: str):
+    """Stream the whole group as a ZIP64 archive, with Range/resume support"""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT id, filename, location, size, uploaded_at, status
+            FROM images
+            WHERE group_id = $1 AND size IS NOT NULL
+            ORDER BY uploaded_at, id
+            """,
+            group_id
+        )
+
+    if not rows:
+        raise HTTPException(status_code=404, detail="No images in group")
+
+    sources = await archive_entry_sources(rows)
+    available = [(row, source) for row, source in zip(rows, sources) if source[1] is not None]
+    if len(available) < len(rows):
+        logger.warning(f"Archive of group {group_id}: {len(rows) - len(available)} images have no stored object")
+    if not available:
+        raise HTTPException(status_code=404, detail="No images in group")
+
+    names = unique_names([row["filename"] or str(row["id"]) for row, _ in available])
+    entries = [
+        ZipEntry(
+            name=name,
+            path=path,
+            size=size,
+            modified=row["uploaded_at"]
+        )
+        for name, (row, (path, size)) in zip(names, available)
+    ]
+    archive = ZipStream(entries, fetch_object, read_ahead=ARCHIVE_READ_AHEAD)
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": archive.etag,
+        "Content-Disposition": f'attachment; filename="{group_id}.zip"'
+    }
+
+    # Only honour the range if the client's copy is still the same archive
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != archive.etag:
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, archive.total_size)
+    except ValueError:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{archive.total_size}"})
+
+    if byte_range is None:
+        start, end, status_code = 0, archive.total_size, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{archive.total_size}"
+    headers["Content-Length"] = str(end - start)
+
+    access_tracker.record_many([str(row["id"]) for row, _ in available], downloaded=True)
+
+    logger.info(
+        f"Streaming archive of group {group_id}: {len(entries)} files, "
+        f"bytes {start}-{end - 1}/{archive.total_size}"
+    )
+
+    return StreamingResponse(
+        archive.stream(start, end),
+        status_code=status_code,
+        media_type="application/zip",
+        headers=headers
+    )
+
+@router.post("/access")
+async def record_access(body: AccessRequest):
+    """Record image views/downloads; written to the database in periodic batches"""
+    try:
+        image_ids = [str(uuid.UUID(image_id)) for image_id in body.image_ids]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid image id")
+
+    access_tracker.record_many(image_ids, downloaded=body.downloaded)
+    return {"recorded": len(body.image_ids)}
+
+# Uploads land in whichever process served them; every process hears of them here
+UPLOAD_SUCCESS_PATTERN = "upload.success.#"
+
+async def on_upload_success(event_type: str, event: Dict[str, Any]):
+    """Add a committed upload to the timeline index, if its group is loaded"""
+    # Backfill events replay existing images and carry no uploaded_at
+    if event.get("image_id") and event.get("uploaded_at"):
+        timeline_index.add(event["group_id"], event["image_id"], event["uploaded_at"], event.get("date_taken"))
+
+@router.on_event("startup")
+async def startup_event():
+    access_tracker.mover = TierMover(bucket)
+    access_tracker.start()
+
+    try:
+        await event_subscriber.subscribe(UPLOAD_SUCCESS_PATTERN, on_upload_success)
+    except Exception as e:
+        # The timeline still refreshes every TIMELINE_REFRESH_SECONDS
+        logger.error(f"Failed to subscribe to {UPLOAD_SUCCESS_PATTERN}: {str(e)}")
+
+@router.on_event("shutdown")
+async def shutdown_event():
+    await access_tracker.stop()
+    await event_subscriber.close()
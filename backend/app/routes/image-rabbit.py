@@ -1,19 +1,31 @@
 from fastapi import APIRouter, UploadFile, Form, File, HTTPException, BackgroundTasks
-from typing import List, Optional
+from typing import Dict, List, Optional
 from config.firebase_config import bucket
 import uuid
 import asyncio
 import time
 from concurrent.futures import ThreadPoolExecutor
 import logging
-from dataclasses import dataclass, asdict
-import json
+from dataclasses import dataclass
 import aio_pika
 from aio_pika import Message, DeliveryMode
 from contextlib import asynccontextmanager
 import os
 from datetime import datetime
 
+from config.db_config import init_db_pool, close_db_pool, get_db_pool
+from app.services.image_rows import ImageRow, image_row_writer
+from app.services.imaging import read_date_taken
+from app.services.phash import dhash, to_signed, to_unsigned, group_hash_index
+from app.services.timeline import timeline_index
+from app.services.validation import InvalidImage, validate_image
+from app.services import tracing
+from app.services.partitions import partition_routing_key
+from app.services.events import (
+    UploadEvent, BatchEvent, Event, EVENT_WIRE_VERSION, HEADER_SCHEMA_VERSION, encode_event, event_group_id,
+    event_key
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -33,6 +45,7 @@ ROUTING_KEY_SUCCESS = "upload.success"
 ROUTING_KEY_FAILURE = "upload.failure"
 ROUTING_KEY_BATCH_START = "upload.batch.start"
 ROUTING_KEY_BATCH_COMPLETE = "upload.batch.complete"
+ROUTING_KEY_DUPLICATE = "upload.duplicate"
 
 # Global connection pool
 rabbitmq_connection = None
@@ -48,12 +61,14 @@ class FileData:
     size: int
 
 class UploadResult:
-    def __init__(self, filename: str, success: bool, url: str = None, error: str = None, file_size: int = 0):
+    def __init__(self, filename: str, success: bool, url: str = None, error: str = None, file_size: int = 0,
+                 image_id: str = None):
         self.filename = filename
         self.success = success
         self.url = url
         self.error = error
         self.file_size = file_size
+        self.image_id = image_id
         
     def to_dict(self):
         return {
@@ -64,46 +79,6 @@ class UploadResult:
             "file_size": self.file_size
         }
 
-@dataclass
-class UploadEvent:
-    """Event data structure for RabbitMQ messages"""
-    event_id: str
-    upload_id: str
-    user_id: str
-    group_id: str
-    filename: str
-    original_filename: str
-    file_size: int
-    content_type: str
-    firebase_path: str
-    public_url: str = None
-    success: bool = True
-    error_message: str = None
-    timestamp: str = None
-    processing_time_seconds: float = 0.0
-    
-    def __post_init__(self):
-        if self.timestamp is None:
-            self.timestamp = datetime.utcnow().isoformat()
-
-@dataclass
-class BatchEvent:
-    """Batch upload event data structure"""
-    batch_id: str
-    user_id: str
-    group_id: str
-    total_files: int
-    successful_uploads: int = 0
-    failed_uploads: int = 0
-    total_size_bytes: int = 0
-    processing_time_seconds: float = 0.0
-    timestamp: str = None
-    status: str = "started"  # started, completed, failed
-    
-    def __post_init__(self):
-        if self.timestamp is None:
-            self.timestamp = datetime.utcnow().isoformat()
-
 async def init_rabbitmq():
     """Initialize RabbitMQ connection and exchange"""
     global rabbitmq_connection, rabbitmq_channel, rabbitmq_exchange
@@ -133,25 +108,33 @@ async def close_rabbitmq():
         await rabbitmq_connection.close()
         logger.info("RabbitMQ connection closed")
 
-async def publish_event(routing_key: str, event_data: dict):
+async def publish_event(routing_key: str, event: Event, headers: Optional[dict] = None):
     """Publish event to RabbitMQ"""
     try:
         if not rabbitmq_exchange:
             logger.error("RabbitMQ not initialized")
             return
             
-        message = Message(
-            json.dumps(event_data, default=str).encode(),
-            delivery_mode=DeliveryMode.PERSISTENT,
-            content_type="application/json",
-            headers={
-                "event_type": routing_key,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        )
+        # Suffix the key with the group's partition so consumers see each group in order
+        partition_key = partition_routing_key(routing_key, event_group_id(event))
         
-        await rabbitmq_exchange.publish(message, routing_key=routing_key)
-        logger.info(f"Published event: {routing_key} for {event_data.get('filename', 'batch')}")
+        with tracing.span("publish", routing_key=routing_key, partition_key=partition_key):
+            body, content_type = encode_event(event)
+            message = Message(
+                body,
+                delivery_mode=DeliveryMode.PERSISTENT,
+                content_type=content_type,
+                message_id=event_key(event),
+                headers=tracing.inject({
+                    **(headers or {}),
+                    HEADER_SCHEMA_VERSION: EVENT_WIRE_VERSION,
+                    "event_type": routing_key,
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+            )
+            
+            await rabbitmq_exchange.publish(message, routing_key=partition_key)
+        logger.info(f"Published event: {partition_key} for {getattr(event, 'filename', 'batch')}")
         
     except Exception as e:
         logger.error(f"Failed to publish event {routing_key}: {str(e)}")
@@ -163,8 +146,9 @@ async def read_files_sequentially(files: List[UploadFile]) -> List[FileData]:
     for file in files:
         try:
             # Ensure we're at the beginning of the file
-            await file.seek(0)
-            content = await file.read()
+            with tracing.span("read", filename=file.filename):
+                await file.seek(0)
+                content = await file.read()
             
             file_data = FileData(
                 filename=file.filename,
@@ -188,16 +172,88 @@ async def read_files_sequentially(files: List[UploadFile]) -> List[FileData]:
     
     return file_data_list
 
-async def upload_single_file(user_id: str, group_id: str, file_data: FileData, upload_id: str) -> UploadResult:
-    """Upload a single file to Firebase Storage and emit RabbitMQ events"""
-    async with upload_semaphore:
+def compute_image_hash(file_data: FileData) -> Optional[int]:
+    """Perceptual hash of an upload, or None if it can't be decoded"""
+    try:
+        return dhash(file_data.content)
+    except Exception as e:
+        logger.warning(f"Could not hash {file_data.filename}: {str(e)}")
+        return None
+
+async def publish_near_duplicates(rows: List[ImageRow]):
+    """Emit an event for each new image that has near-duplicates in its group.
+
+    Runs once per committed row batch: each group is synced with the
+    database once, then every new hash is compared in memory.
+    """
+    groups: Dict[str, List[ImageRow]] = {}
+    for row in rows:
+        if row.phash is not None:
+            groups.setdefault(row.group_id, []).append(row)
+
+    for group_id, group_rows in groups.items():
+        try:
+            pool = await get_db_pool()
+            await group_hash_index.sync(pool, group_id)
+            found = []
+            for row in group_rows:
+                image_hash = to_unsigned(row.phash)
+                group_hash_index.add(group_id, row.id, image_hash)
+                found.append((row.id, group_hash_index.near(group_id, image_hash, exclude=row.id)))
+        except Exception as e:
+            logger.error(f"Near-duplicate lookup failed for group {group_id}: {str(e)}")
+            continue
+
+        for image_id, duplicates in found:
+            if duplicates:
+                await publish_event(ROUTING_KEY_DUPLICATE, {
+                    "image_id": image_id,
+                    "group_id": group_id,
+                    "duplicates": [
+                        {"image_id": duplicate_id, "distance": distance}
+                        for duplicate_id, distance in duplicates
+                    ],
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+
+# Every committed row batch is checked for near-duplicates in one pass
+image_row_writer.on_flushed = publish_near_duplicates
+
+@tracing.traced("upload_file")
+async def upload_single_file(user_id: str, group_id: str, file_data: FileData, upload_id: str,
+                             image_hash: Optional[int] = None,
+                             semaphore: Optional[asyncio.Semaphore] = None,
+                             storage_executor: Optional[ThreadPoolExecutor] = None) -> UploadResult:
+    """Upload a single file to Firebase Storage and emit RabbitMQ events.
+
+    `semaphore` and `storage_executor` default to the API's shared upload
+    slots and thread pool; batch jobs that own the process pass their own.
+    """
+    semaphore = semaphore or upload_semaphore
+    storage_executor = storage_executor or executor
+    async with semaphore:
         start_time = time.time()
         event_id = str(uuid.uuid4())
-        unique_name = f"{uuid.uuid4()}_{file_data.filename}"
+        image_id = str(uuid.uuid4())
+        tracing.annotate(upload_id=upload_id, event_id=event_id, image_id=image_id)
+        unique_name = f"{image_id}_{file_data.filename}"
         firebase_path = f"{user_id}/{group_id}/image/{unique_name}"
         
         try:
+            rejection = None
             if file_data.size == 0:
+                rejection = "File is empty or couldn't be read"
+            else:
+                # Sniff the real format from the header bytes; nothing is stored for bad files
+                with tracing.span("validate"):
+                    try:
+                        header = validate_image(file_data.content)
+                        file_data.content_type = header.content_type
+                    except InvalidImage as e:
+                        rejection = str(e)
+
+            if rejection:
+                logger.warning(f"Rejected {file_data.filename}: {rejection}")
                 # Emit failure event
                 error_event = UploadEvent(
                     event_id=event_id,
@@ -210,12 +266,12 @@ async def upload_single_file(user_id: str, group_id: str, file_data: FileData, u
                     content_type=file_data.content_type,
                     firebase_path=firebase_path,
                     success=False,
-                    error_message="File is empty or couldn't be read",
+                    error_message=rejection,
                     processing_time_seconds=time.time() - start_time
                 )
                 
-                await publish_event(ROUTING_KEY_FAILURE, asdict(error_event))
-                return UploadResult(file_data.filename, False, error="File is empty or couldn't be read", file_size=file_data.size)
+                await publish_event(ROUTING_KEY_FAILURE, error_event)
+                return UploadResult(file_data.filename, False, error=rejection, file_size=file_data.size)
             
             # Upload to Firebase Storage in thread pool
             def upload_to_storage():
@@ -228,7 +284,17 @@ async def upload_single_file(user_id: str, group_id: str, file_data: FileData, u
                 return blob.public_url
             
             loop = asyncio.get_event_loop()
-            public_url = await loop.run_in_executor(executor, upload_to_storage)
+            # Callers that already hashed the file (e.g. the bulk importer) pass image_hash
+            hash_future = None
+            if image_hash is None:
+                hash_future = loop.run_in_executor(storage_executor, compute_image_hash, file_data)
+            date_future = loop.run_in_executor(storage_executor, read_date_taken, file_data.content)
+            with tracing.span("store", size=file_data.size):
+                public_url = await loop.run_in_executor(storage_executor, upload_to_storage)
+            if hash_future is not None:
+                with tracing.span("hash"):
+                    image_hash = await hash_future
+            date_taken = await date_future
             
             upload_time = time.time() - start_time
             logger.info(f"Successfully uploaded {unique_name} in {upload_time:.2f}s")
@@ -246,12 +312,63 @@ async def upload_single_file(user_id: str, group_id: str, file_data: FileData, u
                 firebase_path=firebase_path,
                 public_url=public_url,
                 success=True,
-                processing_time_seconds=upload_time
+                processing_time_seconds=upload_time,
+                image_id=image_id
             )
             
-            await publish_event(ROUTING_KEY_SUCCESS, asdict(success_event))
+            # Buffer the image row for this upload; the success event is only
+            # published once the row has been committed
+            image_row = ImageRow(
+                id=image_id,
+                group_id=group_id,
+                filename=file_data.filename,
+                location=firebase_path,
+                created_by_user=user_id,
+                size=file_data.size,
+                phash=to_signed(image_hash) if image_hash is not None else None,
+                date_taken=date_taken
+            )
+            # Other API processes add the image to their timelines from the event
+            success_event.uploaded_at = image_row.uploaded_at.isoformat()
+            success_event.date_taken = date_taken.isoformat() if date_taken else None
+            
+            # Runs later from the batch flush; keep this file's span as the parent
+            file_span = tracing.current()
+            
+            async def on_persisted():
+                timeline_index.add(group_id, image_id, image_row.uploaded_at, date_taken)
+                with tracing.activate(file_span):
+                    await publish_event(ROUTING_KEY_SUCCESS, success_event)
             
-            return UploadResult(file_data.filename, True, public_url, file_size=file_data.size)
+            result = UploadResult(file_data.filename, True, public_url, file_size=file_data.size, image_id=image_id)
+            
+            async def on_failed(error: Exception):
+                # No row was written: drop the stored object and report the file as failed
+                result.success, result.url = False, None
+                result.error = f"Image metadata could not be saved: {str(error)}"
+                try:
+                    await loop.run_in_executor(storage_executor, bucket.blob(firebase_path).delete)
+                except Exception as e:
+                    logger.error(f"Failed to delete orphaned object {firebase_path}: {str(e)}")
+                with tracing.activate(file_span):
+                    await publish_event(ROUTING_KEY_FAILURE, UploadEvent(
+                        event_id=event_id,
+                        upload_id=upload_id,
+                        user_id=user_id,
+                        group_id=group_id,
+                        filename=unique_name,
+                        original_filename=file_data.filename,
+                        file_size=file_data.size,
+                        content_type=file_data.content_type,
+                        firebase_path=firebase_path,
+                        success=False,
+                        error_message=result.error,
+                        processing_time_seconds=time.time() - start_time
+                    ))
+            
+            await image_row_writer.add(upload_id, image_row, on_persisted=on_persisted, on_failed=on_failed)
+            
+            return result
             
         except Exception as e:
             upload_time = time.time() - start_time
@@ -273,11 +390,22 @@ async def upload_single_file(user_id: str, group_id: str, file_data: FileData, u
                 processing_time_seconds=upload_time
             )
             
-            await publish_event(ROUTING_KEY_FAILURE, asdict(error_event))
+            await publish_event(ROUTING_KEY_FAILURE, error_event)
             
             return UploadResult(file_data.filename, False, error=str(e), file_size=file_data.size)
 
+async def persist_upload_rows(upload_id: str) -> bool:
+    """Write the buffered image rows of an upload in one batch"""
+    try:
+        with tracing.span("persist", upload_id=upload_id):
+            await image_row_writer.flush(upload_id)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to persist image rows for upload {upload_id}: {str(e)}")
+        return False
+
 @router.post("/upload/")
+@tracing.traced("upload_batch")
 async def upload_images(
     user_id: str = Form(...),
     group_id: str = Form(...),
@@ -293,6 +421,7 @@ async def upload_images(
     
     upload_id = str(uuid.uuid4())
     start_time = time.time()
+    tracing.annotate(upload_id=upload_id, files=len(files))
     
     logger.info(f"Starting upload batch {upload_id} with {len(files)} files for user {user_id}, group {group_id}")
     
@@ -321,7 +450,7 @@ async def upload_images(
             total_size_bytes=total_size,
             status="started"
         )
-        await publish_event(ROUTING_KEY_BATCH_START, asdict(batch_start_event))
+        await publish_event(ROUTING_KEY_BATCH_START, batch_start_event)
         
         # Step 3: Upload all files concurrently
         logger.info("Starting concurrent uploads...")
@@ -342,6 +471,9 @@ async def upload_images(
             else:
                 processed_results.append(result)
         
+        # Step 4: Persist all image rows of this upload in one round-trip
+        metadata_persisted = await persist_upload_rows(upload_id)
+        
         # Gather statistics
         successful_uploads = sum(1 for r in processed_results if r.success)
         failed_uploads = len(processed_results) - successful_uploads
@@ -359,7 +491,7 @@ async def upload_images(
             processing_time_seconds=total_time,
             status="completed"
         )
-        await publish_event(ROUTING_KEY_BATCH_COMPLETE, asdict(batch_complete_event))
+        await publish_event(ROUTING_KEY_BATCH_COMPLETE, batch_complete_event)
         
         logger.info(
             f"Upload batch {upload_id} completed: {successful_uploads} successful, {failed_uploads} failed "
@@ -373,6 +505,7 @@ async def upload_images(
             "failed_uploads": failed_uploads,
             "processing_time": f"{total_time:.2f}s",
             "total_size_mb": f"{total_size / 1024 / 1024:.2f}",
+            "metadata_persisted": metadata_persisted,
             "results": [r.to_dict() for r in processed_results]
         }
         
@@ -388,7 +521,7 @@ async def upload_images(
             processing_time_seconds=time.time() - start_time,
             status="failed"
         )
-        await publish_event(ROUTING_KEY_BATCH_COMPLETE, asdict(batch_failure_event))
+        await publish_event(ROUTING_KEY_BATCH_COMPLETE, batch_failure_event)
         
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
@@ -412,7 +545,9 @@ async def upload_images_background(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read files: {str(e)}")
     
+    @tracing.traced("upload_batch")
     async def background_upload():
+        tracing.annotate(upload_id=upload_id, files=len(file_data_list))
         start_time = time.time()
         total_size = sum(f.size for f in file_data_list)
         
@@ -426,7 +561,7 @@ async def upload_images_background(
                 total_size_bytes=total_size,
                 status="started"
             )
-            await publish_event(ROUTING_KEY_BATCH_START, asdict(batch_start_event))
+            await publish_event(ROUTING_KEY_BATCH_START, batch_start_event)
             
             # Upload using pre-read file data
             upload_tasks = [
@@ -446,6 +581,9 @@ async def upload_images_background(
                 else:
                     processed_results.append(result)
             
+            # Persist all image rows of this upload in one round-trip
+            metadata_persisted = await persist_upload_rows(upload_id)
+            
             successful_uploads = sum(1 for r in processed_results if r.success)
             failed_uploads = len(processed_results) - successful_uploads
             total_time = time.time() - start_time
@@ -462,7 +600,7 @@ async def upload_images_background(
                 processing_time_seconds=total_time,
                 status="completed"
             )
-            await publish_event(ROUTING_KEY_BATCH_COMPLETE, asdict(batch_complete_event))
+            await publish_event(ROUTING_KEY_BATCH_COMPLETE, batch_complete_event)
             
             logger.info(f"Background upload {upload_id} completed: {successful_uploads}/{len(file_data_list)} successful")
             
@@ -478,6 +616,7 @@ async def upload_images_background(
                             "failed_uploads": failed_uploads,
                             "total_files": len(file_data_list),
                             "processing_time": total_time,
+                            "metadata_persisted": metadata_persisted,
                             "results": [r.to_dict() for r in processed_results]
                         })
                         logger.info(f"Webhook notification sent for upload {upload_id}")
@@ -496,7 +635,7 @@ async def upload_images_background(
                 processing_time_seconds=time.time() - start_time,
                 status="failed"
             )
-            await publish_event(ROUTING_KEY_BATCH_COMPLETE, asdict(batch_failure_event))
+            await publish_event(ROUTING_KEY_BATCH_COMPLETE, batch_failure_event)
             
             # Send failure webhook if provided
             if webhook_url:
@@ -535,7 +674,10 @@ async def health_check():
 @router.on_event("startup")
 async def startup_event():
     await init_rabbitmq()
+    await init_db_pool()
 
 @router.on_event("shutdown") 
 async def shutdown_event():
+    await image_row_writer.flush_all()
+    await close_db_pool()
     await close_rabbitmq()
\ No newline at end of file
@@ -8,6 +8,8 @@ from concurrent.futures import ThreadPoolExecutor
 import logging
 from dataclasses import dataclass
 
+from app.services.validation import InvalidImage, validate_image
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -82,6 +84,13 @@ async def upload_single_file(user_id: str, group_id: str, file_data: FileData) -
             if file_data.size == 0:
                 return UploadResult(file_data.filename, False, error="File is empty or couldn't be read")
             
+            # Store under the sniffed type, never the client's claim
+            try:
+                file_data.content_type = validate_image(file_data.content).content_type
+            except InvalidImage as e:
+                logger.warning(f"Rejected {file_data.filename}: {str(e)}")
+                return UploadResult(file_data.filename, False, error=str(e))
+            
             start_time = time.time()
             unique_name = f"{uuid.uuid4()}_{file_data.filename}"
             firebase_path = f"{user_id}/{group_id}/image/{unique_name}"
@@ -0,0 +1,149 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from pydantic import BaseModel
+from typing import Any, Dict, List
+import base64
+import json
+import logging
+
+from config.db_config import get_db_pool, close_db_pool
+from app.services.face_cache import FACES_DETECTED_EVENT, best_face_cache
+from app.services.subscriptions import event_subscriber
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+class FaceRefreshRequest(BaseModel):
+    face_ids: List[str]
+
+class MergeRequest(BaseModel):
+    merge_person_id: str
+    merge_into_person_id: str
+
+async def ensure_cache_loaded():
+    """Load the best-face cache on first use, and reload it periodically"""
+    if not best_face_cache.fresh:
+        pool = await get_db_pool()
+        await best_face_cache.ensure_fresh(pool)
+
+def not_modified(request: Request) -> bool:
+    return request.headers.get("if-none-match") == best_face_cache.etag
+
+@router.get("/best-faces")
+async def get_best_faces_snapshot(request: Request):
+    """Binary snapshot of the representative face of every person"""
+    await ensure_cache_loaded()
+
+    headers = {"ETag": best_face_cache.etag, "Cache-Control": "no-cache"}
+    if not_modified(request):
+        return Response(status_code=304, headers=headers)
+
+    return Response(
+        content=best_face_cache.encode(),
+        media_type="application/octet-stream",
+        headers=headers
+    )
+
+@router.get("/")
+async def list_persons(request: Request):
+    """JSON list of persons with their best face thumbnail"""
+    await ensure_cache_loaded()
+
+    headers = {"ETag": best_face_cache.etag, "Cache-Control": "no-cache"}
+    if not_modified(request):
+        return Response(status_code=304, headers=headers)
+
+    persons = [
+        {
+            "person_id": face.person_id,
+            "face_thumb_bytes": base64.b64encode(face.thumb).decode()
+        }
+        for face in best_face_cache.faces()
+    ]
+    return Response(
+        content=json.dumps(persons),
+        media_type="application/json",
+        headers=headers
+    )
+
+@router.get("/similar")
+async def list_similar_persons():
+    """Similar-person pairs with thumbnails taken from the best-face cache"""
+    await ensure_cache_loaded()
+    pool = await get_db_pool()
+
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            "SELECT person_id::uuid AS person_id, similar_person_id::uuid AS similar_person_id "
+            "FROM similar_faces ORDER BY person_id"
+        )
+
+    grouped = {}
+    for row in rows:
+        main = best_face_cache.get(row["person_id"])
+        similar = best_face_cache.get(row["similar_person_id"])
+        if main is None or similar is None:
+            continue
+
+        entry = grouped.setdefault(main.person_id, {
+            "person_id": main.person_id,
+            "thumbnail": base64.b64encode(main.thumb).decode(),
+            "sim_faces": []
+        })
+        entry["sim_faces"].append({
+            "sim_person_id": similar.person_id,
+            "thumb_img_byte": base64.b64encode(similar.thumb).decode()
+        })
+
+    return {"data": list(grouped.values())}
+
+@router.post("/best-faces/refresh")
+async def refresh_best_faces(body: FaceRefreshRequest):
+    """Apply faces that were added or rescored"""
+    await ensure_cache_loaded()
+    pool = await get_db_pool()
+
+    try:
+        touched = await best_face_cache.refresh_faces(pool, body.face_ids)
+    except Exception as e:
+        logger.error(f"Failed to refresh best faces: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Refresh failed: {str(e)}")
+
+    return {"persons_updated": touched, "etag": best_face_cache.etag}
+
+@router.post("/best-faces/merge")
+async def merge_best_faces(body: MergeRequest):
+    """Apply a person merge to the cache"""
+    if body.merge_person_id == body.merge_into_person_id:
+        raise HTTPException(status_code=400, detail="Cannot merge person into themselves")
+
+    await ensure_cache_loaded()
+    await best_face_cache.merge(body.merge_person_id, body.merge_into_person_id)
+    return {"etag": best_face_cache.etag}
+
+async def on_faces_detected(event_type: str, event: Dict[str, Any]):
+    """Offer faces persisted by the face worker to the cache"""
+    if not best_face_cache.loaded:
+        return  # the full load will include them
+    pool = await get_db_pool()
+    touched = await best_face_cache.refresh_faces(pool, event.get("face_ids") or [])
+    if touched:
+        logger.info(f"Best faces updated for {touched} persons")
+
+@router.on_event("startup")
+async def startup_event():
+    try:
+        await ensure_cache_loaded()
+    except Exception as e:
+        # The cache loads lazily on the first request if the database is not up yet
+        logger.error(f"Failed to preload best-face cache: {str(e)}")
+
+    try:
+        await event_subscriber.subscribe(FACES_DETECTED_EVENT, on_faces_detected)
+    except Exception as e:
+        logger.error(f"Failed to subscribe to {FACES_DETECTED_EVENT}: {str(e)}")
+
+@router.on_event("shutdown")
+async def shutdown_event():
+    await event_subscriber.close()
+    await close_db_pool()
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """Collects items into micro-batches flushed by size or by age.
+
+    ``handler`` receives each batch; a batch is flushed once it holds
+    ``max_batch_size`` items or its oldest item has waited ``max_delay``
+    seconds, whichever comes first. The handler may return one exception
+    (or None) per item; every item's future settles with its own outcome,
+    and an exception raised by the handler fails the whole batch.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[Optional[List[Optional[Exception]]]]],
+        max_batch_size: int = 16,
+        max_delay: float = 0.5,
+        name: str = "batch"
+    ):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.name = name
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush whatever is queued and stop the background task"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def add(self, item: Any) -> asyncio.Future:
+        """Queue an item; the returned future settles once its batch is handled"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return future
+
+    async def submit(self, item: Any):
+        """Queue an item and wait for its batch, raising the item's error if it failed"""
+        return await (await self.add(item))
+
+    async def _collect(self) -> List[Any]:
+        first = await self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                # Stop requested: flush this batch, then exit
+                self._queue.put_nowait(None)
+                break
+            batch.append(item)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if batch is None:
+                return
+            try:
+                errors = await self.handler([item for item, _ in batch])
+            except Exception as e:
+                logger.error(f"{self.name} handler failed for {len(batch)} items: {e}")
+                errors = [e] * len(batch)
+
+            for (_, future), error in zip(batch, errors or [None] * len(batch)):
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
@@ -0,0 +1,127 @@
+import json
+import os
+import time
+import uuid
+from dataclasses import MISSING, dataclass, asdict, fields
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple, Union
+
+import msgpack
+
+# Wire format of published events, sent in the `schema_version` header.
+# 1: JSON object with ISO timestamps (legacy). 2: msgpack array
+# [schema id, field values...] in the class field order below.
+#
+# v2 is positional, so the event classes evolve by these rules:
+#   - new fields go at the end and must have a default;
+#   - fields are never removed, reordered, renamed or retyped; a field that
+#     is no longer needed keeps its slot and is left at its default;
+#   - a new event class gets the next schema id in SCHEMAS.
+# decode_event fills fields missing from an older publisher's array with
+# their defaults and ignores trailing values from a newer publisher. A
+# change that can't follow these rules needs a new EVENT_WIRE_VERSION.
+EVENT_WIRE_VERSION = int(os.getenv("EVENT_WIRE_VERSION", "2"))
+HEADER_SCHEMA_VERSION = "schema_version"
+
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_MSGPACK = "application/x-msgpack"
+
+@dataclass(slots=True)
+class UploadEvent:
+    """Event data structure for RabbitMQ messages"""
+    event_id: str
+    upload_id: str
+    user_id: str
+    group_id: str
+    filename: str
+    original_filename: str
+    file_size: int
+    content_type: str
+    firebase_path: str
+    public_url: str = None
+    success: bool = True
+    error_message: str = None
+    timestamp: float = None  # epoch seconds; v1 bodies carry it as an ISO string
+    processing_time_seconds: float = 0.0
+    image_id: str = None
+    uploaded_at: str = None  # ISO; the image row's value, set once the row is committed
+    date_taken: str = None  # ISO EXIF capture time, if any
+
+    def __post_init__(self):
+        if self.timestamp is None:
+            self.timestamp = time.time()
+
+@dataclass(slots=True)
+class BatchEvent:
+    """Batch upload event data structure"""
+    batch_id: str
+    user_id: str
+    group_id: str
+    total_files: int
+    successful_uploads: int = 0
+    failed_uploads: int = 0
+    total_size_bytes: int = 0
+    processing_time_seconds: float = 0.0
+    timestamp: float = None
+    status: str = "started"  # started, completed, failed
+
+    def __post_init__(self):
+        if self.timestamp is None:
+            self.timestamp = time.time()
+
+# Schema ids are part of the wire format: append new classes, never renumber
+SCHEMAS = {1: UploadEvent, 2: BatchEvent}
+SCHEMA_IDS = {cls: schema_id for schema_id, cls in SCHEMAS.items()}
+SCHEMA_FIELDS = {schema_id: tuple(f.name for f in fields(cls)) for schema_id, cls in SCHEMAS.items()}
+# Values for trailing fields an older publisher didn't send
+SCHEMA_DEFAULTS = {
+    schema_id: {f.name: f.default for f in fields(cls) if f.default is not MISSING}
+    for schema_id, cls in SCHEMAS.items()
+}
+
+Event = Union[UploadEvent, BatchEvent, Dict[str, Any]]
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None).isoformat()
+
+def encode_event(event: Event, version: int = EVENT_WIRE_VERSION) -> Tuple[bytes, str]:
+    """Serialise an event; returns (body, content type)"""
+    if version >= 2:
+        schema_id = SCHEMA_IDS.get(type(event))
+        if schema_id is None:
+            return msgpack.packb(event, default=str), CONTENT_TYPE_MSGPACK
+        values = [schema_id]
+        values.extend(getattr(event, name) for name in SCHEMA_FIELDS[schema_id])
+        return msgpack.packb(values, default=str), CONTENT_TYPE_MSGPACK
+
+    data = event if isinstance(event, dict) else asdict(event)
+    if isinstance(data.get("timestamp"), float):
+        data = {**data, "timestamp": _iso(data["timestamp"])}
+    return json.dumps(data, default=str).encode(), CONTENT_TYPE_JSON
+
+def decode_event(body: bytes, headers: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Parse a v1 or v2 message body into a dict keyed by field name"""
+    version = int((headers or {}).get(HEADER_SCHEMA_VERSION, 1))
+    if version < 2:
+        return json.loads(body)
+
+    data = msgpack.unpackb(body)
+    if isinstance(data, list):
+        schema_id = data[0]
+        if schema_id not in SCHEMAS:
+            raise ValueError(f"Unknown event schema id {schema_id}")
+        return {**SCHEMA_DEFAULTS[schema_id], **dict(zip(SCHEMA_FIELDS[schema_id], data[1:]))}
+    return data
+
+def event_key(event: Event) -> str:
+    """Idempotency key, sent as the AMQP message_id"""
+    get = event.get if isinstance(event, dict) else lambda name: getattr(event, name, None)
+    if get("event_id"):
+        return str(get("event_id"))
+    if get("batch_id"):
+        # Start and completion share a batch_id
+        return f"{get('batch_id')}:{get('status')}"
+    return str(uuid.uuid4())
+
+def event_group_id(event: Event) -> Optional[str]:
+    return event.get("group_id") if isinstance(event, dict) else event.group_id
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Optional, Set
+
+try:
+    from google.api_core.exceptions import NotFound
+except ImportError:  # local storage backend
+    NotFound = FileNotFoundError
+
+logger = logging.getLogger(__name__)
+
+# Expiry Sweeper Configuration
+EXPIRY_BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", "500"))
+EXPIRY_DELETE_CONCURRENCY = int(os.getenv("EXPIRY_DELETE_CONCURRENCY", "8"))
+# Objects per storage delete request
+EXPIRY_DELETE_CHUNK = int(os.getenv("EXPIRY_DELETE_CHUNK", "100"))
+# Derived objects stored next to each original, named "<prefix><image id>"
+DERIVED_OBJECT_PREFIXES = [
+    p for p in os.getenv("DERIVED_OBJECT_PREFIXES", "compressed_,thumb_").split(",") if p
+]
+
+@dataclass
+class SweepStats:
+    """Progress counters for one sweep"""
+    started_at: float = field(default_factory=time.time)
+    images_scanned: int = 0
+    images_deleted: int = 0
+    objects_deleted: int = 0
+    objects_failed: int = 0
+    groups_deleted: int = 0
+
+    @property
+    def elapsed(self) -> float:
+        return max(time.time() - self.started_at, 1e-6)
+
+    def to_dict(self):
+        return {
+            "images_scanned": self.images_scanned,
+            "images_deleted": self.images_deleted,
+            "objects_deleted": self.objects_deleted,
+            "objects_failed": self.objects_failed,
+            "groups_deleted": self.groups_deleted,
+            "elapsed_seconds": round(self.elapsed, 2),
+            "images_per_second": round(self.images_deleted / self.elapsed, 1),
+            "objects_per_second": round(self.objects_deleted / self.elapsed, 1),
+        }
+
+def image_object_paths(row) -> List[str]:
+    """Original plus every derived variant of an image row"""
+    image_id = str(row["id"])
+    paths = [row["location"] or image_id]
+    paths.extend(f"{prefix}{image_id}" for prefix in DERIVED_OBJECT_PREFIXES)
+    return paths
+
+class ExpirySweeper:
+    """Deletes expired images (and groups) from storage and the database in batches"""
+
+    def __init__(self, pool, bucket, batch_size: int = EXPIRY_BATCH_SIZE,
+                 concurrency: int = EXPIRY_DELETE_CONCURRENCY, dry_run: bool = False):
+        self.pool = pool
+        self.bucket = bucket
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.dry_run = dry_run
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.stats = SweepStats()
+
+    def _batch_delete(self, paths: List[str]):
+        """Delete objects in one storage batch request"""
+        with self.bucket.client.batch():
+            for path in paths:
+                self.bucket.blob(path).delete()
+
+    def _delete_chunk(self, paths: List[str]) -> Set[str]:
+        """Delete one chunk of objects; returns failed paths"""
+        try:
+            self._batch_delete(paths)
+            return set()
+        except (NotFound, FileNotFoundError):
+            # A missing object fails the batch as a whole although the other
+            # deletes went through; already gone counts as deleted, so retry
+            # only what is still there
+            remaining = [p for p in paths if self.bucket.blob(p).exists()]
+        except Exception as e:
+            logger.error(f"Batch delete of {len(paths)} objects failed: {str(e)}")
+            return set(paths)
+
+        if not remaining:
+            return set()
+        try:
+            self._batch_delete(remaining)
+            return set()
+        except Exception as e:
+            logger.error(f"Batch delete of {len(remaining)} objects failed: {str(e)}")
+            return set(remaining)
+
+    async def delete_objects(self, paths: List[str]) -> Set[str]:
+        """Delete objects with bounded parallelism; returns the paths that failed"""
+        if self.dry_run or not paths:
+            return set()
+
+        loop = asyncio.get_event_loop()
+        chunks = [paths[i:i + EXPIRY_DELETE_CHUNK] for i in range(0, len(paths), EXPIRY_DELETE_CHUNK)]
+        results = await asyncio.gather(*[
+            loop.run_in_executor(self.executor, self._delete_chunk, chunk) for chunk in chunks
+        ])
+        failed = set().union(*results)
+        self.stats.objects_deleted += len(paths) - len(failed)
+        self.stats.objects_failed += len(failed)
+        return failed
+
+    async def _delete_rows(self, image_ids: List) -> int:
+        if self.dry_run or not image_ids:
+            return len(image_ids)
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("DELETE FROM faces WHERE image_id = ANY($1::uuid[])", image_ids)
+                result = await conn.execute("DELETE FROM images WHERE id = ANY($1::uuid[])", image_ids)
+        return int(result.split()[-1])
+
+    async def _sweep_batches(self, where: str, *params) -> int:
+        """Keyset-scan images matching `where` and delete them batch by batch"""
+        deleted = 0
+        last_id = None
+        offset = len(params)
+
+        while True:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(
+                    f"""
+                    SELECT id, location
+                    FROM images
+                    WHERE {where}
+                      AND (${offset + 1}::uuid IS NULL OR id > ${offset + 1})
+                    ORDER BY id
+                    LIMIT ${offset + 2}
+                    """,
+                    *params, last_id, self.batch_size
+                )
+            if not rows:
+                return deleted
+
+            last_id = rows[-1]["id"]
+            self.stats.images_scanned += len(rows)
+
+            # Step 1: Remove storage objects; keep rows whose objects failed for the next run
+            paths_by_row = {row["id"]: image_object_paths(row) for row in rows}
+            failed = await self.delete_objects([p for paths in paths_by_row.values() for p in paths])
+            done = [image_id for image_id, paths in paths_by_row.items() if not failed.intersection(paths)]
+
+            # Step 2: Remove the rows in one transaction
+            count = await self._delete_rows(done)
+            deleted += count
+            self.stats.images_deleted += count
+
+            logger.info(f"Expiry sweep progress: {self.stats.to_dict()}")
+
+    async def sweep_images(self, now: Optional[datetime] = None) -> int:
+        """Delete every image whose delete_at has passed"""
+        now = now or datetime.now(timezone.utc)
+        return await self._sweep_batches("delete_at IS NOT NULL AND delete_at <= $1", now)
+
+    async def sweep_groups(self, now: Optional[datetime] = None) -> int:
+        """Delete groups whose delete_at has passed, with all their images"""
+        now = now or datetime.now(timezone.utc)
+        async with self.pool.acquire() as conn:
+            groups = await conn.fetch(
+                "SELECT id FROM groups WHERE delete_at IS NOT NULL AND delete_at <= $1", now
+            )
+
+        for group in groups:
+            await self._sweep_batches("group_id = $1", group["id"])
+            if self.dry_run:
+                continue
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    remaining = await conn.fetchval(
+                        "SELECT count(*) FROM images WHERE group_id = $1", group["id"]
+                    )
+                    if remaining:
+                        # Some objects failed to delete; retry the group next run
+                        continue
+                    await conn.execute(
+                        "UPDATE users SET groups = array_remove(groups, $1) WHERE $1 = ANY(groups)",
+                        group["id"]
+                    )
+                    await conn.execute("DELETE FROM groups WHERE id = $1", group["id"])
+            self.stats.groups_deleted += 1
+
+        return self.stats.groups_deleted
+
+    async def run(self) -> SweepStats:
+        """Full sweep: expired groups first, then individually expired images"""
+        self.stats = SweepStats()
+        await self.sweep_groups()
+        await self.sweep_images()
+        logger.info(f"Expiry sweep finished: {self.stats.to_dict()}")
+        return self.stats
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import math
+import os
+import struct
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Best-Face Cache Configuration
+# Full reload interval; repairs missed faces.detected events and drops deleted faces
+BEST_FACE_REFRESH_SECONDS = float(os.getenv("BEST_FACE_REFRESH_SECONDS", "600"))
+# Published by the face worker with the ids of newly persisted faces
+FACES_DETECTED_EVENT = "faces.detected"
+
+# Binary snapshot layout (all integers big-endian):
+#   header: magic "BFC1" + uint32 person count
+#   entry:  16-byte person uuid + 16-byte face uuid + float32 quality (NaN = NULL)
+#           + uint32 thumbnail length + thumbnail bytes
+SNAPSHOT_MAGIC = b"BFC1"
+_HEADER = struct.Struct(">4sI")
+_ENTRY = struct.Struct(">16s16sfI")
+
+BEST_FACES_QUERY = """
+    SELECT DISTINCT ON (person_id) id, person_id, quality_score, face_thumb_bytes
+    FROM faces
+    WHERE person_id IS NOT NULL AND face_thumb_bytes IS NOT NULL
+    {where}
+    ORDER BY person_id, quality_score DESC NULLS LAST, id
+"""
+
+@dataclass
+class BestFace:
+    """Representative face of a person"""
+    face_id: str
+    person_id: str
+    quality_score: Optional[float]
+    thumb: bytes
+
+    def sort_key(self) -> Tuple[bool, float, str]:
+        # Same ordering as the SQL: quality DESC NULLS LAST, then id
+        missing = self.quality_score is None
+        return (missing, -(self.quality_score or 0.0), self.face_id)
+
+def _is_better(candidate: BestFace, current: Optional[BestFace]) -> bool:
+    return current is None or candidate.sort_key() < current.sort_key()
+
+def _row_to_face(row) -> BestFace:
+    return BestFace(
+        face_id=str(row["id"]),
+        person_id=str(row["person_id"]),
+        quality_score=row["quality_score"],
+        thumb=bytes(row["face_thumb_bytes"])
+    )
+
+class BestFaceCache:
+    """In-memory "best face per person" cache.
+
+    Loaded with a single DISTINCT ON scan, then maintained incrementally as
+    faces are added, rescored or merged so reads are O(persons). The scan is
+    repeated every refresh_seconds to catch what the incremental path missed.
+    """
+
+    def __init__(self, refresh_seconds: float = BEST_FACE_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.loaded_at = 0.0
+        self._faces: Dict[str, BestFace] = {}
+        self._lock = asyncio.Lock()
+        self._generation = uuid.uuid4().hex[:8]
+        self._version = 0
+        self._snapshot: Optional[bytes] = None
+        self._snapshot_version = -1
+        self.loaded = False
+
+    @property
+    def etag(self) -> str:
+        return f'"{self._generation}-{self._version}"'
+
+    def __len__(self) -> int:
+        return len(self._faces)
+
+    def get(self, person_id: str) -> Optional[BestFace]:
+        return self._faces.get(str(person_id))
+
+    def faces(self) -> List[BestFace]:
+        return sorted(self._faces.values(), key=lambda f: f.person_id)
+
+    def _bump(self):
+        self._version += 1
+
+    def offer(self, face: BestFace) -> bool:
+        """Keep the face if it beats the person's current representative"""
+        if _is_better(face, self._faces.get(face.person_id)):
+            self._faces[face.person_id] = face
+            self._bump()
+            return True
+        return False
+
+    @property
+    def fresh(self) -> bool:
+        return self.loaded and time.time() - self.loaded_at < self.refresh_seconds
+
+    async def load(self, pool):
+        """Populate the cache from the faces table"""
+        async with self._lock:
+            await self._load(pool)
+
+    async def ensure_fresh(self, pool):
+        """Load on first use and reload once refresh_seconds old"""
+        if self.fresh:
+            return
+        async with self._lock:
+            if not self.fresh:
+                await self._load(pool)
+
+    async def _load(self, pool):
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(BEST_FACES_QUERY.format(where=""))
+
+        faces = {str(row["person_id"]): _row_to_face(row) for row in rows}
+        # Keep the ETag (and clients' copies) when a reload finds nothing new
+        if faces != self._faces:
+            self._faces = faces
+            self._bump()
+        self.loaded = True
+        self.loaded_at = time.time()
+        logger.info(f"Loaded best faces for {len(self._faces)} persons")
+
+    async def _reload_persons(self, conn, person_ids: List[str]):
+        rows = await conn.fetch(
+            BEST_FACES_QUERY.format(where="AND person_id = ANY($1::uuid[])"),
+            person_ids
+        )
+        found = {str(row["person_id"]): _row_to_face(row) for row in rows}
+
+        for person_id in person_ids:
+            if person_id in found:
+                self._faces[person_id] = found[person_id]
+            else:
+                self._faces.pop(person_id, None)
+        self._bump()
+
+    async def refresh_faces(self, pool, face_ids: List[str]) -> int:
+        """Apply added or rescored faces; returns the number of persons touched"""
+        if not face_ids:
+            return 0
+
+        async with self._lock:
+            async with pool.acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    SELECT id, person_id, quality_score, face_thumb_bytes
+                    FROM faces
+                    WHERE id = ANY($1::uuid[])
+                      AND person_id IS NOT NULL AND face_thumb_bytes IS NOT NULL
+                    """,
+                    face_ids
+                )
+
+                wanted = {str(face_id) for face_id in face_ids}
+                incoming = {str(row["id"]): _row_to_face(row) for row in rows}
+                touched = set()
+                stale = set()
+
+                # Persons whose representative was among the changed faces
+                for person_id, current in list(self._faces.items()):
+                    if current.face_id not in wanted:
+                        continue
+                    face = incoming.pop(current.face_id, None)
+                    if face is None or face.person_id != person_id or face.sort_key() > current.sort_key():
+                        # Moved, deleted or rescored downwards: it may no longer win
+                        stale.add(person_id)
+                        if face is not None:
+                            incoming[face.face_id] = face
+                    else:
+                        self._faces[person_id] = face
+                        self._bump()
+                        touched.add(person_id)
+
+                for face in incoming.values():
+                    if face.person_id not in stale and self.offer(face):
+                        touched.add(face.person_id)
+
+                if stale:
+                    await self._reload_persons(conn, sorted(stale))
+                    touched |= stale
+
+            return len(touched)
+
+    async def merge(self, merge_person_id: str, merge_into_person_id: str):
+        """Fold one person's representative into another after a merge"""
+        async with self._lock:
+            merged = self._faces.pop(str(merge_person_id), None)
+            if merged is None:
+                return
+
+            merged.person_id = str(merge_into_person_id)
+            if not self.offer(merged):
+                self._bump()
+
+    def encode(self) -> bytes:
+        """Compact binary snapshot, rebuilt only when the cache changed"""
+        if self._snapshot is not None and self._snapshot_version == self._version:
+            return self._snapshot
+
+        faces = self.faces()
+        parts = [_HEADER.pack(SNAPSHOT_MAGIC, len(faces))]
+        for face in faces:
+            quality = math.nan if face.quality_score is None else face.quality_score
+            parts.append(_ENTRY.pack(
+                uuid.UUID(face.person_id).bytes,
+                uuid.UUID(face.face_id).bytes,
+                quality,
+                len(face.thumb)
+            ))
+            parts.append(face.thumb)
+
+        self._snapshot = b"".join(parts)
+        self._snapshot_version = self._version
+        return self._snapshot
+
+def decode_snapshot(data: bytes) -> List[BestFace]:
+    """Parse a snapshot produced by BestFaceCache.encode"""
+    magic, count = _HEADER.unpack_from(data, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a best-face snapshot")
+
+    offset = _HEADER.size
+    faces = []
+    for _ in range(count):
+        person, face, quality, length = _ENTRY.unpack_from(data, offset)
+        offset += _ENTRY.size
+        faces.append(BestFace(
+            face_id=str(uuid.UUID(bytes=face)),
+            person_id=str(uuid.UUID(bytes=person)),
+            quality_score=None if math.isnan(quality) else quality,
+            thumb=data[offset:offset + length]
+        ))
+        offset += length
+    return faces
+
+# Process-wide cache instance
+best_face_cache = BestFaceCache()
@@ -0,0 +1,208 @@
+import io
+import logging
+import os
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# ONNX models: an UltraFace-style detector (scores (N, K, 2) + corner boxes
+# (N, K, 4) normalised to 0..1) and an ArcFace-style embedder (112x112 RGB ->
+# 512-d). Both must be exported with a dynamic batch axis.
+DETECTOR_MODEL = os.getenv("FACE_DETECTOR_MODEL", "models/face_detector.onnx")
+EMBEDDER_MODEL = os.getenv("FACE_EMBEDDER_MODEL", "models/face_embedder.onnx")
+
+DETECTOR_SIZE = (320, 240)  # width, height
+EMBEDDER_SIZE = (112, 112)
+FACE_THUMB_SIZE = (160, 160)
+SCORE_THRESHOLD = 0.7
+NMS_IOU_THRESHOLD = 0.3
+MAX_FACES_PER_IMAGE = 50
+
+# Per-process ONNX sessions, created by init_worker
+_detector = None
+_embedder = None
+
+def init_worker(threads_per_worker: int = 1):
+    """Process pool initializer: load both models once per worker process"""
+    global _detector, _embedder
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads_per_worker
+    options.inter_op_num_threads = 1
+    providers = ["CPUExecutionProvider"]
+
+    _detector = ort.InferenceSession(DETECTOR_MODEL, options, providers=providers)
+    _embedder = ort.InferenceSession(EMBEDDER_MODEL, options, providers=providers)
+
+def _decode_rgb(content: bytes, max_side: int = 1024) -> Image.Image:
+    img = Image.open(io.BytesIO(content))
+    img.draft("RGB", (max_side, max_side))
+    img = img.convert("RGB")
+    img.thumbnail((max_side, max_side))
+    return img
+
+def _to_tensor(images: List[Image.Image], size: Tuple[int, int]) -> np.ndarray:
+    """Resize and stack images into one normalised NCHW float32 tensor"""
+    batch = np.stack([np.asarray(img.resize(size, Image.BILINEAR), dtype=np.float32) for img in images])
+    batch = (batch - 127.0) / 128.0
+    return np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy non-maximum suppression; returns kept indices by descending score"""
+    order = scores.argsort()[::-1]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        x1 = np.maximum(boxes[best, 0], boxes[rest, 0])
+        y1 = np.maximum(boxes[best, 1], boxes[rest, 1])
+        x2 = np.minimum(boxes[best, 2], boxes[rest, 2])
+        y2 = np.minimum(boxes[best, 3], boxes[rest, 3])
+        inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        iou = inter / (areas[best] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+def _jpeg(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+def analyse_images(contents: List[bytes]) -> List[List[Dict]]:
+    """Detect and embed faces for a batch of encoded images (runs in a worker process).
+
+    Detection runs once over the whole batch tensor, and every face crop of
+    the batch is embedded in a second single call.
+    """
+    if _detector is None:
+        init_worker()
+
+    images: List[Optional[Image.Image]] = []
+    for content in contents:
+        try:
+            images.append(_decode_rgb(content))
+        except Exception as e:
+            logger.warning(f"Could not decode image for face analysis: {e}")
+            images.append(None)
+
+    results: List[List[Dict]] = [[] for _ in contents]
+    valid = [i for i, img in enumerate(images) if img is not None]
+    if not valid:
+        return results
+
+    # Step 1: Batched detection
+    tensor = _to_tensor([images[i] for i in valid], DETECTOR_SIZE)
+    scores, boxes = _detector.run(None, {_detector.get_inputs()[0].name: tensor})
+
+    crops = []
+    owners = []
+    for row, image_index in enumerate(valid):
+        face_scores = scores[row, :, 1]
+        mask = face_scores > SCORE_THRESHOLD
+        if not mask.any():
+            continue
+
+        candidate_boxes = np.clip(boxes[row][mask], 0.0, 1.0)
+        candidate_scores = face_scores[mask]
+        keep = nms(candidate_boxes, candidate_scores, NMS_IOU_THRESHOLD)[:MAX_FACES_PER_IMAGE]
+
+        img = images[image_index]
+        width, height = img.size
+        for box, score in zip(candidate_boxes[keep], candidate_scores[keep]):
+            left, top, right, bottom = (box * [width, height, width, height]).astype(int)
+            if right - left < 8 or bottom - top < 8:
+                continue
+            crop = img.crop((left, top, right, bottom))
+            crops.append(crop)
+            owners.append((image_index, float(score), [int(left), int(top), int(right), int(bottom)]))
+
+    if not crops:
+        return results
+
+    # Step 2: One embedding call for every face in the batch
+    embeddings = _embedder.run(None, {_embedder.get_inputs()[0].name: _to_tensor(crops, EMBEDDER_SIZE)})[0]
+    embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-9)
+
+    for crop, (image_index, score, bbox), embedding in zip(crops, owners, embeddings):
+        thumb = crop.copy()
+        thumb.thumbnail(FACE_THUMB_SIZE)
+        results[image_index].append({
+            "id": str(uuid.uuid4()),
+            "bbox": bbox,
+            "quality_score": score,
+            "face_thumb_bytes": _jpeg(thumb),
+            "embedding": embedding.astype(np.float32).tolist(),
+        })
+
+    return results
+
+# Columns written by persist_faces. person_id is filled in later by clustering.
+#
+#   CREATE TABLE faces (
+#       id               uuid PRIMARY KEY,
+#       image_id         uuid NOT NULL,
+#       person_id        uuid,
+#       bbox             integer[] NOT NULL,  -- left, top, right, bottom of the decoded image
+#       quality_score    real,
+#       face_thumb_bytes bytea,
+#       embedding        vector(512)          -- pgvector; real[] works too
+#   );
+#
+# pgvector has no built-in asyncpg codec; config.db_config registers one on
+# every pool connection so the embedding can be COPYed as a list of floats.
+FACE_COLUMNS = ["id", "image_id", "bbox", "quality_score", "face_thumb_bytes", "embedding"]
+
+async def persist_faces(pool, image_ids: List[str], faces: List[Tuple[str, Dict]]) -> List[str]:
+    """Replace the faces of a batch of analysed images; returns the new face ids.
+
+    ``image_ids`` lists every image analysed, including those without faces.
+    Their earlier faces are deleted in the same transaction as the COPY, so
+    a redelivered event or a faces-stage backfill doesn't duplicate them.
+    """
+    if not image_ids:
+        return []
+
+    records = [
+        (
+            uuid.UUID(face["id"]),
+            uuid.UUID(image_id),
+            face["bbox"],
+            face["quality_score"],
+            face["face_thumb_bytes"],
+            face["embedding"],
+        )
+        for image_id, face in faces
+    ]
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("DELETE FROM faces WHERE image_id = ANY($1::uuid[])", image_ids)
+            if records:
+                await conn.copy_records_to_table("faces", records=records, columns=FACE_COLUMNS)
+    return [face["id"] for _, face in faces]
+
+class AdaptiveBatchSize:
+    """Tunes the batch size against a per-batch latency budget (AIMD).
+
+    Grows additively while batches finish well inside the budget and halves
+    when a batch overruns it.
+    """
+
+    def __init__(self, budget_seconds: float, initial: int = 8, minimum: int = 1, maximum: int = 64):
+        self.budget_seconds = budget_seconds
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def observe(self, batch_size: int, elapsed: float) -> int:
+        if elapsed > self.budget_seconds:
+            self.size = max(self.minimum, self.size // 2)
+        elif elapsed < 0.7 * self.budget_seconds and batch_size >= self.size:
+            self.size = min(self.maximum, self.size + 2)
+        return self.size
@@ -0,0 +1,134 @@
+import logging
+import time
+from dataclasses import dataclass, astuple, fields
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.db_config import get_db_pool
+
+logger = logging.getLogger(__name__)
+
+# Rows are flushed when an upload batch ends or when this many are buffered
+MAX_BUFFERED_ROWS = 500
+
+@dataclass
+class ImageRow:
+    """One row of the images table, in COPY column order"""
+    id: str
+    group_id: str
+    filename: str
+    location: str
+    created_by_user: str
+    size: int
+    uploaded_at: datetime = None
+    status: str = "hot"
+    phash: Optional[int] = None  # ALTER TABLE images ADD COLUMN phash bigint
+    date_taken: Optional[datetime] = None  # EXIF capture time, when the file has one
+
+    def __post_init__(self):
+        if self.uploaded_at is None:
+            self.uploaded_at = datetime.now(timezone.utc)
+
+IMAGE_COLUMNS = [f.name for f in fields(ImageRow)]
+
+class ImageRowWriter:
+    """Buffers image rows per upload_id and writes each batch with one COPY.
+
+    A row may carry an ``on_persisted`` callback (e.g. publishing its
+    upload.success event) that runs only once the COPY has committed, so
+    downstream consumers never see an image before its row exists, and an
+    ``on_failed`` callback that runs with the error if the COPY fails.
+    ``on_flushed`` then receives the whole committed batch, for work that
+    is cheaper done once per batch than once per row.
+    """
+
+    def __init__(self, max_buffered_rows: int = MAX_BUFFERED_ROWS,
+                 on_flushed: Optional[Callable[[List[ImageRow]], Awaitable]] = None):
+        self.max_buffered_rows = max_buffered_rows
+        self.on_flushed = on_flushed
+        self._buffers: Dict[str, List[ImageRow]] = {}
+        self._callbacks: Dict[str, List[Tuple[Optional[Callable[[], Awaitable]],
+                                              Optional[Callable[[Exception], Awaitable]]]]] = {}
+
+    def pending(self, upload_id: Optional[str] = None) -> int:
+        if upload_id is not None:
+            return len(self._buffers.get(upload_id, []))
+        return sum(len(rows) for rows in self._buffers.values())
+
+    async def add(self, upload_id: str, row: ImageRow, on_persisted: Callable[[], Awaitable] = None,
+                  on_failed: Callable[[Exception], Awaitable] = None):
+        """Buffer a row; flushes early if the upload grows past the buffer limit"""
+        rows = self._buffers.setdefault(upload_id, [])
+        rows.append(row)
+        self._callbacks.setdefault(upload_id, []).append((on_persisted, on_failed))
+        if len(rows) >= self.max_buffered_rows:
+            try:
+                await self.flush(upload_id)
+            except Exception:
+                pass  # already logged; every buffered row's on_failed has run
+
+    async def flush(self, upload_id: str) -> int:
+        """Write every buffered row of an upload in a single round-trip"""
+        rows = self._buffers.pop(upload_id, None)
+        callbacks = self._callbacks.pop(upload_id, [])
+        if not rows:
+            return 0
+
+        start_time = time.time()
+        try:
+            pool = await get_db_pool()
+            async with pool.acquire() as conn:
+                await copy_rows(conn, rows)
+        except Exception as e:
+            logger.error(f"Failed to persist {len(rows)} image rows for upload {upload_id}: {str(e)}")
+            for _, on_failed in callbacks:
+                if on_failed is not None:
+                    try:
+                        await on_failed(e)
+                    except Exception as callback_error:
+                        logger.error(f"Row failure handler for upload {upload_id} failed: {str(callback_error)}")
+            raise
+
+        logger.info(
+            f"Persisted {len(rows)} image rows for upload {upload_id} "
+            f"in {time.time() - start_time:.3f}s"
+        )
+
+        for on_persisted, _ in callbacks:
+            if on_persisted is not None:
+                await on_persisted()
+        if self.on_flushed is not None:
+            try:
+                await self.on_flushed(rows)
+            except Exception as e:
+                logger.error(f"Flush handler for upload {upload_id} failed: {str(e)}")
+
+        return len(rows)
+
+    async def flush_all(self):
+        """Flush every pending upload (used on shutdown)"""
+        for upload_id in list(self._buffers):
+            try:
+                await self.flush(upload_id)
+            except Exception as e:
+                logger.error(f"Shutdown flush failed for upload {upload_id}: {str(e)}")
+
+async def copy_rows(conn, rows: List[ImageRow]):
+    """Multi-row COPY into images"""
+    await conn.copy_records_to_table(
+        "images",
+        records=[astuple(row) for row in rows],
+        columns=IMAGE_COLUMNS
+    )
+
+async def insert_rows(conn, rows: List[ImageRow]):
+    """Batched INSERT fallback for callers that need ON CONFLICT handling"""
+    placeholders = ", ".join(f"${i + 1}" for i in range(len(IMAGE_COLUMNS)))
+    await conn.executemany(
+        f"INSERT INTO images ({', '.join(IMAGE_COLUMNS)}) VALUES ({placeholders}) "
+        f"ON CONFLICT (id) DO NOTHING",
+        [astuple(row) for row in rows]
+    )
+
+# Process-wide writer instance
+image_row_writer = ImageRowWriter()
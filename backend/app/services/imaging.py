@@ -0,0 +1,45 @@
+import io
+from datetime import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+def decode_gray(content: bytes, size: Tuple[int, int]) -> np.ndarray:
+    """Decode image bytes straight to a small grayscale float32 array.
+
+    JPEGs are decoded at a reduced DCT scale via ``draft`` so the full
+    resolution image is never materialised.
+    """
+    with Image.open(io.BytesIO(content)) as img:
+        img.draft("L", (size[0] * 4, size[1] * 4))
+        gray = img.convert("L").resize(size, Image.BOX)
+        return np.asarray(gray, dtype=np.float32)
+
+def decode_gray_fit(content: bytes, max_side: int) -> np.ndarray:
+    """Like decode_gray, but scaled to fit within max_side keeping the aspect ratio"""
+    with Image.open(io.BytesIO(content)) as img:
+        img.draft("L", (max_side * 4, max_side * 4))
+        gray = img.convert("L")
+        gray.thumbnail((max_side, max_side), Image.BOX)
+        return np.asarray(gray, dtype=np.float32)
+
+# EXIF tags: the Exif sub-IFD, DateTimeOriginal inside it, and the base IFD's DateTime
+EXIF_IFD = 0x8769
+EXIF_DATE_TIME_ORIGINAL = 36867
+EXIF_DATE_TIME = 306
+
+def read_date_taken(content: bytes) -> Optional[datetime]:
+    """Capture time from the EXIF header, without decoding any pixels"""
+    try:
+        with Image.open(io.BytesIO(content)) as img:
+            exif = img.getexif()
+            value = exif.get_ifd(EXIF_IFD).get(EXIF_DATE_TIME_ORIGINAL) or exif.get(EXIF_DATE_TIME)
+    except Exception:
+        return None
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.strptime(value.strip("\x00 ")[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
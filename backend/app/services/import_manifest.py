@@ -0,0 +1,163 @@
+import hashlib
+import io
+import logging
+import mimetypes
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+from app.services.phash import dhash
+
+logger = logging.getLogger(__name__)
+
+# Only formats Pillow decodes out of the box; HEIC would need the pillow-heif plugin
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tif", ".tiff"}
+
+STATUS_DONE = "done"          # object stored and row committed
+STATUS_UPLOADED = "uploaded"  # object stored, row not committed yet (re-uploaded on resume)
+STATUS_DUPLICATE = "duplicate"
+STATUS_FAILED = "failed"
+
+@dataclass
+class FileInfo:
+    """Content hash and metadata of one local file, computed in a worker process"""
+    path: str
+    size: int
+    mtime_ns: int
+    sha256: Optional[str] = None
+    phash: Optional[int] = None
+    content_type: str = "application/octet-stream"
+    width: Optional[int] = None
+    height: Optional[int] = None
+    error: Optional[str] = None
+
+def walk_images(root: str) -> Iterator[os.DirEntry]:
+    """Depth-first scandir walk yielding image files, in a stable order"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            logger.warning(f"Skipping unreadable directory {directory}: {str(e)}")
+            continue
+        for entry in reversed(entries):
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+        for entry in entries:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                yield entry
+
+def inspect_file(path: str) -> FileInfo:
+    """Hash and extract metadata from a file (runs in a worker process)"""
+    stat = os.stat(path)
+    info = FileInfo(path=path, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+        info.sha256 = hashlib.sha256(content).hexdigest()
+        with Image.open(io.BytesIO(content)) as img:
+            info.width, info.height = img.size
+            info.content_type = Image.MIME.get(img.format) or info.content_type
+        info.phash = dhash(content)
+    except Exception as e:
+        info.error = str(e)
+        if info.content_type == "application/octet-stream":
+            info.content_type = mimetypes.guess_type(path)[0] or info.content_type
+    return info
+
+class ImportManifest:
+    """SQLite checkpoint of every file an import has seen.
+
+    A file is skipped on the next run when it is recorded as done with the
+    same size and mtime, so an interrupted import resumes where it stopped
+    without re-uploading anything. Duplicates are re-checked by content hash
+    on every run, in case the copy that was kept failed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT,
+                status TEXT NOT NULL,
+                image_id TEXT,
+                url TEXT,
+                width INTEGER,
+                height INTEGER,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256)")
+        self.conn.commit()
+
+        # Loaded once so the directory walk never waits on SQLite
+        self._finished: Dict[str, Tuple[int, int]] = {
+            path: (size, mtime_ns)
+            for path, size, mtime_ns in self.conn.execute(
+                "SELECT path, size, mtime_ns FROM files WHERE status = ?", (STATUS_DONE,)
+            )
+        }
+        self._hashes = {
+            sha256 for (sha256,) in self.conn.execute(
+                "SELECT sha256 FROM files WHERE status = ? AND sha256 IS NOT NULL", (STATUS_DONE,)
+            )
+        }
+
+    def is_finished(self, path: str, size: int, mtime_ns: int) -> bool:
+        return self._finished.get(path) == (size, mtime_ns)
+
+    def claim_hash(self, sha256: str) -> bool:
+        """True the first time a content hash is seen; later copies are duplicates"""
+        if sha256 in self._hashes:
+            return False
+        self._hashes.add(sha256)
+        return True
+
+    def release_hash(self, sha256: str):
+        """Forget a claimed hash whose upload failed so a later copy can retry it"""
+        self._hashes.discard(sha256)
+
+    def record(self, entries: List[Tuple[FileInfo, str, Optional[str], Optional[str], Optional[str]]]):
+        """Upsert (info, status, image_id, url, error) tuples in one transaction"""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO files (path, size, mtime_ns, sha256, status, image_id, url, width, height, error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET
+                    size = excluded.size, mtime_ns = excluded.mtime_ns, sha256 = excluded.sha256,
+                    status = excluded.status, image_id = excluded.image_id, url = excluded.url,
+                    width = excluded.width, height = excluded.height, error = excluded.error,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (info.path, info.size, info.mtime_ns, info.sha256, status, image_id, url,
+                     info.width, info.height, error, now)
+                    for info, status, image_id, url, error in entries
+                ]
+            )
+        for info, status, _, _, _ in entries:
+            if status == STATUS_DONE:
+                self._finished[info.path] = (info.size, info.mtime_ns)
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self.conn.execute("SELECT status, count(*) FROM files GROUP BY status").fetchall())
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,211 @@
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Images table rows pulled per round-trip when syncing the manifest
+MANIFEST_SYNC_BATCH = 5000
+# Rows are committed a little after their uploaded_at is stamped, so each sync
+# re-reads this window behind the watermark to catch late commits
+MANIFEST_SYNC_OVERLAP = timedelta(minutes=10)
+NIL_UUID = "00000000-0000-0000-0000-000000000000"
+
+# Consumers record each stage they complete in the database:
+#   CREATE TABLE image_stage_versions (
+#       image_id uuid NOT NULL,
+#       stage text NOT NULL,
+#       version integer NOT NULL,
+#       processed_at timestamptz NOT NULL DEFAULT now(),
+#       PRIMARY KEY (stage, image_id)
+#   );
+#   CREATE INDEX image_stage_versions_processed_idx ON image_stage_versions (processed_at);
+
+async def record_stage_versions(pool, stage: str, version: int, image_ids: List[str]):
+    """Record that `stage` finished at `version` for these images (called by the consumers)"""
+    if not image_ids:
+        return
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            INSERT INTO image_stage_versions (image_id, stage, version, processed_at)
+            SELECT id, $2, $3, now() FROM unnest($1::uuid[]) AS id
+            ON CONFLICT (stage, image_id)
+            DO UPDATE SET version = EXCLUDED.version, processed_at = EXCLUDED.processed_at
+            """,
+            image_ids, stage, version
+        )
+
+class ObjectManifest:
+    """Local SQLite index of stored images and the version each stage last ran at.
+
+    The manifest is filled incrementally from the images table using an
+    (uploaded_at, id) watermark, so a sync only reads rows added since the
+    previous run instead of listing the bucket. Stage versions come from
+    image_stage_versions, which the consumers write once a stage has
+    actually succeeded, pulled by processed_at the same way. Backfills then
+    find stale objects for a stage with one indexed local query.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS objects (
+                image_id TEXT PRIMARY KEY,
+                user_id TEXT,
+                group_id TEXT,
+                filename TEXT,
+                path TEXT NOT NULL,
+                size INTEGER,
+                uploaded_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS objects_group ON objects (group_id, image_id);
+            -- Written at enqueue time by earlier versions, so it can't be trusted
+            DROP TABLE IF EXISTS stage_versions;
+            CREATE TABLE IF NOT EXISTS stage_runs (
+                image_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                processed_at TEXT NOT NULL,
+                PRIMARY KEY (stage, image_id)
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                uploaded_at TEXT,
+                image_id TEXT
+            );
+            CREATE TABLE IF NOT EXISTS stage_sync_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                processed_at TEXT
+            );
+            """
+        )
+        self.conn.commit()
+
+    def watermark(self):
+        row = self.conn.execute("SELECT uploaded_at, image_id FROM sync_state WHERE id = 1").fetchone()
+        if row is None or row["uploaded_at"] is None:
+            return None, None
+        return datetime.fromisoformat(row["uploaded_at"]), row["image_id"]
+
+    async def sync(self, pool, batch_size: int = MANIFEST_SYNC_BATCH) -> int:
+        """Pull images and stage versions added since the last sync; returns the number of rows read"""
+        return await self._sync_objects(pool, batch_size) + await self._sync_stage_runs(pool, batch_size)
+
+    async def _sync_objects(self, pool, batch_size: int) -> int:
+        last_at, last_id = self.watermark()
+        if last_at is not None:
+            last_at, last_id = last_at - MANIFEST_SYNC_OVERLAP, NIL_UUID
+        added = 0
+
+        while True:
+            # Rows without uploaded_at are unfinished uploads with no place in the
+            # watermark order; they are picked up once the column is set
+            async with pool.acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    SELECT id, created_by_user, group_id, filename, location, size, uploaded_at
+                    FROM images
+                    WHERE uploaded_at IS NOT NULL
+                      AND ($1::timestamptz IS NULL OR (uploaded_at, id) > ($1, $2::uuid))
+                    ORDER BY uploaded_at, id
+                    LIMIT $3
+                    """,
+                    last_at, last_id, batch_size
+                )
+            if not rows:
+                return added
+
+            last_at, last_id = rows[-1]["uploaded_at"], str(rows[-1]["id"])
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (str(r["id"]), str(r["created_by_user"]), str(r["group_id"]), r["filename"],
+                         r["location"] or str(r["id"]), r["size"], r["uploaded_at"].isoformat())
+                        for r in rows
+                    ]
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (id, uploaded_at, image_id) VALUES (1, ?, ?)",
+                    (last_at.isoformat(), last_id)
+                )
+            added += len(rows)
+            logger.info(f"Manifest sync: {added} rows read")
+
+    async def _sync_stage_runs(self, pool, batch_size: int) -> int:
+        row = self.conn.execute("SELECT processed_at FROM stage_sync_state WHERE id = 1").fetchone()
+        last_at = datetime.fromisoformat(row["processed_at"]) - MANIFEST_SYNC_OVERLAP if row else None
+        last_id = NIL_UUID
+        added = 0
+
+        while True:
+            async with pool.acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    SELECT image_id, stage, version, processed_at
+                    FROM image_stage_versions
+                    WHERE $1::timestamptz IS NULL OR (processed_at, image_id) > ($1, $2::uuid)
+                    ORDER BY processed_at, image_id
+                    LIMIT $3
+                    """,
+                    last_at, last_id, batch_size
+                )
+            if not rows:
+                return added
+
+            last_at, last_id = rows[-1]["processed_at"], str(rows[-1]["image_id"])
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO stage_runs VALUES (?, ?, ?, ?)",
+                    [(str(r["image_id"]), r["stage"], r["version"], r["processed_at"].isoformat()) for r in rows]
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO stage_sync_state (id, processed_at) VALUES (1, ?)",
+                    (last_at.isoformat(),)
+                )
+            added += len(rows)
+            logger.info(f"Manifest sync: {added} stage versions read")
+
+    def _stale_filter(self, group_id: Optional[str]) -> str:
+        return (
+            "FROM objects o LEFT JOIN stage_runs v ON v.stage = :stage AND v.image_id = o.image_id "
+            "WHERE (v.version IS NULL OR v.version < :version)"
+            + (" AND o.group_id = :group_id" if group_id else "")
+        )
+
+    def count_stale(self, stage: str, version: int, group_id: Optional[str] = None) -> int:
+        return self.conn.execute(
+            f"SELECT count(*) {self._stale_filter(group_id)}",
+            {"stage": stage, "version": version, "group_id": group_id}
+        ).fetchone()[0]
+
+    def stale(self, stage: str, version: int, group_id: Optional[str] = None,
+              after: str = "", limit: int = 500) -> List[sqlite3.Row]:
+        """Next page of objects whose `stage` ran at an older version (or never)"""
+        return self.conn.execute(
+            f"SELECT o.* {self._stale_filter(group_id)} AND o.image_id > :after ORDER BY o.image_id LIMIT :limit",
+            {"stage": stage, "version": version, "group_id": group_id, "after": after, "limit": limit}
+        ).fetchall()
+
+    def forget(self, image_ids: List[str]):
+        """Drop images that no longer exist (deleted or expired)"""
+        with self.conn:
+            self.conn.executemany("DELETE FROM objects WHERE image_id = ?", [(i,) for i in image_ids])
+            self.conn.executemany("DELETE FROM stage_runs WHERE image_id = ?", [(i,) for i in image_ids])
+
+    def summary(self) -> Dict[str, int]:
+        stages = dict(self.conn.execute(
+            "SELECT stage || ' v' || version, count(*) FROM stage_runs GROUP BY stage, version"
+        ).fetchall())
+        stages["objects"] = self.conn.execute("SELECT count(*) FROM objects").fetchone()[0]
+        return stages
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,286 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+import zlib
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import aio_pika
+
+logger = logging.getLogger(__name__)
+
+# Partitioning Configuration
+# Changing UPLOAD_PARTITIONS remaps groups; drain the queues before changing it
+UPLOAD_PARTITIONS = int(os.getenv("UPLOAD_PARTITIONS", "16"))
+PARTITION_QUEUE_PREFIX = os.getenv("PARTITION_QUEUE_PREFIX", "upload_events")
+MEMBERS_EXCHANGE = os.getenv("PARTITION_MEMBERS_EXCHANGE", "file_uploads.members")
+HEARTBEAT_INTERVAL = float(os.getenv("PARTITION_HEARTBEAT_INTERVAL", "5"))
+# A member that misses this many heartbeats is dropped and its partitions move
+HEARTBEAT_MISSES = int(os.getenv("PARTITION_HEARTBEAT_MISSES", "3"))
+# How long a released partition waits for its in-flight messages before letting go anyway
+PARTITION_DRAIN_TIMEOUT = float(os.getenv("PARTITION_DRAIN_TIMEOUT", "30"))
+# Unacked messages per partition channel; >1 only helps handlers that settle messages later
+PARTITION_PREFETCH = int(os.getenv("PARTITION_PREFETCH", "1"))
+
+# Event types routed to the partition queues (topic binding patterns, without the suffix).
+# Other events (e.g. upload.duplicate) are published under their plain routing key.
+PARTITIONED_EVENTS = ["upload.success", "upload.failure", "upload.batch.*"]
+
+def topic_matches(pattern: str, routing_key: str) -> bool:
+    """AMQP topic matching: `*` is exactly one word, `#` zero or more"""
+    def match(p: List[str], k: List[str]) -> bool:
+        if not p:
+            return not k
+        if p[0] == "#":
+            return any(match(p[1:], k[i:]) for i in range(len(k) + 1))
+        return bool(k) and p[0] in ("*", k[0]) and match(p[1:], k[1:])
+    return match(pattern.split("."), routing_key.split("."))
+
+def is_partitioned(routing_key: str) -> bool:
+    """Whether a partition queue is bound for this event type"""
+    return any(topic_matches(pattern, routing_key) for pattern in PARTITIONED_EVENTS)
+
+def partition_for(group_id: Optional[str], partitions: int = UPLOAD_PARTITIONS) -> int:
+    """Stable partition of a group; crc32 so every process agrees (hash() is salted)"""
+    return zlib.crc32(str(group_id or "").encode()) % partitions
+
+def partition_routing_key(routing_key: str, group_id: Optional[str], partitions: int = UPLOAD_PARTITIONS) -> str:
+    """`upload.success` -> `upload.success.p3`; bindings on `upload.success.#` still match.
+
+    Event types no partition queue is bound for keep their routing key.
+    """
+    if not is_partitioned(routing_key):
+        return routing_key
+    return f"{routing_key}.p{partition_for(group_id, partitions)}"
+
+def base_routing_key(routing_key: str) -> str:
+    """Strip the partition suffix added by partition_routing_key"""
+    head, _, tail = routing_key.rpartition(".")
+    return head if head and tail[:1] == "p" and tail[1:].isdigit() else routing_key
+
+def partition_queue_name(partition: int) -> str:
+    return f"{PARTITION_QUEUE_PREFIX}.p{partition}"
+
+def _score(member: str, partition: int) -> int:
+    digest = hashlib.blake2b(f"{member}:{partition}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+def assign_partitions(members: List[str], partitions: int = UPLOAD_PARTITIONS) -> Dict[str, List[int]]:
+    """Rendezvous hashing: adding or removing a member only moves that member's share"""
+    assignment = {member: [] for member in members}
+    if not members:
+        return assignment
+    for partition in range(partitions):
+        owner = max(members, key=lambda member: _score(member, partition))
+        assignment[owner].append(partition)
+    return assignment
+
+class PartitionedConsumer:
+    """Consumes the partition queues this process owns, one ordered consumer each.
+
+    Every partition queue is declared with x-single-active-consumer and each
+    owned partition is consumed on its own channel, its messages handed to
+    ``handler`` one at a time in queue order. A handler may return an
+    awaitable instead of settling the message itself (e.g. one that acks
+    once the message's micro-batch is done); the partition then moves on to
+    the next message, up to ``prefetch`` unacked ones, and holding back the
+    events that must follow it is up to the handler. Members announce
+    themselves with heartbeats on a fanout exchange; whenever membership
+    changes each member recomputes the rendezvous assignment, subscribes to
+    partitions it gained and releases the ones it lost.
+
+    A plain basic.cancel does not keep the order across a move: a message
+    already delivered to the old consumer stays unacked with it while the
+    broker activates the next consumer, which goes on with the following
+    message. So a partition is released by draining it first (the running
+    handler and every pending settlement), and then closing its channel,
+    which requeues anything delivered in the meantime back at the head of
+    the queue before the next consumer takes over.
+
+    Ordering holds for events handled on their first attempt only. A
+    failed message is acked and republished through the retry delay queues
+    (see retries.RetryPolicy), so it comes back at the tail of its
+    partition queue and later events of its group may be handled before
+    it. Holding the partition instead would stall every group mapped to it
+    for the whole retry delay. Handlers must not rely on an earlier event
+    of the group having succeeded.
+    """
+
+    def __init__(self, connection, channel, exchange,
+                 handler: Callable[[aio_pika.IncomingMessage], Awaitable[Optional[Awaitable]]],
+                 partitions: int = UPLOAD_PARTITIONS, member_id: Optional[str] = None,
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL, prefetch: int = PARTITION_PREFETCH):
+        self.connection = connection
+        self.channel = channel
+        self.exchange = exchange
+        self.handler = handler
+        self.partitions = partitions
+        self.member_id = member_id or f"{os.uname().nodename}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.heartbeat_interval = heartbeat_interval
+        self.prefetch = prefetch
+        self.queues: Dict[int, aio_pika.abc.AbstractQueue] = {}
+        self.consumer_tags: Dict[int, str] = {}
+        self.partition_channels: Dict[int, aio_pika.abc.AbstractChannel] = {}
+        self.releasing: Set[int] = set()
+        # Per partition: one handler call at a time, and the settlements it left pending
+        self._dispatch: Dict[int, asyncio.Lock] = {}
+        self._settling: Dict[int, Set[asyncio.Future]] = {}
+        self.members: Dict[str, float] = {}
+        self.members_exchange = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    @staticmethod
+    async def _declare_queue(channel, partition: int):
+        return await channel.declare_queue(
+            partition_queue_name(partition),
+            durable=True,
+            arguments={"x-single-active-consumer": True}
+        )
+
+    async def declare(self):
+        """Declare and bind every partition queue"""
+        for partition in range(self.partitions):
+            queue = await self._declare_queue(self.channel, partition)
+            for pattern in PARTITIONED_EVENTS:
+                await queue.bind(self.exchange, f"{pattern}.p{partition}")
+            self.queues[partition] = queue
+        return self.queues
+
+    @property
+    def owned(self) -> List[int]:
+        return sorted(self.consumer_tags)
+
+    def live_members(self) -> List[str]:
+        cutoff = time.time() - self.heartbeat_interval * HEARTBEAT_MISSES
+        self.members = {m: seen for m, seen in self.members.items() if seen >= cutoff or m == self.member_id}
+        return sorted(self.members)
+
+    async def rebalance(self):
+        """Subscribe to newly owned partitions and release the rest"""
+        async with self._lock:
+            wanted = set(assign_partitions(self.live_members(), self.partitions).get(self.member_id, []))
+            current = set(self.consumer_tags)
+
+            for partition in sorted(current - wanted):
+                await self._release(partition)
+            for partition in sorted(wanted - current):
+                await self._acquire(partition)
+
+            if wanted != current:
+                logger.info(
+                    f"Partition member {self.member_id} owns {self.owned} "
+                    f"of {self.partitions} ({len(self.members)} members)"
+                )
+
+    def _partition_handler(self, partition: int, channel):
+        dispatch = self._dispatch[partition]
+        settling = self._settling[partition]
+
+        async def handle(message: aio_pika.IncomingMessage):
+            # Deliveries run as concurrent tasks; the lock hands them over in order
+            async with dispatch:
+                if partition in self.releasing or self.partition_channels.get(partition) is not channel:
+                    # Left unacked; closing the channel puts it back in order
+                    return
+                settled = await self.handler(message)
+                if settled is not None:
+                    settled = asyncio.ensure_future(settled)
+                    settling.add(settled)
+                    settled.add_done_callback(settling.discard)
+        return handle
+
+    async def _acquire(self, partition: int):
+        """Start consuming a partition on a channel of its own"""
+        channel = await self.connection.channel()
+        await channel.set_qos(prefetch_count=self.prefetch)
+        queue = await self._declare_queue(channel, partition)
+        self._dispatch[partition] = asyncio.Lock()
+        self._settling[partition] = set()
+        self.partition_channels[partition] = channel
+        self.consumer_tags[partition] = await queue.consume(self._partition_handler(partition, channel))
+
+    async def _drain(self, partition: int):
+        """Wait for the running handler call and every settlement it left pending"""
+        async with self._dispatch[partition]:
+            pending = list(self._settling[partition])
+            if pending:
+                await asyncio.wait(pending)
+
+    async def _release(self, partition: int):
+        """Finish the in-flight messages, then hand the partition to the next consumer"""
+        self.releasing.add(partition)
+        try:
+            try:
+                await asyncio.wait_for(self._drain(partition), PARTITION_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error(
+                    f"Partition {partition} still busy after {PARTITION_DRAIN_TIMEOUT}s; "
+                    f"releasing it anyway, its unacked messages will be redelivered"
+                )
+            channel = self.partition_channels.pop(partition)
+            self.consumer_tags.pop(partition, None)
+            await channel.close()
+        finally:
+            self.releasing.discard(partition)
+
+    async def _announce(self, status: str = "alive"):
+        await self.members_exchange.publish(
+            aio_pika.Message(json.dumps({"member_id": self.member_id, "status": status}).encode()),
+            routing_key=""
+        )
+
+    async def _on_heartbeat(self, message: aio_pika.IncomingMessage):
+        async with message.process():
+            data = json.loads(message.body.decode())
+            member = data["member_id"]
+            if member == self.member_id:
+                return
+            known = member in self.members
+            if data.get("status") == "leaving":
+                self.members.pop(member, None)
+            else:
+                self.members[member] = time.time()
+            if known != (member in self.members):
+                await self.rebalance()
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self._announce()
+                before = set(self.members)
+                if set(self.live_members()) != before:
+                    await self.rebalance()
+            except Exception as e:
+                logger.error(f"Partition heartbeat failed: {str(e)}")
+
+    async def start(self):
+        """Join the consumer group and start consuming owned partitions"""
+        if not self.queues:
+            await self.declare()
+
+        self.members_exchange = await self.channel.declare_exchange(
+            MEMBERS_EXCHANGE, aio_pika.ExchangeType.FANOUT
+        )
+        inbox = await self.channel.declare_queue(exclusive=True, auto_delete=True)
+        await inbox.bind(self.members_exchange)
+        await inbox.consume(self._on_heartbeat)
+
+        self.members[self.member_id] = time.time()
+        await self._announce()
+        await self.rebalance()
+        self._task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        """Leave the group so the remaining members take over right away"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        async with self._lock:
+            await asyncio.gather(*[self._release(partition) for partition in list(self.consumer_tags)])
+        if self.members_exchange is not None:
+            await self._announce("leaving")
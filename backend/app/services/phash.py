@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.imaging import decode_gray
+
+logger = logging.getLogger(__name__)
+
+# Hash Index Configuration
+HASH_INDEX_MAX_GROUPS = int(os.getenv("HASH_INDEX_MAX_GROUPS", "500"))
+HASH_INDEX_IDLE_SECONDS = float(os.getenv("HASH_INDEX_IDLE_SECONDS", "1800"))
+# Full reload interval; drops hashes of deleted images
+HASH_INDEX_REFRESH_SECONDS = float(os.getenv("HASH_INDEX_REFRESH_SECONDS", "600"))
+
+# dHash compares horizontally adjacent pixels of a 9x8 grayscale thumbnail
+HASH_SIZE = 8
+DEFAULT_MAX_DISTANCE = 6
+
+_BIT_WEIGHTS = (1 << np.arange(63, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+def dhash_batch(pixels: np.ndarray) -> np.ndarray:
+    """64-bit difference hashes for a stack of (N, 8, 9) grayscale images"""
+    bits = (pixels[:, :, 1:] > pixels[:, :, :-1]).reshape(len(pixels), -1)
+    return (bits.astype(np.uint64) * _BIT_WEIGHTS).sum(axis=1, dtype=np.uint64)
+
+def dhash(content: bytes) -> int:
+    """dHash of encoded image bytes, computed on a downscaled decode"""
+    pixels = decode_gray(content, (HASH_SIZE + 1, HASH_SIZE))
+    return int(dhash_batch(pixels[np.newaxis])[0])
+
+def to_signed(value: int) -> int:
+    """Map an unsigned 64-bit hash onto Postgres bigint"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """Per-element bit count of a uint64 array"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8)).reshape(len(values), 64).sum(axis=1)
+
+class MultiIndexHash:
+    """Multi-index Hamming index over 64-bit hashes.
+
+    Each hash is split into 8 byte-wide chunks with one exact-match table per
+    chunk. Two hashes within distance 7 must agree on at least one chunk
+    (pigeonhole), so a query only verifies the union of 8 small buckets,
+    vectorised with NumPy. Larger radii fall back to a full vectorised scan.
+    """
+
+    CHUNKS = 8
+
+    def __init__(self):
+        self._hashes = np.empty(1024, dtype=np.uint64)
+        self._ids: List[str] = []
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(self.CHUNKS)]
+
+    @property
+    def size(self) -> int:
+        return len(self._ids)
+
+    def add(self, value: int, item_id: str):
+        position = len(self._ids)
+        if position == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.empty_like(self._hashes)])
+
+        self._hashes[position] = value
+        self._ids.append(item_id)
+        for chunk, table in enumerate(self._tables):
+            table.setdefault((value >> (8 * chunk)) & 0xFF, []).append(position)
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[str, int]]:
+        """All (id, distance) pairs within max_distance of value"""
+        if not self._ids:
+            return []
+
+        if max_distance < self.CHUNKS:
+            candidates = set()
+            for chunk, table in enumerate(self._tables):
+                candidates.update(table.get((value >> (8 * chunk)) & 0xFF, ()))
+            positions = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        else:
+            positions = np.arange(len(self._ids))
+
+        distances = popcount(self._hashes[positions] ^ np.uint64(value))
+        keep = distances <= max_distance
+        matches = [
+            (self._ids[position], int(distance))
+            for position, distance in zip(positions[keep], distances[keep])
+        ]
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+class GroupHashes:
+    """Hashes of one group plus its Hamming index"""
+
+    def __init__(self):
+        self.tree = MultiIndexHash()
+        self.hashes: Dict[str, int] = {}
+        self.loaded_until: Optional[datetime] = None
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+
+    def add(self, image_id: str, value: int):
+        if image_id not in self.hashes:
+            self.hashes[image_id] = value
+            self.tree.add(value, image_id)
+
+class GroupHashIndex:
+    """Per-group Hamming indexes, loaded lazily and topped up incrementally from the images table.
+
+    Groups are evicted LRU-first past max_groups or after idle_seconds
+    unused, and fully reloaded every refresh_seconds to drop deleted rows.
+    """
+
+    def __init__(self, max_groups: int = HASH_INDEX_MAX_GROUPS, idle_seconds: float = HASH_INDEX_IDLE_SECONDS,
+                 refresh_seconds: float = HASH_INDEX_REFRESH_SECONDS):
+        self.max_groups = max_groups
+        self.idle_seconds = idle_seconds
+        self.refresh_seconds = refresh_seconds
+        self._groups: "OrderedDict[str, GroupHashes]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def evict_idle(self):
+        cutoff = time.time() - self.idle_seconds
+        for group_id in [g for g, group in self._groups.items() if group.last_used < cutoff]:
+            del self._groups[group_id]
+            self._locks.pop(group_id, None)
+        while len(self._groups) > self.max_groups:
+            group_id, _ = self._groups.popitem(last=False)
+            self._locks.pop(group_id, None)
+
+    def _touch(self, group_id: str) -> Optional[GroupHashes]:
+        group = self._groups.get(group_id)
+        if group is not None:
+            group.last_used = time.time()
+            self._groups.move_to_end(group_id)
+        return group
+
+    def add(self, group_id: str, image_id: str, value: int):
+        """Record a new hash in an already loaded group (others load lazily)"""
+        group = self._groups.get(group_id)
+        if group is not None:
+            group.add(image_id, value)
+
+    async def sync(self, pool, group_id: str):
+        """Load the group, or pull hashes of rows added since the last sync.
+
+        Rows whose phash was backfilled later keep their old uploaded_at, so
+        the incremental query misses them; the hash count catches that and
+        triggers a full reload.
+        """
+        self.evict_idle()
+        lock = self._locks.setdefault(group_id, asyncio.Lock())
+        async with lock:
+            group = self._groups.get(group_id)
+            if group is not None and time.time() - group.loaded_at >= self.refresh_seconds:
+                group = None
+
+            async with pool.acquire() as conn:
+                if group is not None and group.loaded_until is not None:
+                    rows = await conn.fetch(
+                        "SELECT id, phash, uploaded_at FROM images "
+                        "WHERE group_id = $1 AND phash IS NOT NULL AND uploaded_at >= $2",
+                        group_id, group.loaded_until
+                    )
+                    self._apply(group, rows)
+                    total = await conn.fetchval(
+                        "SELECT count(*) FROM images WHERE group_id = $1 AND phash IS NOT NULL",
+                        group_id
+                    )
+                    if total != len(group.hashes):
+                        group = None
+
+                if group is None or group.loaded_until is None:
+                    rows = await conn.fetch(
+                        "SELECT id, phash, uploaded_at FROM images "
+                        "WHERE group_id = $1 AND phash IS NOT NULL",
+                        group_id
+                    )
+                    group = GroupHashes()
+                    self._apply(group, rows)
+
+            self._groups[group_id] = group
+            self._touch(group_id)
+            self.evict_idle()
+
+    @staticmethod
+    def _apply(group: GroupHashes, rows):
+        for row in rows:
+            group.add(str(row["id"]), to_unsigned(row["phash"]))
+            uploaded_at = row["uploaded_at"]
+            if uploaded_at is not None and (group.loaded_until is None or uploaded_at > group.loaded_until):
+                group.loaded_until = uploaded_at
+
+    def lookup(self, group_id: str, image_id: str) -> Optional[int]:
+        group = self._touch(group_id)
+        return group.hashes.get(image_id) if group is not None else None
+
+    def near(self, group_id: str, value: int, max_distance: int = DEFAULT_MAX_DISTANCE,
+             exclude: Optional[str] = None) -> List[Tuple[str, int]]:
+        """Near-duplicates of a hash within the group"""
+        group = self._touch(group_id)
+        if group is None:
+            return []
+
+        start = time.perf_counter()
+        matches = [m for m in group.tree.search(value, max_distance) if m[0] != exclude]
+        logger.debug(
+            f"Hamming search in group {group_id} ({group.tree.size} hashes) "
+            f"took {(time.perf_counter() - start) * 1000:.3f}ms"
+        )
+        return matches
+
+# Process-wide index instance
+group_hash_index = GroupHashIndex()
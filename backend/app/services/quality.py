@@ -0,0 +1,83 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.imaging import decode_gray_fit
+
+logger = logging.getLogger(__name__)
+
+# Scores are computed on a reduced decode fitted within SCORE_MAX_SIDE (aspect
+# ratio kept, so the metrics aren't skewed by stretching). Images of the same
+# shape, usually most of a batch, are stacked and scored together.
+SCORE_MAX_SIDE = 256
+
+def score_batch(pixels: np.ndarray) -> np.ndarray:
+    """Score a stack of (N, H, W) grayscale images.
+
+    Returns an (N, 3) array of sharpness (variance of the Laplacian),
+    exposure (mean luminance, 0..1) and contrast (RMS contrast, 0..1).
+    """
+    centre = pixels[:, 1:-1, 1:-1]
+    laplacian = (
+        pixels[:, :-2, 1:-1] + pixels[:, 2:, 1:-1]
+        + pixels[:, 1:-1, :-2] + pixels[:, 1:-1, 2:]
+        - 4.0 * centre
+    )
+    sharpness = laplacian.var(axis=(1, 2))
+    exposure = pixels.mean(axis=(1, 2)) / 255.0
+    contrast = pixels.std(axis=(1, 2)) / 255.0
+    return np.stack([sharpness, exposure, contrast], axis=1)
+
+def score_images(contents: List[bytes]) -> List[Optional[Dict[str, float]]]:
+    """Decode and score a batch of encoded images (runs in a worker process)"""
+    by_shape: Dict[Tuple[int, int], List[Tuple[int, np.ndarray]]] = {}
+    for i, content in enumerate(contents):
+        try:
+            pixels = decode_gray_fit(content, SCORE_MAX_SIDE)
+            by_shape.setdefault(pixels.shape, []).append((i, pixels))
+        except Exception as e:
+            logger.warning(f"Could not decode image for scoring: {e}")
+
+    results: List[Optional[Dict[str, float]]] = [None] * len(contents)
+    for group in by_shape.values():
+        scores = score_batch(np.stack([pixels for _, pixels in group]))
+        for (position, _), (sharpness, exposure, contrast) in zip(group, scores):
+            results[position] = {
+                "sharpness": float(sharpness),
+                "exposure": float(exposure),
+                "contrast": float(contrast),
+            }
+    return results
+
+async def fetch_thumbnails(pool, image_ids: List[str]) -> Dict[str, bytes]:
+    """Stored thumbnails of a batch of images, keyed by id (images without one are left out)"""
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            "SELECT id, thumb_byte FROM images WHERE id = ANY($1::uuid[]) AND thumb_byte IS NOT NULL",
+            image_ids
+        )
+    return {str(row["id"]): bytes(row["thumb_byte"]) for row in rows}
+
+async def persist_scores(pool, scores: List[Tuple[str, Dict[str, float]]]):
+    """Write a batch of image scores in one UPDATE"""
+    if not scores:
+        return
+
+    # Expects images.sharpness_score / exposure_score / contrast_score (real) columns
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            UPDATE images
+            SET sharpness_score = v.sharpness,
+                exposure_score = v.exposure,
+                contrast_score = v.contrast
+            FROM unnest($1::uuid[], $2::real[], $3::real[], $4::real[])
+                AS v(id, sharpness, exposure, contrast)
+            WHERE images.id = v.id
+            """,
+            [image_id for image_id, _ in scores],
+            [s["sharpness"] for _, s in scores],
+            [s["exposure"] for _, s in scores],
+            [s["contrast"] for _, s in scores],
+        )
@@ -0,0 +1,190 @@
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import aio_pika
+
+logger = logging.getLogger(__name__)
+
+# Idempotency Configuration
+IDEMPOTENCY_MAX_SIZE = int(os.getenv("IDEMPOTENCY_MAX_SIZE", "100000"))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+# SQLite file that keeps processed ids across restarts (unset = memory only)
+IDEMPOTENCY_DB = os.getenv("IDEMPOTENCY_DB")
+
+# Retry Configuration: one delay queue per entry, then the DLQ
+RETRY_DELAYS = [int(d) for d in os.getenv("RETRY_DELAYS", "5,30,300").split(",") if d]
+RETRY_EXCHANGE = "file_uploads.retry"
+REQUEUE_EXCHANGE = "file_uploads.requeue"
+DEAD_LETTER_QUEUE = os.getenv("DEAD_LETTER_QUEUE", "upload_events.dlq")
+
+HEADER_RETRY_COUNT = "x-retry-count"
+HEADER_RETRY_DELAY = "x-retry-delay"
+HEADER_ORIGIN_QUEUE = "x-origin-queue"
+HEADER_LAST_ERROR = "x-last-error"
+
+class PermanentError(Exception):
+    """A failure retrying cannot fix; the message goes straight to the DLQ"""
+
+class IdempotencyCache:
+    """Bounded LRU of processed event ids with a TTL, optionally backed by SQLite.
+
+    Lookups and inserts are O(1) in memory; persisted ids are written in
+    small batches so the cache never adds a disk write per message.
+    """
+
+    def __init__(self, max_size: int = IDEMPOTENCY_MAX_SIZE, ttl: float = IDEMPOTENCY_TTL,
+                 path: Optional[str] = IDEMPOTENCY_DB, flush_every: int = 100):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.flush_every = flush_every
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._unsaved: List[tuple] = []
+        self.conn = None
+
+        if path:
+            self.conn = sqlite3.connect(path)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS processed (event_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+            now = time.time()
+            with self.conn:
+                self.conn.execute("DELETE FROM processed WHERE expires_at <= ?", (now,))
+            rows = self.conn.execute(
+                "SELECT event_id, expires_at FROM processed ORDER BY expires_at DESC LIMIT ?", (max_size,)
+            ).fetchall()
+            for event_id, expires_at in reversed(rows):
+                self._entries[event_id] = expires_at
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def seen(self, event_id: str) -> bool:
+        expires_at = self._entries.get(event_id)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            del self._entries[event_id]
+            return False
+        self._entries.move_to_end(event_id)
+        return True
+
+    def add(self, event_id: str):
+        expires_at = time.time() + self.ttl
+        self._entries[event_id] = expires_at
+        self._entries.move_to_end(event_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+        if self.conn is not None:
+            self._unsaved.append((event_id, expires_at))
+            if len(self._unsaved) >= self.flush_every:
+                self.flush()
+
+    def flush(self):
+        if self.conn is None or not self._unsaved:
+            return
+        unsaved, self._unsaved = self._unsaved, []
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO processed VALUES (?, ?)", unsaved)
+
+    def close(self):
+        self.flush()
+        if self.conn is not None:
+            self.conn.close()
+
+class RetryPolicy:
+    """Delayed retries through TTL queues, then a dead-letter queue.
+
+    A failed message is republished to the retry exchange (a headers
+    exchange routing on x-retry-delay) and acked, so it frees its prefetch
+    slot right away. Each delay queue has a message TTL and dead-letters
+    into the requeue exchange, where every work queue is bound under its
+    own name; the message keeps the origin queue as its routing key and so
+    lands back on the queue it failed on.
+
+    It lands at the tail of that queue: on a partition queue the retried
+    event loses its place among its group's events.
+    """
+
+    def __init__(self, channel, delays: List[int] = RETRY_DELAYS):
+        self.channel = channel
+        self.delays = delays
+        self.retry_exchange = None
+        self.requeue_exchange = None
+
+    async def declare(self):
+        self.retry_exchange = await self.channel.declare_exchange(
+            RETRY_EXCHANGE, aio_pika.ExchangeType.HEADERS, durable=True
+        )
+        self.requeue_exchange = await self.channel.declare_exchange(
+            REQUEUE_EXCHANGE, aio_pika.ExchangeType.DIRECT, durable=True
+        )
+        for delay in self.delays:
+            queue = await self.channel.declare_queue(
+                f"{RETRY_EXCHANGE}.{delay}s",
+                durable=True,
+                arguments={
+                    "x-message-ttl": delay * 1000,
+                    "x-dead-letter-exchange": REQUEUE_EXCHANGE,
+                }
+            )
+            await queue.bind(self.retry_exchange, arguments={"x-match": "all", HEADER_RETRY_DELAY: delay})
+        await self.channel.declare_queue(DEAD_LETTER_QUEUE, durable=True)
+
+    async def bind(self, queue):
+        """Let retried messages come back to `queue`"""
+        await queue.bind(self.requeue_exchange, queue.name)
+
+    async def retry(self, message: aio_pika.IncomingMessage, origin_queue: str, error: Exception):
+        """Schedule the next attempt (or dead-letter it), then ack the original"""
+        attempt = int((message.headers or {}).get(HEADER_RETRY_COUNT, 0))
+        if attempt >= len(self.delays):
+            await self.dead_letter(message, origin_queue, error)
+            return
+
+        delay = self.delays[attempt]
+        logger.warning(f"Retrying message {message.message_id} from {origin_queue} in {delay}s: {error}")
+        await self._republish(message, origin_queue, error, self.retry_exchange, origin_queue, delay)
+
+    async def dead_letter(self, message: aio_pika.IncomingMessage, origin_queue: str, error: Exception):
+        """Park a message in the DLQ without further attempts, then ack the original"""
+        attempt = int((message.headers or {}).get(HEADER_RETRY_COUNT, 0))
+        logger.error(
+            f"Message {message.message_id} from {origin_queue} failed {attempt + 1} times, "
+            f"moved to {DEAD_LETTER_QUEUE}: {error}"
+        )
+        await self._republish(message, origin_queue, error, self.channel.default_exchange, DEAD_LETTER_QUEUE)
+
+    async def _republish(self, message: aio_pika.IncomingMessage, origin_queue: str, error: Exception,
+                         exchange, routing_key: str, delay: Optional[int] = None):
+        headers = dict(message.headers or {})
+        headers[HEADER_RETRY_COUNT] = int(headers.get(HEADER_RETRY_COUNT, 0)) + 1
+        headers[HEADER_ORIGIN_QUEUE] = origin_queue
+        headers[HEADER_LAST_ERROR] = str(error)[:500]
+        headers.pop("x-death", None)
+        headers.pop(HEADER_RETRY_DELAY, None)
+        if delay is not None:
+            headers[HEADER_RETRY_DELAY] = delay
+
+        try:
+            await exchange.publish(
+                aio_pika.Message(
+                    message.body,
+                    headers=headers,
+                    content_type=message.content_type,
+                    message_id=message.message_id,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=routing_key
+            )
+        except Exception as e:
+            # Couldn't park it anywhere; hand it back to the broker instead of losing it
+            logger.error(f"Failed to schedule retry for {message.message_id}: {str(e)}")
+            await message.nack(requeue=True)
+            return
+        await message.ack()
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from config.db_config import get_db_pool
+
+logger = logging.getLogger(__name__)
+
+# Tiering Configuration
+ACCESS_FLUSH_INTERVAL = float(os.getenv("ACCESS_FLUSH_INTERVAL", "30"))
+COLD_AFTER_DAYS = int(os.getenv("COLD_AFTER_DAYS", "30"))
+TIER_BATCH_SIZE = int(os.getenv("TIER_BATCH_SIZE", "200"))
+TIER_MOVES_PER_SECOND = float(os.getenv("TIER_MOVES_PER_SECOND", "20"))
+TIER_CONCURRENCY = int(os.getenv("TIER_CONCURRENCY", "8"))
+HOT_STORAGE_CLASS = os.getenv("HOT_STORAGE_CLASS", "STANDARD")
+COLD_STORAGE_CLASS = os.getenv("COLD_STORAGE_CLASS", "COLDLINE")
+# "storage_class" rewrites originals to COLD_STORAGE_CLASS (reversible);
+# "compressed_only" deletes originals and keeps the compressed_ variant (irreversible)
+TIERING_MODE = os.getenv("TIERING_MODE", "storage_class")
+
+STATUS_HOT = "hot"
+STATUS_COLD = "cold"
+STATUS_COMPRESSED = "compressed"
+
+def object_path(row) -> str:
+    return row["location"] or str(row["id"])
+
+class RateLimiter:
+    """Token bucket limiting storage tier moves per second"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class TierMover:
+    """Moves storage objects between tiers with bounded, rate-limited concurrency"""
+
+    def __init__(self, bucket, rate: float = TIER_MOVES_PER_SECOND, concurrency: int = TIER_CONCURRENCY):
+        self.bucket = bucket
+        self.limiter = RateLimiter(rate)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def _run(self, fn, *args) -> bool:
+        async with self.semaphore:
+            await self.limiter.acquire()
+            loop = asyncio.get_event_loop()
+            try:
+                await loop.run_in_executor(self.executor, fn, *args)
+                return True
+            except Exception as e:
+                logger.error(f"Tier move failed for {args[0]}: {str(e)}")
+                return False
+
+    def _set_storage_class(self, path: str, storage_class: str):
+        self.bucket.blob(path).update_storage_class(storage_class)
+
+    def _drop_original(self, path: str, image_id: str):
+        # Only drop the original when a compressed copy exists to serve instead
+        if not self.bucket.blob(f"compressed_{image_id}").exists():
+            raise FileNotFoundError(f"compressed_{image_id} missing")
+        self.bucket.blob(path).delete()
+
+    async def demote(self, rows) -> List[Tuple[str, str]]:
+        """Move rows to the cold tier; returns (id, new status) for every success"""
+        if TIERING_MODE == "compressed_only":
+            status = STATUS_COMPRESSED
+            tasks = [self._run(self._drop_original, object_path(r), str(r["id"])) for r in rows]
+        else:
+            status = STATUS_COLD
+            tasks = [self._run(self._set_storage_class, object_path(r), COLD_STORAGE_CLASS) for r in rows]
+
+        results = await asyncio.gather(*tasks)
+        return [(str(r["id"]), status) for r, ok in zip(rows, results) if ok]
+
+    async def promote(self, rows) -> List[str]:
+        """Move cold rows back to the hot tier"""
+        results = await asyncio.gather(*[
+            self._run(self._set_storage_class, object_path(r), HOT_STORAGE_CLASS) for r in rows
+        ])
+        return [str(r["id"]) for r, ok in zip(rows, results) if ok]
+
+async def set_status(pool, moves: List[Tuple[str, str]]):
+    """Record tier moves with one UPDATE"""
+    if not moves:
+        return
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            UPDATE images SET status = v.status
+            FROM unnest($1::uuid[], $2::text[]) AS v(id, status)
+            WHERE images.id = v.id
+            """,
+            [image_id for image_id, _ in moves],
+            [status for _, status in moves]
+        )
+
+class AccessTracker:
+    """Write-behind buffer for image access timestamps.
+
+    Views and downloads are recorded in memory and flushed periodically as
+    one batched UPDATE. Cold images seen in a flush are promoted back to the
+    hot tier.
+    """
+
+    def __init__(self, mover: Optional[TierMover] = None, interval: float = ACCESS_FLUSH_INTERVAL):
+        self.mover = mover
+        self.interval = interval
+        self._accessed: Dict[str, datetime] = {}
+        self._downloaded: Dict[str, datetime] = {}
+        self._task = None
+        self._stopping = None
+
+    def record(self, image_id: str, downloaded: bool = False):
+        now = datetime.now(timezone.utc)
+        self._accessed[str(image_id)] = now
+        if downloaded:
+            self._downloaded[str(image_id)] = now
+
+    def record_many(self, image_ids: List[str], downloaded: bool = False):
+        for image_id in image_ids:
+            self.record(image_id, downloaded)
+
+    @property
+    def pending(self) -> int:
+        return len(self._accessed)
+
+    async def flush(self) -> int:
+        """Write buffered timestamps in one statement per column"""
+        accessed, self._accessed = self._accessed, {}
+        downloaded, self._downloaded = self._downloaded, {}
+        if not accessed:
+            return 0
+
+        try:
+            pool = await get_db_pool()
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    cold = await conn.fetch(
+                        """
+                        WITH touched AS (
+                            UPDATE images
+                            SET last_accessed_at = GREATEST(COALESCE(images.last_accessed_at, v.ts), v.ts)
+                            FROM unnest($1::uuid[], $2::timestamptz[]) AS v(id, ts)
+                            WHERE images.id = v.id
+                            RETURNING images.id, images.location, images.status
+                        )
+                        SELECT id, location FROM touched WHERE status = $3
+                        """,
+                        list(accessed), list(accessed.values()), STATUS_COLD
+                    )
+                    if downloaded:
+                        await conn.execute(
+                            """
+                            UPDATE images
+                            SET last_downloaded_at = GREATEST(COALESCE(images.last_downloaded_at, v.ts), v.ts)
+                            FROM unnest($1::uuid[], $2::timestamptz[]) AS v(id, ts)
+                            WHERE images.id = v.id
+                            """,
+                            list(downloaded), list(downloaded.values())
+                        )
+        except Exception as e:
+            logger.error(f"Failed to flush {len(accessed)} access timestamps: {str(e)}")
+            # Keep the newest timestamps for the next attempt
+            for image_id, ts in accessed.items():
+                self._accessed.setdefault(image_id, ts)
+            for image_id, ts in downloaded.items():
+                self._downloaded.setdefault(image_id, ts)
+            return 0
+
+        if cold and self.mover is not None:
+            promoted = await self.mover.promote(cold)
+            await set_status(pool, [(image_id, STATUS_HOT) for image_id in promoted])
+            logger.info(f"Promoted {len(promoted)}/{len(cold)} re-accessed images to hot storage")
+
+        return len(accessed)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 30):
+        """Let a flush in progress finish, then write whatever is still buffered"""
+        if self._task is not None:
+            self._stopping.set()
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Access flush still running after {timeout}s; cancelling it")
+                self._task.cancel()
+            self._task = None
+        await self.flush()
+
+async def sweep_cold(mover: TierMover, cold_after_days: int = COLD_AFTER_DAYS,
+                     batch_size: int = TIER_BATCH_SIZE) -> int:
+    """Demote hot images not accessed for cold_after_days, in keyset-paged batches"""
+    pool = await get_db_pool()
+    last_id = None
+    moved = 0
+    start_time = time.time()
+
+    while True:
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT id, location
+                FROM images
+                WHERE status = $1
+                  AND COALESCE(last_accessed_at, uploaded_at) < now() - make_interval(days => $2)
+                  AND ($3::uuid IS NULL OR id > $3)
+                ORDER BY id
+                LIMIT $4
+                """,
+                STATUS_HOT, cold_after_days, last_id, batch_size
+            )
+        if not rows:
+            break
+
+        last_id = rows[-1]["id"]
+        moves = await mover.demote(rows)
+        await set_status(pool, moves)
+        moved += len(moves)
+        logger.info(
+            f"Tiering: moved {moved} images so far "
+            f"({moved / max(time.time() - start_time, 1e-6):.1f}/s)"
+        )
+
+    return moved
+
+# Process-wide tracker; the API attaches a TierMover at startup
+access_tracker = AccessTracker()
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Timeline Configuration
+TIMELINE_MAX_GROUPS = int(os.getenv("TIMELINE_MAX_GROUPS", "500"))
+TIMELINE_IDLE_SECONDS = float(os.getenv("TIMELINE_IDLE_SECONDS", "1800"))
+# Full reload interval; picks up date_taken values filled in after upload and deletions
+TIMELINE_REFRESH_SECONDS = float(os.getenv("TIMELINE_REFRESH_SECONDS", "600"))
+
+FIELD_TAKEN = "taken"        # COALESCE(date_taken, uploaded_at)
+FIELD_UPLOADED = "uploaded"
+GRANULARITIES = {"day": "datetime64[D]", "month": "datetime64[M]"}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+
+def _to_us(value) -> Optional[int]:
+    """Microseconds since the epoch for datetime/date/ISO string values"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        if not isinstance(value, date):
+            return None
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // _US
+
+class SortedTimeline:
+    """Image ids ordered by (time, id), matching the gallery's keyset order"""
+
+    def __init__(self, times: np.ndarray, ids: np.ndarray):
+        order = np.lexsort((ids, times))
+        self.times = times[order].astype("datetime64[us]")
+        self.ids = ids[order]
+        self._histograms: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def histogram(self, granularity: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Bucket starts and cumulative counts; built once per snapshot"""
+        if granularity not in self._histograms:
+            truncated = self.times.astype(GRANULARITIES[granularity])
+            if len(truncated):
+                starts = np.flatnonzero(np.r_[True, truncated[1:] != truncated[:-1]])
+                buckets = truncated[starts]
+            else:
+                buckets = truncated
+            # Cumulative counts let any [start, end) range be answered with two searches
+            cumulative = np.searchsorted(self.times, buckets.astype("datetime64[us]"), side="left")
+            self._histograms[granularity] = (buckets, np.r_[cumulative, len(self.times)])
+        return self._histograms[granularity]
+
+    def counts(self, granularity: str, start: Optional[np.datetime64] = None,
+               end: Optional[np.datetime64] = None) -> List[Tuple[str, int]]:
+        buckets, cumulative = self.histogram(granularity)
+        lo = 0 if start is None else np.searchsorted(buckets, start.astype(buckets.dtype), side="left")
+        hi = len(buckets) if end is None else np.searchsorted(buckets, end.astype(buckets.dtype), side="left")
+        sizes = np.diff(cumulative[lo:hi + 1])
+        return [(str(bucket), int(size)) for bucket, size in zip(buckets[lo:hi], sizes)]
+
+    def newest_before(self, moment: np.datetime64) -> int:
+        """Index of the newest image strictly before `moment`, or -1"""
+        return int(np.searchsorted(self.times, moment.astype("datetime64[us]"), side="left")) - 1
+
+class GroupTimeline:
+    """Timelines of one group, rebuilt lazily when new images arrive"""
+
+    def __init__(self, group_id: str, rows, aware: bool):
+        self.group_id = group_id
+        self.aware = aware
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.version = 0
+        self._pending: List[Tuple[str, int, int]] = []
+        self._ids = np.array([r[0] for r in rows], dtype="U36")
+        self._uploaded = np.array([r[1] for r in rows], dtype=np.int64)
+        self._taken = np.array([r[2] for r in rows], dtype=np.int64)
+        self._views: Dict[str, SortedTimeline] = {}
+
+    def add(self, image_id: str, uploaded_us: int, taken_us: Optional[int] = None):
+        self._pending.append((image_id, uploaded_us, taken_us if taken_us is not None else uploaded_us))
+        self.version += 1
+
+    def view(self, field: str) -> SortedTimeline:
+        if self._pending:
+            known = set(self._ids.tolist())
+            fresh = [p for p in self._pending if p[0] not in known]
+            self._pending = []
+            if fresh:
+                self._ids = np.r_[self._ids, np.array([p[0] for p in fresh], dtype="U36")]
+                self._uploaded = np.r_[self._uploaded, np.array([p[1] for p in fresh], dtype=np.int64)]
+                self._taken = np.r_[self._taken, np.array([p[2] for p in fresh], dtype=np.int64)]
+                self._views = {}
+
+        if field not in self._views:
+            times = self._uploaded if field == FIELD_UPLOADED else self._taken
+            self._views[field] = SortedTimeline(times.view("datetime64[us]"), self._ids)
+        self.last_used = time.time()
+        return self._views[field]
+
+    def to_datetime(self, value: np.datetime64) -> datetime:
+        """Back to the database's representation, e.g. for gallery cursors"""
+        moment = _EPOCH + int(value.astype("datetime64[us]").astype(np.int64)) * _US
+        return moment if self.aware else moment.replace(tzinfo=None)
+
+class TimelineIndex:
+    """Per-group in-memory date index with LRU + idle eviction"""
+
+    def __init__(self, max_groups: int = TIMELINE_MAX_GROUPS, idle_seconds: float = TIMELINE_IDLE_SECONDS,
+                 refresh_seconds: float = TIMELINE_REFRESH_SECONDS):
+        self.max_groups = max_groups
+        self.idle_seconds = idle_seconds
+        self.refresh_seconds = refresh_seconds
+        self._groups: "OrderedDict[str, GroupTimeline]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._generation = uuid.uuid4().hex[:8]
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def etag(self, group: GroupTimeline, *parts) -> str:
+        suffix = "-".join(str(p) for p in parts)
+        return f'"{self._generation}-{group.loaded_at:.0f}-{group.version}-{suffix}"'
+
+    def evict_idle(self):
+        cutoff = time.time() - self.idle_seconds
+        for group_id in [g for g, t in self._groups.items() if t.last_used < cutoff]:
+            del self._groups[group_id]
+            self._locks.pop(group_id, None)
+        while len(self._groups) > self.max_groups:
+            group_id, _ = self._groups.popitem(last=False)
+            self._locks.pop(group_id, None)
+
+    async def get(self, pool, group_id: str) -> GroupTimeline:
+        """Loaded timeline of a group, (re)loading it with one query when needed"""
+        self.evict_idle()
+        timeline = self._groups.get(group_id)
+        if timeline is not None and time.time() - timeline.loaded_at < self.refresh_seconds:
+            self._groups.move_to_end(group_id)
+            return timeline
+
+        lock = self._locks.setdefault(group_id, asyncio.Lock())
+        async with lock:
+            timeline = self._groups.get(group_id)
+            if timeline is None or time.time() - timeline.loaded_at >= self.refresh_seconds:
+                timeline = await self._load(pool, group_id)
+                self._groups[group_id] = timeline
+            self._groups.move_to_end(group_id)
+            return timeline
+
+    async def _load(self, pool, group_id: str) -> GroupTimeline:
+        start = time.perf_counter()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT id, uploaded_at, date_taken FROM images WHERE group_id = $1", group_id
+            )
+
+        data = []
+        aware = True
+        for row in rows:
+            uploaded_at = row["uploaded_at"]
+            if uploaded_at is None:
+                continue
+            aware = uploaded_at.tzinfo is not None
+            uploaded = _to_us(uploaded_at)
+            taken = _to_us(row["date_taken"])
+            data.append((str(row["id"]), uploaded, taken if taken is not None else uploaded))
+
+        logger.info(
+            f"Loaded timeline of group {group_id}: {len(data)} images "
+            f"in {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+        return GroupTimeline(group_id, data, aware)
+
+    def add(self, group_id: str, image_id: str, uploaded_at: datetime, date_taken=None):
+        """Record a new image in an already loaded group (others load lazily)"""
+        timeline = self._groups.get(group_id)
+        if timeline is not None:
+            timeline.add(str(image_id), _to_us(uploaded_at), _to_us(date_taken))
+
+# Process-wide index instance
+timeline_index = TimelineIndex()
@@ -0,0 +1,219 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tracing Configuration
+# TRACE_EXPORT: "off" (default), "file" (JSON lines at TRACE_FILE) or "udp://host:port"
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "off")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+
+# Message header names, next to the existing event_type/timestamp headers
+HEADER_TRACE_ID = "trace_id"
+HEADER_PARENT_SPAN_ID = "parent_span_id"
+HEADER_PUBLISHED_AT = "published_at"
+
+@dataclass
+class SpanContext:
+    trace_id: str
+    span_id: str
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start: float = field(default_factory=time.time)
+    duration_ms: float = 0.0
+    service: str = field(default_factory=lambda: os.path.basename(sys.argv[0]) or "python")
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def context(self) -> SpanContext:
+        return SpanContext(self.trace_id, self.span_id)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+class _Exporter:
+    """Writes finished spans to a JSON-lines file or a UDP collector"""
+
+    def __init__(self, target: str):
+        self.target = target
+        self._lock = threading.Lock()
+        self._file = None
+        self._socket = None
+        self._address = None
+
+        if target == "file":
+            self._file = open(TRACE_FILE, "a", buffering=1)
+        elif target.startswith("udp://"):
+            host, _, port = target[len("udp://"):].partition(":")
+            self._address = (host, int(port or 4317))
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    @property
+    def enabled(self) -> bool:
+        return self._file is not None or self._socket is not None
+
+    def export(self, span: Span):
+        line = json.dumps(asdict(span), default=str)
+        try:
+            if self._file is not None:
+                with self._lock:
+                    self._file.write(line + "\n")
+            elif self._socket is not None:
+                self._socket.sendto(line.encode(), self._address)
+        except Exception as e:
+            logger.debug(f"Dropping span {span.name}: {e}")
+
+exporter = _Exporter(TRACE_EXPORT)
+
+def current() -> Optional[SpanContext]:
+    span = _current.get()
+    return span.context if isinstance(span, Span) else span
+
+@contextmanager
+def activate(context: Optional[SpanContext]):
+    """Make `context` the parent of spans opened inside the block"""
+    token = _current.set(context)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def span(name: str, parent: Optional[SpanContext] = None, **attributes):
+    """Time a block as a child of `parent` (or of the current span)"""
+    if not exporter.enabled:
+        yield None
+        return
+
+    parent = parent or current()
+    new_span = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+        span_id=_new_id(),
+        parent_id=parent.span_id if parent else None,
+        attributes=attributes
+    )
+    started = time.perf_counter()
+    token = _current.set(new_span)
+    try:
+        yield new_span
+    finally:
+        _current.reset(token)
+        new_span.duration_ms = (time.perf_counter() - started) * 1000
+        exporter.export(new_span)
+
+def traced(name: str):
+    """Decorator running a coroutine function inside a span"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def annotate(**attributes):
+    """Attach attributes to the span currently open in this context"""
+    active = _current.get()
+    if isinstance(active, Span):
+        active.attributes.update(attributes)
+
+def record(name: str, parent: Optional[SpanContext], start: float, end: float, **attributes):
+    """Emit a span measured elsewhere (e.g. queue wait, or one stage of a batch)"""
+    if not exporter.enabled:
+        return
+    exporter.export(Span(
+        name=name,
+        trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+        span_id=_new_id(),
+        parent_id=parent.span_id if parent else None,
+        start=start,
+        duration_ms=max(end - start, 0.0) * 1000,
+        attributes=attributes
+    ))
+
+def record_batch(name: str, parents: Iterable[Optional[SpanContext]], start: float, end: float, **attributes):
+    """Credit one batched stage to every trace in the batch"""
+    parents = list(parents)
+    for parent in parents:
+        record(name, parent, start, end, batch_size=len(parents), **attributes)
+
+def inject(headers: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the current trace context and publish time to message headers"""
+    context = current()
+    if context is not None:
+        headers[HEADER_TRACE_ID] = context.trace_id
+        headers[HEADER_PARENT_SPAN_ID] = context.span_id
+    headers[HEADER_PUBLISHED_AT] = time.time()
+    return headers
+
+def extract(headers: Optional[Dict[str, Any]], event_type: str = "message") -> Optional[SpanContext]:
+    """Read the trace context from message headers and record the queue wait"""
+    headers = headers or {}
+    trace_id = headers.get(HEADER_TRACE_ID)
+    context = SpanContext(str(trace_id), str(headers.get(HEADER_PARENT_SPAN_ID))) if trace_id else None
+
+    published_at = headers.get(HEADER_PUBLISHED_AT)
+    if published_at is not None:
+        record("queue_wait", context, float(published_at), time.time(), event_type=event_type)
+    return context
+
+def percentile_report(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """Latency percentiles per (span name, routing key) from exported JSON lines"""
+    import numpy as np
+
+    durations: Dict[Tuple[str, str], List[float]] = {}
+    for line in lines:
+        line = line.strip()
+        if line:
+            item = json.loads(line)
+            attributes = item.get("attributes") or {}
+            # Publish/consume spans carry routing_key, queue waits event_type
+            routing_key = attributes.get("routing_key") or attributes.get("event_type") or ""
+            durations.setdefault((item["name"], routing_key), []).append(item["duration_ms"])
+
+    report = []
+    for (name, routing_key), values in sorted(durations.items()):
+        values = np.asarray(values)
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        report.append({
+            "span": name,
+            "routing_key": routing_key,
+            "count": len(values),
+            "p50_ms": round(float(p50), 2),
+            "p90_ms": round(float(p90), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(values.max()), 2),
+        })
+    return report
+
+if __name__ == "__main__":
+    # python -m app.services.tracing traces.jsonl
+    path = sys.argv[1] if len(sys.argv) > 1 else TRACE_FILE
+    with open(path) as f:
+        rows = percentile_report(f)
+
+    print(f"{'span':<24} {'routing key':<24} {'count':>8} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for row in rows:
+        print(
+            f"{row['span']:<24} {row['routing_key'] or '-':<24} {row['count']:>8} {row['p50_ms']:>9.2f} "
+            f"{row['p90_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['max_ms']:>9.2f}"
+        )
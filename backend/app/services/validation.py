@@ -0,0 +1,198 @@
+import os
+import struct
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# Ingest Validation Configuration
+# Largest decoded image accepted (width * height); guards against decompression bombs
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(100_000_000)))
+ALLOWED_IMAGE_FORMATS = set(
+    os.getenv("ALLOWED_IMAGE_FORMATS", "jpeg,png,gif,webp,bmp,tiff,heic,avif").split(",")
+)
+# Header bytes inspected for formats whose dimensions sit at a fixed offset
+SNIFF_BYTES = 4096
+
+MIME_TYPES = {
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "bmp": "image/bmp",
+    "tiff": "image/tiff",
+    "heic": "image/heic",
+    "avif": "image/avif",
+}
+
+HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"mif1", b"msf1"}
+AVIF_BRANDS = {b"avif", b"avis"}
+# ISO-BMFF formats keep their dimensions deep in the box tree; their size isn't checked
+BOX_FORMATS = {"heic", "avif"}
+
+# SOF markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) don't
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+class InvalidImage(ValueError):
+    """Raised for uploads that are not an acceptable image"""
+
+@dataclass
+class ImageHeader:
+    format: str
+    content_type: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """Real image format from the leading magic bytes"""
+    if head[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[:2] == b"BM":
+        return "bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    if head[4:8] == b"ftyp" and head[8:12] in AVIF_BRANDS:
+        return "avif"
+    if head[4:8] == b"ftyp" and head[8:12] in HEIF_BRANDS:
+        return "heic"
+    return None
+
+def _jpeg_segments(data: bytes):
+    """Yield (marker, offset) of JPEG segment headers, skipping their payloads, up to SOS.
+
+    Each step jumps a whole segment, so large APPn blocks (XMP, ICC, MPF)
+    before the frame header cost one hop each.
+    """
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise InvalidImage("Corrupt JPEG marker stream")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        yield marker, pos
+        if marker == 0xDA:  # entropy-coded data follows
+            return
+        pos += 2 + struct.unpack_from(">H", data, pos + 2)[0]
+
+def _jpeg_size(data: bytes) -> Tuple[Optional[int], Optional[int]]:
+    """Frame size from the SOF marker"""
+    for marker, pos in _jpeg_segments(data):
+        if marker in JPEG_SOF_MARKERS:
+            if pos + 9 > len(data):
+                break
+            height, width = struct.unpack_from(">HH", data, pos + 5)
+            return width, height
+        if marker == 0xDA:  # start of scan before any frame header
+            break
+    return None, None
+
+def _tiff_size(data: bytes) -> Tuple[Optional[int], Optional[int]]:
+    """Width/height tags of the first IFD, wherever in the file it lies"""
+    endian = "<" if data[:2] == b"II" else ">"
+    offset = struct.unpack_from(endian + "I", data, 4)[0]
+    if offset + 2 > len(data):
+        return None, None
+    count = struct.unpack_from(endian + "H", data, offset)[0]
+    width = height = None
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        if entry + 12 > len(data):
+            break
+        tag, kind = struct.unpack_from(endian + "HH", data, entry)
+        value = struct.unpack_from(endian + ("H" if kind == 3 else "I"), data, entry + 8)[0]
+        if tag == 256:
+            width = value
+        elif tag == 257:
+            height = value
+    return width, height
+
+def read_dimensions(fmt: str, data: bytes) -> Tuple[Optional[int], Optional[int]]:
+    head = data[:SNIFF_BYTES]
+    if fmt == "jpeg":
+        return _jpeg_size(data)
+    if fmt == "png":
+        if head[12:16] != b"IHDR":
+            raise InvalidImage("PNG is missing its IHDR chunk")
+        return struct.unpack_from(">II", head, 16)
+    if fmt == "gif":
+        return struct.unpack_from("<HH", head, 6)
+    if fmt == "webp":
+        chunk = head[12:16]
+        if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+            width, height = struct.unpack_from("<HH", head, 26)
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L" and head[20] == 0x2F:
+            bits = int.from_bytes(head[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+        raise InvalidImage("Unrecognised WebP bitstream")
+    if fmt == "bmp":
+        width, height = struct.unpack_from("<ii", head, 18)
+        return abs(width), abs(height)
+    if fmt == "tiff":
+        return _tiff_size(data)
+    return None, None  # HEIF/AVIF dimensions live deep in the box tree
+
+def _looks_truncated(fmt: str, data: bytes) -> bool:
+    """Cheap checks for uploads cut off mid-transfer.
+
+    Only the end marker's presence is checked, not its position: Motion
+    Photos and Samsung SEFT files carry extra data after JPEG EOI, and some
+    tools append data after PNG IEND.
+    """
+    if fmt == "jpeg":
+        # Search after the main image's SOS so an EXIF thumbnail's EOI doesn't count
+        scan_start = max((pos for marker, pos in _jpeg_segments(data) if marker == 0xDA), default=0)
+        # Searching backwards finds a normal file's EOI right at the end
+        return data.rfind(b"\xff\xd9", scan_start) == -1
+    if fmt == "png":
+        return data.rfind(b"IEND") == -1
+    if fmt == "webp":
+        return len(data) < struct.unpack_from("<I", data, 4)[0] + 8
+    if fmt == "bmp":
+        return len(data) < struct.unpack_from("<I", data, 2)[0]
+    return False
+
+def validate_image(data: bytes, max_pixels: int = MAX_IMAGE_PIXELS) -> ImageHeader:
+    """Check an upload's real format and declared size without decoding it.
+
+    Works on the whole, already buffered body; the upload routes read every
+    file into memory before validating it.
+    """
+    if len(data) < 16:
+        raise InvalidImage("File is too small to be an image")
+
+    fmt = sniff_format(data[:32])
+    if fmt is None:
+        raise InvalidImage("File is not a recognised image format")
+    if fmt not in ALLOWED_IMAGE_FORMATS:
+        raise InvalidImage(f"Image format {fmt} is not accepted")
+
+    try:
+        width, height = read_dimensions(fmt, data)
+        truncated = _looks_truncated(fmt, data)
+    except struct.error:
+        raise InvalidImage(f"Truncated {fmt} header")
+
+    if fmt not in BOX_FORMATS:
+        if not width or not height:
+            raise InvalidImage(f"Could not read {fmt} dimensions")
+        if width * height > max_pixels:
+            raise InvalidImage(
+                f"Image is {width}x{height} ({width * height / 1e6:.0f} MP); "
+                f"the limit is {max_pixels / 1e6:.0f} MP"
+            )
+    if truncated:
+        raise InvalidImage(f"{fmt.upper()} file is truncated")
+
+    return ImageHeader(fmt, MIME_TYPES[fmt], width, height)
@@ -0,0 +1,325 @@
+import asyncio
+import hashlib
+import logging
+import struct
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# fetch(path, start, end) -> bytes of the object in [start, end) (end=None reads to the end)
+Fetch = Callable[[str, int, Optional[int]], Awaitable[bytes]]
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_READ_AHEAD = 4
+
+# Every entry is written STORED with ZIP64 extras and a ZIP64 data
+# descriptor, so the archive layout depends only on names and sizes. That
+# makes the total length and every offset known before the first byte is
+# sent, which is what allows Content-Length and Range requests.
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_LOCAL_EXTRA = struct.Struct("<HHQQ")
+_DESCRIPTOR = struct.Struct("<IIQQ")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_CENTRAL_EXTRA = struct.Struct("<HHQQQ")
+_ZIP64_EOCD = struct.Struct("<IQHHIIQQQQ")
+_ZIP64_LOCATOR = struct.Struct("<IIQI")
+_EOCD = struct.Struct("<IHHHHIIH")
+
+_VERSION = 45  # ZIP64
+_FLAGS = 0x0808  # data descriptor + UTF-8 names
+_MAX32 = 0xFFFFFFFF
+_MAX16 = 0xFFFF
+
+# CRCs of objects already streamed once, so resumed downloads rarely refetch
+_crc_cache: "OrderedDict[Tuple[str, int], int]" = OrderedDict()
+_CRC_CACHE_SIZE = 200_000
+
+def _remember_crc(key: Tuple[str, int], crc: int):
+    _crc_cache[key] = crc
+    _crc_cache.move_to_end(key)
+    if len(_crc_cache) > _CRC_CACHE_SIZE:
+        _crc_cache.popitem(last=False)
+
+def _dos_datetime(value: Optional[datetime]) -> Tuple[int, int]:
+    if value is None or value.year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (value.hour << 11) | (value.minute << 5) | (value.second // 2)
+    dos_date = ((value.year - 1980) << 9) | (value.month << 5) | value.day
+    return dos_time, dos_date
+
+@dataclass
+class ZipEntry:
+    """One archive member backed by a storage object"""
+    name: str
+    path: str
+    size: int
+    modified: Optional[datetime] = None
+    offset: int = 0
+    crc: Optional[int] = None
+
+    @property
+    def name_bytes(self) -> bytes:
+        return self.name.encode("utf-8")
+
+    @property
+    def header_length(self) -> int:
+        return _LOCAL_HEADER.size + len(self.name_bytes) + _LOCAL_EXTRA.size
+
+    @property
+    def data_offset(self) -> int:
+        return self.offset + self.header_length
+
+    @property
+    def end_offset(self) -> int:
+        return self.data_offset + self.size + _DESCRIPTOR.size
+
+    def local_header(self) -> bytes:
+        dos_time, dos_date = _dos_datetime(self.modified)
+        return (
+            _LOCAL_HEADER.pack(
+                0x04034B50, _VERSION, _FLAGS, 0, dos_time, dos_date,
+                0, _MAX32, _MAX32, len(self.name_bytes), _LOCAL_EXTRA.size
+            )
+            + self.name_bytes
+            + _LOCAL_EXTRA.pack(0x0001, 16, self.size, self.size)
+        )
+
+    def descriptor(self) -> bytes:
+        return _DESCRIPTOR.pack(0x08074B50, self.crc, self.size, self.size)
+
+    def central_header(self) -> bytes:
+        dos_time, dos_date = _dos_datetime(self.modified)
+        return (
+            _CENTRAL_HEADER.pack(
+                0x02014B50, _VERSION, _VERSION, _FLAGS, 0, dos_time, dos_date,
+                self.crc, _MAX32, _MAX32, len(self.name_bytes), _CENTRAL_EXTRA.size,
+                0, 0, 0, 0o644 << 16, _MAX32
+            )
+            + self.name_bytes
+            + _CENTRAL_EXTRA.pack(0x0001, 24, self.size, self.size, self.offset)
+        )
+
+    @property
+    def central_length(self) -> int:
+        return _CENTRAL_HEADER.size + len(self.name_bytes) + _CENTRAL_EXTRA.size
+
+def unique_names(names: List[str]) -> List[str]:
+    """Disambiguate repeated file names as "name (2).jpg" etc."""
+    used = set()
+    result = []
+    for name in names:
+        stem, dot, ext = name.rpartition(".")
+        candidate = name
+        copy = 1
+        while candidate in used:
+            copy += 1
+            candidate = f"{stem} ({copy}).{ext}" if dot and stem else f"{name} ({copy})"
+        used.add(candidate)
+        result.append(candidate)
+    return result
+
+class ZipStream:
+    """Deterministic ZIP64 archive streamed straight from storage"""
+
+    def __init__(self, entries: List[ZipEntry], fetch: Fetch, read_ahead: int = DEFAULT_READ_AHEAD):
+        self.entries = entries
+        self.fetch = fetch
+        self.read_ahead = read_ahead
+
+        offset = 0
+        for entry in entries:
+            entry.offset = offset
+            entry.crc = _crc_cache.get((entry.path, entry.size), entry.crc)
+            offset = entry.end_offset
+
+        self.central_offset = offset
+        self.central_size = sum(entry.central_length for entry in entries)
+        self.total_size = (
+            self.central_offset + self.central_size
+            + _ZIP64_EOCD.size + _ZIP64_LOCATOR.size + _EOCD.size
+        )
+
+    @property
+    def etag(self) -> str:
+        digest = hashlib.sha1()
+        for entry in self.entries:
+            digest.update(f"{entry.name}\0{entry.path}\0{entry.size}\n".encode("utf-8"))
+        return f'"{digest.hexdigest()}"'
+
+    def _trailer(self) -> bytes:
+        count = len(self.entries)
+        zip64_eocd_offset = self.central_offset + self.central_size
+        return (
+            _ZIP64_EOCD.pack(
+                0x06064B50, _ZIP64_EOCD.size - 12, _VERSION, _VERSION, 0, 0,
+                count, count, self.central_size, self.central_offset
+            )
+            + _ZIP64_LOCATOR.pack(0x07064B50, 0, zip64_eocd_offset, 1)
+            + _EOCD.pack(0x06054B50, 0, 0, _MAX16, _MAX16, _MAX32, _MAX32, 0)
+        )
+
+    def _missing_crcs(self, start: int, end: int) -> List[int]:
+        """Entries whose CRC this range needs but whose data it doesn't fully stream"""
+        missing = []
+        cursor = self.central_offset
+        for index, entry in enumerate(self.entries):
+            data_end = entry.data_offset + entry.size
+            in_descriptor = data_end < end and entry.end_offset > start
+            in_central = cursor < end and cursor + entry.central_length > start
+            streamed = start <= entry.data_offset and data_end <= end
+            if entry.crc is None and (in_descriptor or in_central) and not streamed:
+                missing.append(index)
+            cursor += entry.central_length
+        return missing
+
+    def _prefetch_crcs(self, indexes: List[int]) -> Dict[int, asyncio.Future]:
+        """Compute CRCs concurrently, holding at most read_ahead objects at a time"""
+        limit = asyncio.Semaphore(self.read_ahead)
+
+        async def compute(entry: ZipEntry):
+            async with limit:
+                content = await self.fetch(entry.path, 0, None)
+                entry.crc = zlib.crc32(content)
+            _remember_crc((entry.path, entry.size), entry.crc)
+
+        return {index: asyncio.ensure_future(compute(self.entries[index])) for index in indexes}
+
+    async def _ensure_crc(self, entry: ZipEntry, task: Optional[asyncio.Future] = None):
+        """CRC of an object that wasn't streamed in this response"""
+        if task is not None:
+            await task
+        if entry.crc is not None:
+            return
+        content = await self.fetch(entry.path, 0, None)
+        entry.crc = zlib.crc32(content)
+        _remember_crc((entry.path, entry.size), entry.crc)
+
+    async def stream(self, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield archive bytes in [start, end), fetching objects with bounded read-ahead"""
+        end = self.total_size if end is None else min(end, self.total_size)
+
+        # Object reads needed for this range, scheduled at most read_ahead ahead
+        reads = []
+        for index, entry in enumerate(self.entries):
+            lo, hi = max(start, entry.data_offset), min(end, entry.data_offset + entry.size)
+            if lo < hi:
+                reads.append((index, lo - entry.data_offset, hi - entry.data_offset))
+        pending = {}
+        next_read = 0
+
+        # A resume into the descriptors or central directory on a process that
+        # hasn't seen these objects needs their CRCs; fetch them in parallel
+        crc_tasks = self._prefetch_crcs(self._missing_crcs(start, end))
+
+        def schedule():
+            nonlocal next_read
+            while next_read < len(reads) and len(pending) < self.read_ahead:
+                index, lo, hi = reads[next_read]
+                pending[index] = asyncio.ensure_future(self.fetch(self.entries[index].path, lo, hi))
+                next_read += 1
+
+        try:
+            position = start
+            for index, entry in enumerate(self.entries):
+                if entry.end_offset <= position:
+                    continue
+                if entry.offset >= end:
+                    break
+
+                schedule()
+
+                # Local header
+                header_end = entry.data_offset
+                if position < header_end:
+                    header = entry.local_header()
+                    chunk = header[position - entry.offset:min(end, header_end) - entry.offset]
+                    yield chunk
+                    position += len(chunk)
+                if position >= end:
+                    break
+
+                # File data
+                data_end = entry.data_offset + entry.size
+                if position < data_end:
+                    content = await pending.pop(index)
+                    schedule()
+                    expected = min(end, data_end) - position
+                    if len(content) != expected:
+                        raise IOError(f"{entry.path}: expected {expected} bytes, storage returned {len(content)}")
+                    if position == entry.data_offset and len(content) == entry.size:
+                        entry.crc = zlib.crc32(content)
+                        _remember_crc((entry.path, entry.size), entry.crc)
+                    for i in range(0, len(content), CHUNK_SIZE):
+                        yield content[i:i + CHUNK_SIZE]
+                    position += len(content)
+                    del content
+                if position >= end:
+                    break
+
+                # Data descriptor
+                await self._ensure_crc(entry, crc_tasks.get(index))
+                descriptor = entry.descriptor()
+                chunk = descriptor[position - data_end:min(end, entry.end_offset) - data_end]
+                yield chunk
+                position += len(chunk)
+                if position >= end:
+                    break
+
+            # Central directory
+            cursor = self.central_offset
+            buffer = []
+            buffered = 0
+            for index, entry in enumerate(self.entries):
+                if position >= end:
+                    break
+                length = entry.central_length
+                if cursor + length > position:
+                    await self._ensure_crc(entry, crc_tasks.get(index))
+                    record = entry.central_header()
+                    piece = record[position - cursor:min(end, cursor + length) - cursor]
+                    buffer.append(piece)
+                    buffered += len(piece)
+                    position += len(piece)
+                    if buffered >= CHUNK_SIZE:
+                        yield b"".join(buffer)
+                        buffer, buffered = [], 0
+                cursor += length
+            if buffer:
+                yield b"".join(buffer)
+
+            # End records
+            trailer_start = self.central_offset + self.central_size
+            if position < end:
+                trailer = self._trailer()
+                yield trailer[position - trailer_start:end - trailer_start]
+        finally:
+            for task in list(pending.values()) + list(crc_tasks.values()):
+                task.cancel()
+
+def parse_range(header: Optional[str], total_size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single "bytes=" range into [start, end); None means the whole file.
+
+    Raises ValueError for unsatisfiable or multi-part ranges.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError("Only single byte ranges are supported")
+
+    first, _, last = spec.strip().partition("-")
+    if first:
+        start = int(first)
+        end = int(last) + 1 if last else total_size
+    else:
+        suffix = int(last)
+        start, end = max(0, total_size - suffix), total_size
+
+    end = min(end, total_size)
+    if start >= end:
+        raise ValueError("Range not satisfiable")
+    return start, end
@@ -0,0 +1,33 @@
+import asyncio
+import logging
+import os
+
+from config.firebase_config import bucket
+from config.db_config import init_db_pool, close_db_pool
+from app.services.tiering import TierMover, sweep_cold
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = float(os.getenv("TIER_SWEEP_INTERVAL", "3600"))
+
+async def main():
+    """Periodically demote images that haven't been accessed recently"""
+    await init_db_pool()
+    mover = TierMover(bucket)
+    try:
+        while True:
+            try:
+                moved = await sweep_cold(mover)
+                logger.info(f"Tiering sweep finished: {moved} images moved to cold storage")
+            except Exception as e:
+                logger.error(f"Tiering sweep failed: {str(e)}")
+            await asyncio.sleep(SWEEP_INTERVAL)
+    finally:
+        await close_db_pool()
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""Compare the v1 (JSON) and v2 (msgpack) upload event wire formats.
+
+Measures building + encoding on the publisher side, decoding on the
+consumer side, and the message body size:
+
+    python -m benchmarks.bench_event_schema --events 100000
+"""
+import argparse
+import json
+import time
+import uuid
+from dataclasses import asdict
+from datetime import datetime
+
+from app.services.events import UploadEvent, BatchEvent, encode_event, decode_event
+
+def make_upload_event() -> UploadEvent:
+    user_id, group_id, image_id = str(uuid.uuid4()), str(uuid.uuid4()), str(uuid.uuid4())
+    filename = f"{image_id}_IMG_20240612_184512.jpg"
+    firebase_path = f"{user_id}/{group_id}/image/{filename}"
+    return UploadEvent(
+        event_id=str(uuid.uuid4()),
+        upload_id=str(uuid.uuid4()),
+        user_id=user_id,
+        group_id=group_id,
+        filename=filename,
+        original_filename="IMG_20240612_184512.jpg",
+        file_size=4_213_554,
+        content_type="image/jpeg",
+        firebase_path=firebase_path,
+        public_url=f"https://storage.googleapis.com/gallery/{firebase_path}",
+        processing_time_seconds=0.4812,
+        image_id=image_id
+    )
+
+def make_batch_event() -> BatchEvent:
+    return BatchEvent(
+        batch_id=str(uuid.uuid4()),
+        user_id=str(uuid.uuid4()),
+        group_id=str(uuid.uuid4()),
+        total_files=50,
+        successful_uploads=49,
+        failed_uploads=1,
+        total_size_bytes=210_000_000,
+        processing_time_seconds=12.5,
+        status="completed"
+    )
+
+def legacy_encode(event) -> bytes:
+    """What publish_event did before the v2 format: timestamps were ISO strings"""
+    data = asdict(event)
+    data["timestamp"] = datetime.utcfromtimestamp(data["timestamp"]).isoformat()
+    return json.dumps(data, default=str).encode()
+
+def bench(name: str, events, encode, headers):
+    start = time.perf_counter()
+    bodies = [encode(e) for e in events]
+    encoded = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for body in bodies:
+        decode_event(body, headers)
+    decoded = time.perf_counter() - start
+
+    count = len(events)
+    size = sum(len(b) for b in bodies) / count
+    print(
+        f"{name:<22} encode {encoded / count * 1e6:6.2f} us  "
+        f"decode {decoded / count * 1e6:6.2f} us  body {size:6.1f} B"
+    )
+    return size
+
+def main(count: int):
+    for label, factory in [("UploadEvent", make_upload_event), ("BatchEvent", make_batch_event)]:
+        events = [factory() for _ in range(count)]
+        print(f"{label} x {count}")
+        v1 = bench("v1 json (asdict)", events, legacy_encode, {"schema_version": 1})
+        bench("v1 json (encode_event)", events, lambda e: encode_event(e, 1)[0], {"schema_version": 1})
+        v2 = bench("v2 msgpack", events, lambda e: encode_event(e, 2)[0], {"schema_version": 2})
+        print(f"{'':<22} v2 body is {v2 / v1:.0%} of v1\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100_000)
+    args = parser.parse_args()
+    main(args.events)
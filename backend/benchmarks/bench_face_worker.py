@@ -0,0 +1,51 @@
+"""Face analysis throughput: faces per second per core at several batch sizes.
+
+Needs the ONNX models referenced by FACE_DETECTOR_MODEL / FACE_EMBEDDER_MODEL
+and a directory of sample photos:
+
+    python -m benchmarks.bench_face_worker photos/ --workers 4 --batch-sizes 1 4 8 16 32
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from app.services.faces import analyse_images, init_worker
+
+def load_samples(directory: str, limit: int):
+    paths = sorted(p for p in Path(directory).rglob("*") if p.suffix.lower() in {".jpg", ".jpeg", ".png"})
+    return [p.read_bytes() for p in paths[:limit]]
+
+def run(samples, workers: int, batch_size: int):
+    batches = [samples[i:i + batch_size] for i in range(0, len(samples), batch_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=partial(init_worker, 1)) as pool:
+        # Warm up: load models in every worker
+        list(pool.map(analyse_images, [samples[:1]] * workers))
+
+        start = time.perf_counter()
+        results = list(pool.map(analyse_images, batches))
+        elapsed = time.perf_counter() - start
+
+    faces = sum(len(image_faces) for batch in results for image_faces in batch)
+    return elapsed, faces
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--limit", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    samples = load_samples(args.directory, args.limit)
+    print(f"{len(samples)} images, {args.workers} worker(s)")
+    print(f"{'batch':>6} {'images/s':>10} {'faces/s':>10} {'faces/s/core':>13} {'ms/batch':>10}")
+
+    for batch_size in args.batch_sizes:
+        elapsed, faces = run(samples, args.workers, batch_size)
+        batches = -(-len(samples) // batch_size)
+        print(
+            f"{batch_size:>6} {len(samples) / elapsed:>10.1f} {faces / elapsed:>10.1f} "
+            f"{faces / elapsed / args.workers:>13.1f} {elapsed / batches * args.workers * 1000:>10.1f}"
+        )
@@ -0,0 +1,85 @@
+"""Compare row-by-row INSERTs against batched image row persistence.
+
+Runs against a local Postgres (DATABASE_URL) using a temporary ``images``
+table, so the real table is never touched:
+
+    python -m benchmarks.bench_image_rows --rows 50 --batches 20
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from dataclasses import astuple
+
+import asyncpg
+
+from config.db_config import DATABASE_URL
+from app.services.image_rows import IMAGE_COLUMNS, ImageRow, copy_rows, insert_rows
+
+CREATE_TEMP_TABLE = """
+    CREATE TEMP TABLE images (
+        id uuid PRIMARY KEY,
+        group_id text,
+        filename text,
+        location text,
+        created_by_user text,
+        size bigint,
+        uploaded_at timestamptz,
+        status text,
+        phash bigint
+    )
+"""
+
+def make_rows(count: int):
+    group_id = str(uuid.uuid4())
+    return [
+        ImageRow(
+            id=str(uuid.uuid4()),
+            group_id=group_id,
+            filename=f"IMG_{i:05d}.jpg",
+            location=f"user/{group_id}/image/IMG_{i:05d}.jpg",
+            created_by_user="bench-user",
+            size=3_000_000 + i
+        )
+        for i in range(count)
+    ]
+
+async def row_by_row(conn, rows):
+    placeholders = ", ".join(f"${i + 1}" for i in range(len(IMAGE_COLUMNS)))
+    query = f"INSERT INTO images ({', '.join(IMAGE_COLUMNS)}) VALUES ({placeholders})"
+    for row in rows:
+        await conn.execute(query, *astuple(row))
+
+STRATEGIES = {
+    "row_by_row": row_by_row,
+    "executemany": insert_rows,
+    "copy": copy_rows,
+}
+
+async def run(rows_per_batch: int, batches: int):
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await conn.execute(CREATE_TEMP_TABLE)
+        print(f"{'strategy':<12} {'rows/s':>10} {'ms/batch':>10}")
+
+        for name, strategy in STRATEGIES.items():
+            await conn.execute("TRUNCATE images")
+            work = [make_rows(rows_per_batch) for _ in range(batches)]
+
+            start = time.perf_counter()
+            for rows in work:
+                await strategy(conn, rows)
+            elapsed = time.perf_counter() - start
+
+            total = rows_per_batch * batches
+            print(f"{name:<12} {total / elapsed:>10.0f} {elapsed / batches * 1000:>10.2f}")
+    finally:
+        await conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50, help="rows per upload batch")
+    parser.add_argument("--batches", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.rows, args.batches))
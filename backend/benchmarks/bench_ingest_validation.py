@@ -0,0 +1,86 @@
+"""Measure the cost of upload-path validation against PIL-based checks.
+
+Each sample is validated from memory, the way upload_single_file sees it;
+the PIL columns show what opening the header, verifying, or fully decoding
+the same bytes would cost instead:
+
+    python -m benchmarks.bench_ingest_validation --iterations 2000
+"""
+import argparse
+import io
+import struct
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.services.validation import InvalidImage, validate_image
+
+def encode(img: Image.Image, fmt: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+def make_samples():
+    rng = np.random.default_rng(0)
+    photo = Image.fromarray(rng.integers(0, 255, (3000, 4000, 3), dtype=np.uint8))
+    exif = Image.Exif()
+    exif[0x010F] = "Camera"
+    exif[0x9286] = "x" * 60_000  # large maker/comment block ahead of the frame header
+
+    small = photo.resize((1600, 1200))
+    bomb = bytearray(encode(Image.new("RGB", (1, 1)), "PNG"))
+    struct.pack_into(">II", bomb, 16, 60_000, 60_000)
+
+    return [
+        ("jpeg 12MP", encode(photo, "JPEG", quality=85)),
+        ("jpeg 12MP + 60KB exif", encode(photo, "JPEG", quality=85, exif=exif.tobytes())),
+        ("png 2MP", encode(small, "PNG")),
+        ("webp 2MP", encode(small, "WEBP")),
+        ("png bomb 3.6GP", bytes(bomb)),
+        ("not an image", b"%PDF-1.7\n" + bytes(4096)),
+    ]
+
+def timed(func, data: bytes, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        try:
+            func(data)
+        except (InvalidImage, Image.DecompressionBombError, OSError, SyntaxError):
+            pass
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def pil_open(data: bytes):
+    with Image.open(io.BytesIO(data)) as img:
+        return img.size
+
+def pil_verify(data: bytes):
+    with Image.open(io.BytesIO(data)) as img:
+        img.verify()
+
+def pil_decode(data: bytes):
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+
+def main(iterations: int):
+    print(f"{'sample':<24}{'size':>10}  {'validate':>12}{'pil open':>12}{'pil verify':>12}{'pil decode':>12}  (us per file)")
+    for name, data in make_samples():
+        try:
+            validate_image(data)
+            verdict = "ok"
+        except InvalidImage as e:
+            verdict = f"rejected: {e}"
+
+        columns = [timed(validate_image, data, iterations), timed(pil_open, data, iterations)]
+        columns.append(timed(pil_verify, data, max(iterations // 10, 1)))
+        columns.append(timed(pil_decode, data, max(iterations // 200, 1)))
+        print(
+            f"{name:<24}{len(data) / 1024:>8.0f}KB  " + "".join(f"{c:>12.1f}" for c in columns)
+        )
+        print(f"{'':<24}{verdict}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.iterations)
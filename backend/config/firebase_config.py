@@ -1,12 +1,21 @@
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
+import os
 
-cred = credentials.Certificate("config/firebase-key.json")
+if os.getenv("STORAGE_BACKEND") == "local":
+    # Filesystem stand-in for local development and storage job testing
+    from config.local_storage import local_bucket
 
-firebase_admin.initialize_app(cred, {
-    'storageBucket': 'gallery-585ee.firebasestorage.app' 
-})
+    db = None
+    bucket = local_bucket()
+else:
+    import firebase_admin
+    from firebase_admin import credentials, firestore, storage
 
+    cred = credentials.Certificate("config/firebase-key.json")
 
-db = firestore.client()
-bucket = storage.bucket()
+    firebase_admin.initialize_app(cred, {
+        'storageBucket': 'gallery-585ee.firebasestorage.app' 
+    })
+
+
+    db = firestore.client()
+    bucket = storage.bucket()
@@ -0,0 +1,97 @@
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Union
+
+# Local stand-in for the Firebase/GCS bucket, used for development and for
+# exercising storage jobs without touching the real bucket. Implements the
+# subset of the google-cloud-storage Bucket/Blob API the backend uses.
+
+class LocalBlob:
+    def __init__(self, bucket: "LocalBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.storage_class = "STANDARD"
+
+    @property
+    def _path(self) -> Path:
+        return self.bucket.root / self.name
+
+    @property
+    def public_url(self) -> str:
+        return f"file://{self._path}"
+
+    @property
+    def size(self) -> Optional[int]:
+        return self._path.stat().st_size if self._path.exists() else None
+
+    def exists(self) -> bool:
+        return self._path.exists()
+
+    def upload_from_string(self, data: Union[bytes, str], content_type: str = None):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._path.write_bytes(data.encode() if isinstance(data, str) else data)
+
+    def upload_from_filename(self, filename: str, content_type: str = None):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(filename, self._path)
+
+    def download_as_bytes(self, start: int = None, end: int = None) -> bytes:
+        with open(self._path, "rb") as f:
+            if start:
+                f.seek(start)
+            if end is None:
+                return f.read()
+            return f.read(end - (start or 0) + 1)  # end is inclusive, as in GCS
+
+    def make_public(self):
+        pass
+
+    def generate_signed_url(self, expiration=None, method: str = "GET", **kwargs) -> str:
+        return self.public_url
+
+    def update_storage_class(self, storage_class: str):
+        if not self._path.exists():
+            raise FileNotFoundError(self.name)
+        self.storage_class = storage_class
+
+    def delete(self):
+        self._path.unlink()
+
+class LocalBucket:
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.client = self
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional[LocalBlob]:
+        blob = self.blob(name)
+        return blob if blob.exists() else None
+
+    def list_blobs(self, prefix: str = "") -> Iterable[LocalBlob]:
+        for path in sorted(self.root.rglob("*")):
+            if path.is_file():
+                name = path.relative_to(self.root).as_posix()
+                if name.startswith(prefix):
+                    yield self.blob(name)
+
+    def delete_blobs(self, blobs: Iterable, on_error: Callable = None):
+        for blob in blobs:
+            blob = self.blob(blob) if isinstance(blob, str) else blob
+            try:
+                blob.delete()
+            except FileNotFoundError:
+                if on_error is None:
+                    raise
+                on_error(blob)
+
+    @contextmanager
+    def batch(self):
+        yield self
+
+def local_bucket() -> LocalBucket:
+    return LocalBucket(os.getenv("LOCAL_STORAGE_ROOT", "local-storage"))
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the backend as the app does, from the backend directory,
+# and never reach Firebase
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("STORAGE_BACKEND", "local")
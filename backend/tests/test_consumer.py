@@ -0,0 +1,115 @@
+import asyncio
+import importlib
+import uuid
+
+from app.services.batching import MicroBatcher
+from app.services.events import BatchEvent, HEADER_SCHEMA_VERSION, UploadEvent, encode_event
+from app.services.partitions import PartitionedConsumer, partition_for, partition_routing_key
+
+UploadEventConsumer = importlib.import_module("app.consumer-example").UploadEventConsumer
+
+class FakeMessage:
+    def __init__(self, routing_key, event, log):
+        self.body, self.content_type = encode_event(event)
+        self.headers = {HEADER_SCHEMA_VERSION: 2, "event_type": routing_key}
+        self.routing_key = partition_routing_key(routing_key, event.group_id)
+        self.message_id = getattr(event, "event_id", None) or f"{event.batch_id}:{event.status}"
+        self.log = log
+
+    async def ack(self):
+        self.log.append(("ack", self.message_id))
+
+class FakeRetries:
+    def __init__(self, log):
+        self.log = log
+
+    async def retry(self, message, origin_queue, error):
+        self.log.append(("retry", message.message_id))
+
+    async def dead_letter(self, message, origin_queue, error):
+        self.log.append(("dlq", message.message_id))
+
+class FakeQueue:
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def consume(self, callback):
+        self.channel.callback = callback
+        return "ctag"
+
+class FakeChannel:
+    callback = None
+
+    async def set_qos(self, prefetch_count):
+        self.prefetch = prefetch_count
+
+    async def declare_queue(self, name, **kwargs):
+        return FakeQueue(self)
+
+    async def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self):
+        self.channels = []
+
+    async def channel(self):
+        self.channels.append(FakeChannel())
+        return self.channels[-1]
+
+def upload(group_id):
+    image_id = str(uuid.uuid4())
+    return UploadEvent(
+        event_id=image_id, upload_id="u1", user_id="user", group_id=group_id, filename=f"{image_id}.jpg",
+        original_filename="photo.jpg", file_size=1, content_type="image/jpeg",
+        firebase_path=f"user/{group_id}/image/{image_id}.jpg", image_id=image_id
+    )
+
+async def deliver(messages, batch_delay=0.2):
+    """Run a burst through one partition the way aiormq delivers it: one task per message"""
+    log = []
+    consumer = UploadEventConsumer()
+    consumer.process_pool.shutdown()
+    batches = []
+
+    async def score(events):
+        batches.append(len(events))
+        log.extend(("scored", e["event_id"]) for e in events)
+        return [None] * len(events)
+
+    consumer.quality_batcher = MicroBatcher(score, max_batch_size=16, max_delay=batch_delay)
+    consumer.retries = FakeRetries(log)
+    connection = FakeConnection()
+    partitions = PartitionedConsumer(connection, None, None, consumer.dispatch_event, prefetch=16)
+    partition = partition_for("g1")
+    await partitions._acquire(partition)
+    callback = connection.channels[0].callback
+
+    deliveries = [asyncio.ensure_future(callback(m(log))) for m in messages]
+    await asyncio.gather(*deliveries)
+    await partitions._release(partition)
+    await consumer.quality_batcher.stop()
+    consumer.io_executor.shutdown()
+    return batches, log, connection.channels[0].prefetch
+
+def test_single_group_burst_is_scored_in_one_batch():
+    events = [upload("g1") for _ in range(6)]
+    messages = [lambda log, e=e: FakeMessage("upload.success", e, log) for e in events]
+
+    batches, log, prefetch = asyncio.run(deliver(messages))
+
+    assert prefetch == 16
+    assert batches == [6]
+    assert [entry for entry in log if entry[0] == "ack"] == [("ack", e.event_id) for e in events]
+
+def test_group_events_wait_for_earlier_uploads():
+    events = [upload("g1") for _ in range(3)]
+    done = BatchEvent(batch_id="b1", user_id="user", group_id="g1", total_files=3, status="completed")
+    messages = [lambda log, e=e: FakeMessage("upload.success", e, log) for e in events]
+    messages.append(lambda log: FakeMessage("upload.batch.completed", done, log))
+
+    batches, log, _ = asyncio.run(deliver(messages))
+
+    assert batches == [3]
+    assert log[-1] == ("ack", "b1:completed")
+    assert log.index(("ack", "b1:completed")) > max(log.index(("ack", e.event_id)) for e in events)
@@ -0,0 +1,62 @@
+import json
+
+import msgpack
+import pytest
+
+from app.services.events import (
+    BatchEvent, CONTENT_TYPE_JSON, CONTENT_TYPE_MSGPACK, HEADER_SCHEMA_VERSION, SCHEMA_FIELDS, SCHEMA_IDS,
+    UploadEvent, decode_event, encode_event, event_key,
+)
+
+V2 = {HEADER_SCHEMA_VERSION: 2}
+
+def upload(**kwargs):
+    return UploadEvent(
+        event_id="e1", upload_id="u1", user_id="user", group_id="g1", filename="x.jpg",
+        original_filename="photo.jpg", file_size=10, content_type="image/jpeg",
+        firebase_path="user/g1/image/x.jpg", timestamp=1_700_000_000.5, **kwargs
+    )
+
+def test_v2_round_trip():
+    event = upload(image_id="i1", date_taken="2024-05-01T12:00:00")
+    body, content_type = encode_event(event, version=2)
+
+    assert content_type == CONTENT_TYPE_MSGPACK
+    assert decode_event(body, V2) == {name: getattr(event, name) for name in SCHEMA_FIELDS[1]}
+
+def test_v1_round_trip_uses_iso_timestamps():
+    body, content_type = encode_event(upload(), version=1)
+    data = decode_event(body, {HEADER_SCHEMA_VERSION: 1})
+
+    assert content_type == CONTENT_TYPE_JSON
+    assert data["timestamp"] == "2023-11-14T22:13:20.500000"
+    assert data == json.loads(body)
+
+def test_older_publisher_fields_take_defaults():
+    # An array from before uploaded_at/date_taken were appended
+    values = [SCHEMA_IDS[UploadEvent]] + [getattr(upload(), name) for name in SCHEMA_FIELDS[1][:-2]]
+    data = decode_event(msgpack.packb(values), V2)
+
+    assert data["uploaded_at"] is None and data["date_taken"] is None
+    assert data["event_id"] == "e1"
+
+def test_newer_publisher_trailing_fields_are_ignored():
+    body, _ = encode_event(upload(), version=2)
+    values = msgpack.unpackb(body) + ["from the future"]
+    assert set(decode_event(msgpack.packb(values), V2)) == set(SCHEMA_FIELDS[1])
+
+def test_unknown_schema_id_is_rejected():
+    with pytest.raises(ValueError):
+        decode_event(msgpack.packb([99, "x"]), V2)
+
+def test_plain_dict_events():
+    body, _ = encode_event({"face_ids": ["f1"]}, version=2)
+    assert decode_event(body, V2) == {"face_ids": ["f1"]}
+
+def test_events_are_slotted():
+    assert not hasattr(upload(), "__dict__")
+    assert not hasattr(BatchEvent("b1", "user", "g1", 3), "__dict__")
+
+def test_event_key():
+    assert event_key(upload()) == "e1"
+    assert event_key(BatchEvent("b1", "user", "g1", 3, status="completed")) == "b1:completed"
@@ -0,0 +1,146 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import expiry
+from app.services.expiry import ExpirySweeper, image_object_paths
+from config.local_storage import local_bucket
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+class FakeConnection:
+    """Answers the handful of queries ExpirySweeper issues from in-memory tables"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def fetch(self, query, *args):
+        if "FROM groups" in query:
+            return [{"id": g} for g, delete_at in self.db.groups.items() if delete_at and delete_at <= args[0]]
+
+        # Keyset image scan: (*where params, last_id, limit)
+        *params, last_id, limit = args
+        if "group_id = $1" in query:
+            match = lambda row: row["group_id"] == params[0]
+        else:
+            match = lambda row: row["delete_at"] is not None and row["delete_at"] <= params[0]
+        rows = sorted(
+            (row for row in self.db.images.values()
+             if match(row) and (last_id is None or row["id"] > last_id)),
+            key=lambda row: row["id"]
+        )
+        return rows[:limit]
+
+    async def fetchval(self, query, group_id):
+        return sum(1 for row in self.db.images.values() if row["group_id"] == group_id)
+
+    async def execute(self, query, *args):
+        if "DELETE FROM images" in query:
+            deleted = [image_id for image_id in args[0] if self.db.images.pop(image_id, None)]
+            return f"DELETE {len(deleted)}"
+        if "DELETE FROM groups" in query:
+            self.db.groups.pop(args[0], None)
+            return "DELETE 1"
+        return "DELETE 0"
+
+class FakePool:
+    def __init__(self):
+        self.images = {}
+        self.groups = {}
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection(self)
+
+    def add_image(self, bucket, group_id="g1", delete_at=None, variants=True):
+        image_id = uuid.uuid4()
+        row = {"id": image_id, "location": f"originals/{image_id}", "group_id": group_id, "delete_at": delete_at}
+        self.images[image_id] = row
+        paths = image_object_paths(row) if variants else [row["location"]]
+        for path in paths:
+            bucket.blob(path).upload_from_string(b"data")
+        return row
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCAL_STORAGE_ROOT", str(tmp_path))
+    return local_bucket()
+
+def stored(bucket, row):
+    return [path for path in image_object_paths(row) if bucket.blob(path).exists()]
+
+def test_sweep_images_deletes_only_expired(bucket):
+    pool = FakePool()
+    expired = pool.add_image(bucket, delete_at=NOW - timedelta(days=1))
+    due_now = pool.add_image(bucket, delete_at=NOW)
+    future = pool.add_image(bucket, delete_at=NOW + timedelta(days=1))
+    kept = pool.add_image(bucket)
+
+    deleted = asyncio.run(ExpirySweeper(pool, bucket, batch_size=1).sweep_images(NOW))
+
+    assert deleted == 2
+    assert set(pool.images) == {future["id"], kept["id"]}
+    assert stored(bucket, expired) == [] and stored(bucket, due_now) == []
+    assert len(stored(bucket, future)) == len(image_object_paths(future))
+
+def test_sweep_groups_removes_images_and_group(bucket):
+    pool = FakePool()
+    pool.groups = {"old": NOW - timedelta(hours=1), "live": None}
+    old = [pool.add_image(bucket, group_id="old") for _ in range(3)]
+    live = pool.add_image(bucket, group_id="live")
+
+    sweeper = ExpirySweeper(pool, bucket)
+    asyncio.run(sweeper.sweep_groups(NOW))
+
+    assert sweeper.stats.groups_deleted == 1
+    assert list(pool.groups) == ["live"]
+    assert list(pool.images) == [live["id"]]
+    assert all(stored(bucket, row) == [] for row in old)
+
+def test_delete_objects_in_chunks(bucket, monkeypatch):
+    monkeypatch.setattr(expiry, "EXPIRY_DELETE_CHUNK", 3)
+    paths = [f"obj_{i}" for i in range(7)]
+    for path in paths:
+        bucket.blob(path).upload_from_string(b"data")
+
+    sweeper = ExpirySweeper(FakePool(), bucket)
+    batches = []
+    batch_delete = sweeper._batch_delete
+    monkeypatch.setattr(sweeper, "_batch_delete", lambda chunk: batches.append(list(chunk)) or batch_delete(chunk))
+
+    failed = asyncio.run(sweeper.delete_objects(paths))
+
+    assert failed == set()
+    assert sorted(len(chunk) for chunk in batches) == [1, 3, 3]
+    assert not any(bucket.blob(path).exists() for path in paths)
+    assert sweeper.stats.objects_deleted == 7
+
+def test_missing_objects_count_as_deleted(bucket):
+    pool = FakePool()
+    # Derived variants were never generated for this image
+    row = pool.add_image(bucket, delete_at=NOW - timedelta(days=1), variants=False)
+
+    sweeper = ExpirySweeper(pool, bucket)
+    deleted = asyncio.run(sweeper.sweep_images(NOW))
+
+    assert deleted == 1
+    assert pool.images == {}
+    assert not bucket.blob(row["location"]).exists()
+    assert sweeper.stats.objects_failed == 0
+
+def test_dry_run_deletes_nothing(bucket):
+    pool = FakePool()
+    row = pool.add_image(bucket, delete_at=NOW - timedelta(days=1))
+
+    sweeper = ExpirySweeper(pool, bucket, dry_run=True)
+    assert asyncio.run(sweeper.sweep_images(NOW)) == 1
+
+    assert row["id"] in pool.images
+    assert len(stored(bucket, row)) == len(image_object_paths(row))
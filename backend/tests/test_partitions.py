@@ -0,0 +1,49 @@
+from app.services.partitions import (
+    assign_partitions, base_routing_key, is_partitioned, partition_for, partition_routing_key, topic_matches,
+)
+
+MEMBERS = ["worker-a", "worker-b", "worker-c"]
+
+def test_every_partition_has_exactly_one_owner():
+    assignment = assign_partitions(MEMBERS, 64)
+    owned = sorted(p for partitions in assignment.values() for p in partitions)
+
+    assert owned == list(range(64))
+    assert all(assignment[member] for member in MEMBERS)
+
+def test_assignment_does_not_depend_on_member_order():
+    assert assign_partitions(MEMBERS, 32) == assign_partitions(list(reversed(MEMBERS)), 32)
+
+def test_only_a_leaving_members_partitions_move():
+    before = assign_partitions(MEMBERS, 64)
+    after = assign_partitions(MEMBERS[:2], 64)
+
+    for member in MEMBERS[:2]:
+        assert set(before[member]) <= set(after[member])
+    assert set(after["worker-a"] + after["worker-b"]) - set(before["worker-a"] + before["worker-b"]) == set(
+        before["worker-c"]
+    )
+
+def test_no_members():
+    assert assign_partitions([], 8) == {}
+
+def test_partition_routing_keys():
+    partition = partition_for("group-1", 16)
+
+    assert partition == partition_for("group-1", 16)
+    assert partition_routing_key("upload.success", "group-1", 16) == f"upload.success.p{partition}"
+    assert partition_routing_key("upload.batch.started", "group-1", 16) == f"upload.batch.started.p{partition}"
+    # No partition queue is bound for duplicates
+    assert partition_routing_key("upload.duplicate", "group-1", 16) == "upload.duplicate"
+
+def test_base_routing_key():
+    assert base_routing_key("upload.success.p3") == "upload.success"
+    assert base_routing_key("upload.success") == "upload.success"
+    assert base_routing_key("faces.detected") == "faces.detected"
+
+def test_topic_matches():
+    assert topic_matches("upload.success.#", "upload.success")
+    assert topic_matches("upload.success.#", "upload.success.p3")
+    assert topic_matches("upload.batch.*", "upload.batch.started")
+    assert not topic_matches("upload.batch.*", "upload.batch.started.p1")
+    assert is_partitioned("upload.failure") and not is_partitioned("faces.detected")
@@ -0,0 +1,109 @@
+import asyncio
+import io
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from PIL import Image, ImageDraw
+
+from app.services.phash import GroupHashIndex, MultiIndexHash, dhash, to_signed, to_unsigned
+
+T0 = datetime(2024, 1, 1)
+
+class FakePool:
+    """images rows as dicts; counts the queries GroupHashIndex.sync issues"""
+
+    def __init__(self):
+        self.rows = []
+        self.queries = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    def insert(self, image_id, value, group_id="g1", uploaded_at=None):
+        self.rows.append({
+            "id": image_id, "group_id": group_id, "phash": to_signed(value),
+            "uploaded_at": uploaded_at or T0 + timedelta(minutes=len(self.rows)),
+        })
+
+    async def fetch(self, query, group_id, since=None):
+        self.queries += 1
+        return [
+            row for row in self.rows
+            if row["group_id"] == group_id and (since is None or row["uploaded_at"] >= since)
+        ]
+
+    async def fetchval(self, query, group_id):
+        self.queries += 1
+        return sum(1 for row in self.rows if row["group_id"] == group_id)
+
+def test_signed_round_trip():
+    for value in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        assert to_unsigned(to_signed(value)) == value
+        assert -(1 << 63) <= to_signed(value) < (1 << 63)
+
+def test_dhash_is_stable_under_resizing():
+    image = Image.new("L", (400, 300), 0)
+    ImageDraw.Draw(image).ellipse((50, 40, 300, 260), fill=255)
+
+    def encoded(size):
+        buffer = io.BytesIO()
+        image.resize(size).save(buffer, "PNG")
+        return buffer.getvalue()
+
+    assert bin(dhash(encoded((400, 300))) ^ dhash(encoded((200, 150)))).count("1") <= 4
+
+def test_multi_index_matches_brute_force():
+    index = MultiIndexHash()
+    base = 0x0123456789ABCDEF
+    values = [base ^ (1 << bit) for bit in range(0, 64, 5)] + [base ^ 0xFFFF, ~base & ((1 << 64) - 1)]
+    for i, value in enumerate(values):
+        index.add(value, f"id{i}")
+
+    for radius in (0, 1, 6, 16):
+        expected = sorted(
+            (f"id{i}", bin(value ^ base).count("1")) for i, value in enumerate(values)
+            if bin(value ^ base).count("1") <= radius
+        )
+        assert sorted(index.search(base, radius)) == expected
+
+def test_sync_tops_up_incrementally():
+    pool = FakePool()
+    pool.insert("a", 0b1111)
+    index = GroupHashIndex()
+
+    asyncio.run(index.sync(pool, "g1"))
+    pool.insert("b", 0b1110)
+    pool.queries = 0
+    asyncio.run(index.sync(pool, "g1"))
+
+    # Incremental fetch plus the count check; no full reload
+    assert pool.queries == 2
+    assert index.near("g1", 0b1111, exclude="a") == [("b", 1)]
+
+def test_sync_reloads_when_older_rows_gain_a_hash():
+    pool = FakePool()
+    pool.insert("a", 0b1111, uploaded_at=T0 + timedelta(days=1))
+    index = GroupHashIndex()
+    asyncio.run(index.sync(pool, "g1"))
+
+    # Backfilled phash on a row uploaded before the last sync
+    pool.insert("old", 0b0111, uploaded_at=T0)
+    asyncio.run(index.sync(pool, "g1"))
+
+    assert index.lookup("g1", "old") == 0b0111
+
+def test_idle_and_excess_groups_are_evicted():
+    pool = FakePool()
+    for group_id in ("g1", "g2", "g3"):
+        pool.insert(f"{group_id}-a", 1, group_id=group_id)
+    index = GroupHashIndex(max_groups=2, idle_seconds=3600)
+
+    for group_id in ("g1", "g2", "g3"):
+        asyncio.run(index.sync(pool, group_id))
+    assert len(index) == 2 and index.lookup("g1", "g1-a") is None
+
+    index._groups["g2"].last_used = time.time() - 7200
+    index.evict_idle()
+    assert len(index) == 1 and index.lookup("g3", "g3-a") == 1
@@ -0,0 +1,84 @@
+import asyncio
+
+from app.services import retries
+from app.services.retries import HEADER_ORIGIN_QUEUE, HEADER_RETRY_COUNT, HEADER_RETRY_DELAY, IdempotencyCache, RetryPolicy
+
+def test_cache_remembers_ids_until_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(retries.time, "time", lambda: now[0])
+    cache = IdempotencyCache(ttl=60, path=None)
+
+    cache.add("e1")
+    assert cache.seen("e1") and not cache.seen("e2")
+    now[0] += 61
+    assert not cache.seen("e1")
+    assert len(cache) == 0
+
+def test_cache_evicts_least_recently_seen():
+    cache = IdempotencyCache(max_size=2, path=None)
+    cache.add("e1")
+    cache.add("e2")
+    cache.seen("e1")
+    cache.add("e3")
+
+    assert cache.seen("e1") and cache.seen("e3")
+    assert not cache.seen("e2")
+
+def test_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "processed.db")
+    cache = IdempotencyCache(path=path, flush_every=100)
+    cache.add("e1")
+    cache.close()
+
+    assert IdempotencyCache(path=path).seen("e1")
+
+class Message:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+        self.body = b"body"
+        self.content_type = "application/x-msgpack"
+        self.message_id = "m1"
+        self.acked = False
+
+    async def ack(self):
+        self.acked = True
+
+class Exchange:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, message, routing_key):
+        self.published.append((message, routing_key))
+
+class Channel:
+    def __init__(self):
+        self.default_exchange = Exchange()
+
+def policy():
+    retry_policy = RetryPolicy(Channel(), delays=[5, 30])
+    retry_policy.retry_exchange = Exchange()
+    return retry_policy
+
+def test_retry_goes_through_the_next_delay_queue():
+    retry_policy = policy()
+    message = Message({HEADER_RETRY_COUNT: 1})
+
+    asyncio.run(retry_policy.retry(message, "upload_events.p3", RuntimeError("boom")))
+
+    published, routing_key = retry_policy.retry_exchange.published[0]
+    assert message.acked
+    assert routing_key == "upload_events.p3"
+    assert published.headers[HEADER_RETRY_DELAY] == 30
+    assert published.headers[HEADER_RETRY_COUNT] == 2
+    assert published.headers[HEADER_ORIGIN_QUEUE] == "upload_events.p3"
+
+def test_exhausted_retries_are_dead_lettered():
+    retry_policy = policy()
+    message = Message({HEADER_RETRY_COUNT: 2})
+
+    asyncio.run(retry_policy.retry(message, "upload_events.p3", RuntimeError("boom")))
+
+    assert retry_policy.retry_exchange.published == []
+    _, routing_key = retry_policy.channel.default_exchange.published[0]
+    assert routing_key == retries.DEAD_LETTER_QUEUE
+    assert message.acked
@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.services.timeline import FIELD_TAKEN, FIELD_UPLOADED, GroupTimeline, SortedTimeline, _to_us
+
+def timeline(*stamps):
+    times = np.array([np.datetime64(stamp, "us") for stamp in stamps])
+    ids = np.array([f"id{i}" for i in range(len(stamps))], dtype="U36")
+    return SortedTimeline(times, ids)
+
+def test_counts_per_day_and_month():
+    sorted_timeline = timeline(
+        "2024-01-31T23:59:59", "2024-01-01T00:00:00", "2024-03-02T08:00:00",
+        "2024-03-02T09:00:00", "2024-03-15T00:00:00",
+    )
+
+    assert sorted_timeline.counts("month") == [("2024-01", 2), ("2024-03", 3)]
+    assert sorted_timeline.counts("day") == [
+        ("2024-01-01", 1), ("2024-01-31", 1), ("2024-03-02", 2), ("2024-03-15", 1),
+    ]
+
+def test_counts_within_a_range():
+    sorted_timeline = timeline("2024-01-05", "2024-02-05", "2024-02-06", "2024-04-01")
+
+    assert sorted_timeline.counts("month", np.datetime64("2024-02"), np.datetime64("2024-04")) == [
+        ("2024-02", 2),
+    ]
+    assert sorted_timeline.counts("day", start=np.datetime64("2024-02-06")) == [
+        ("2024-02-06", 1), ("2024-04-01", 1),
+    ]
+
+def test_empty_timeline():
+    assert timeline().counts("month") == []
+
+def test_newest_before():
+    sorted_timeline = timeline("2024-01-01", "2024-02-01", "2024-03-01")
+
+    assert sorted_timeline.newest_before(np.datetime64("2024-02-01")) == 0
+    assert sorted_timeline.newest_before(np.datetime64("2024-02-02")) == 1
+    assert sorted_timeline.newest_before(np.datetime64("2023-01-01")) == -1
+
+def test_ties_are_ordered_by_id():
+    times = np.array([np.datetime64("2024-01-01", "us")] * 3)
+    sorted_timeline = SortedTimeline(times, np.array(["c", "a", "b"], dtype="U36"))
+    assert sorted_timeline.ids.tolist() == ["a", "b", "c"]
+
+def test_added_images_use_date_taken_when_known():
+    uploaded = _to_us(datetime(2024, 5, 1, tzinfo=timezone.utc))
+    group = GroupTimeline("g1", [("old", uploaded, uploaded)], aware=True)
+
+    group.add("new", _to_us("2024-06-01T10:00:00"), _to_us("2019-07-04T10:00:00"))
+    group.add("old", uploaded)  # already loaded; not counted twice
+
+    assert group.view(FIELD_UPLOADED).counts("month") == [("2024-05", 1), ("2024-06", 1)]
+    assert group.view(FIELD_TAKEN).counts("month") == [("2019-07", 1), ("2024-05", 1)]
@@ -0,0 +1,61 @@
+import io
+import struct
+
+import pytest
+from PIL import Image
+
+from app.services.validation import InvalidImage, validate_image
+
+def encode(fmt, size=(64, 48), **kwargs):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 10, 10)).save(buffer, fmt, **kwargs)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("fmt, expected", [
+    ("JPEG", "image/jpeg"),
+    ("PNG", "image/png"),
+    ("GIF", "image/gif"),
+    ("WEBP", "image/webp"),
+    ("BMP", "image/bmp"),
+    ("TIFF", "image/tiff"),
+])
+def test_reads_format_and_size_from_header(fmt, expected):
+    header = validate_image(encode(fmt))
+
+    assert header.content_type == expected
+    assert (header.width, header.height) == (64, 48)
+
+def test_progressive_jpeg_size():
+    header = validate_image(encode("JPEG", (320, 200), progressive=True))
+    assert (header.width, header.height) == (320, 200)
+
+def test_large_app_segments_before_frame_header():
+    data = encode("JPEG")
+    # Phones and editors put hundreds of KB of XMP/ICC/MPF before SOF
+    app2 = b"".join(b"\xff\xe2" + struct.pack(">H", 65535) + b"\0" * 65533 for _ in range(6))
+    header = validate_image(data[:2] + app2 + data[2:])
+    assert (header.width, header.height) == (64, 48)
+
+def test_trailing_data_after_end_marker_is_accepted():
+    # Motion Photos append a video after JPEG EOI
+    assert validate_image(encode("JPEG") + b"\0" * 1000).format == "jpeg"
+    assert validate_image(encode("PNG") + b"trailer").format == "png"
+
+def test_truncated_jpeg_is_rejected():
+    data = encode("JPEG", (256, 256))
+    with pytest.raises(InvalidImage, match="truncated"):
+        validate_image(data[:len(data) // 2])
+
+def test_pixel_limit():
+    with pytest.raises(InvalidImage, match="limit"):
+        validate_image(encode("PNG", (100, 100)), max_pixels=9_999)
+
+def test_rejects_non_images():
+    with pytest.raises(InvalidImage, match="recognised"):
+        validate_image(b"%PDF-1.7 " + b"\0" * 100)
+    with pytest.raises(InvalidImage, match="too small"):
+        validate_image(b"\xff\xd8\xff")
+
+def test_avif_is_sniffed_from_its_brand():
+    data = struct.pack(">I", 24) + b"ftypavif" + b"\0" * 4 + b"mif1avif" + b"\0" * 16
+    assert validate_image(data).content_type == "image/avif"
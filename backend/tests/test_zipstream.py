@@ -0,0 +1,91 @@
+import asyncio
+import io
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from app.services import zipstream
+from app.services.zipstream import ZipEntry, ZipStream, parse_range, unique_names
+
+OBJECTS = {
+    "a": b"first object " * 100,
+    "b": b"",
+    "c": bytes(range(256)) * 40,
+}
+
+class Storage:
+    def __init__(self):
+        self.reads = []
+
+    async def fetch(self, path, start, end):
+        self.reads.append((path, start, end))
+        return OBJECTS[path][start:end]
+
+def archive(storage):
+    entries = [
+        ZipEntry(f"{path}.bin", path, len(content), modified=datetime(2024, 5, 1, 12, 30))
+        for path, content in OBJECTS.items()
+    ]
+    return ZipStream(entries, storage.fetch, read_ahead=2)
+
+async def collect(stream, start=0, end=None):
+    return b"".join([chunk async for chunk in stream.stream(start, end)])
+
+@pytest.fixture(autouse=True)
+def empty_crc_cache():
+    zipstream._crc_cache.clear()
+
+def test_full_archive_is_a_valid_zip():
+    stream = archive(Storage())
+    data = asyncio.run(collect(stream))
+
+    assert len(data) == stream.total_size
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert {info.filename: zf.read(info) for info in zf.infolist()} == {
+            f"{path}.bin": content for path, content in OBJECTS.items()
+        }
+
+def test_ranges_slice_the_full_archive():
+    full = asyncio.run(collect(archive(Storage())))
+
+    for start, end in [(0, 10), (5, 1500), (1400, 1500), (len(full) - 30, len(full)), (100, len(full))]:
+        zipstream._crc_cache.clear()
+        assert asyncio.run(collect(archive(Storage()), start, end)) == full[start:end], (start, end)
+
+def test_range_only_reads_the_objects_it_covers():
+    stream = archive(Storage())
+    entry = stream.entries[2]
+    storage = Storage()
+    stream.fetch = storage.fetch
+
+    asyncio.run(collect(stream, entry.data_offset + 10, entry.data_offset + 20))
+
+    assert storage.reads == [("c", 10, 20)]
+
+def test_resume_into_central_directory_fetches_crcs():
+    full = asyncio.run(collect(archive(Storage())))
+    zipstream._crc_cache.clear()
+
+    storage = Storage()
+    stream = archive(storage)
+    tail = asyncio.run(collect(stream, stream.central_offset))
+
+    assert tail == full[stream.central_offset:]
+    assert sorted(path for path, _, _ in storage.reads) == ["a", "b", "c"]
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 10)
+    assert parse_range("bytes=90-", 100) == (90, 100)
+    assert parse_range("bytes=-10", 100) == (90, 100)
+    assert parse_range("bytes=50-500", 100) == (50, 100)
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=0-1,5-6", "items=0-1"])
+def test_parse_range_rejects(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 100)
+
+def test_unique_names():
+    assert unique_names(["a.jpg", "a.jpg", "b", "b", "a.jpg"]) == ["a.jpg", "a (2).jpg", "b", "b (2)", "a (3).jpg"]
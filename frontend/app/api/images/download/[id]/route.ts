@@ -1,5 +1,8 @@
 import { NextRequest, NextResponse } from "next/server";
 import { Pool } from "pg"; // your db helper
+
+const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
+
 export async function GET(req: NextRequest , context: { params: Promise<{ id: string }> }) {
   const { id } = await context.params;
 
@@ -7,13 +10,15 @@ export async function GET(req: NextRequest , context: { params: Promise<{ id: st
     const conn = new Pool({
       connectionString: process.env.DATABASE
     });
-    const result = await conn.query("SELECT location FROM images WHERE id = $1", [id]);
+    const result = await conn.query("SELECT id FROM images WHERE id = $1", [id]);
 
     if (result.rowCount === 0) {
       return NextResponse.json({ error: "Image not found" }, { status: 404 });
     }
 
-    const location = result.rows[0].location;
+    // images.location may point at an original that tiering has deleted; the
+    // backend redirects to the copy that is stored and records the download
+    const location = `${API_URL}/images/images/${result.rows[0].id}/original`;
     return NextResponse.json({ location });
   } catch (err) {
     console.error(err);
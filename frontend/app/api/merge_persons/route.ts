@@ -169,6 +169,15 @@ export async function POST(request: NextRequest): Promise<NextResponse<MergeResp
       // Commit transaction
       await client.query('COMMIT');
 
+      // Keep the backend best-face cache in sync (don't block the response)
+      fetch(`${process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000"}/persons/best-faces/merge`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ merge_person_id, merge_into_person_id }),
+      }).catch(err => {
+        console.error("❌ Failed to update best-face cache after merge:", err);
+      });
+
       // Return success response with operation details
       return NextResponse.json<MergeResponse>({
         success: true,
@@ -1,44 +1,30 @@
 import { NextRequest, NextResponse } from "next/server";
-import { Pool } from "pg";
 
-const pool = new Pool({
-  connectionString: process.env.DATABASE,
-});
+const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
 export async function GET(req: NextRequest) {
   try {
-    const client = await pool.connect();
+    // Served from the backend best-face cache (one entry per person)
+    const ifNoneMatch = req.headers.get("if-none-match");
+    const response = await fetch(`${API_URL}/persons/`, {
+      headers: ifNoneMatch ? { "If-None-Match": ifNoneMatch } : {},
+      cache: "no-store",
+    });
 
-    // Query: get distinct person_id with any one thumb_byte
-    const query = `
-    SELECT DISTINCT ON (person_id) person_id, face_thumb_bytes
-FROM faces
-WHERE person_id IS NOT NULL AND face_thumb_bytes IS NOT NULL
-ORDER BY person_id, quality_score DESC NULLS LAST
-    `;
-    //  const query = `
-    //   SELECT DISTINCT id as person_id, face_thumb_bytes
-    //   FROM persons
-    //   WHERE face_thumb_bytes is not null
-    `;
-    //  const query = `
-    //   SELECT 'abc' as person_id, face_thumb_bytes
-    //   FROM faces
-    //   WHERE face_thumb_bytes is not null
-    // `;
-    const result = await client.query(query);
+    const etag = response.headers.get("etag");
+    const headers: Record<string, string> = { "Cache-Control": "no-cache" };
+    if (etag) headers["ETag"] = etag;
 
-    client.release();
+    if (response.status === 304) {
+      return new NextResponse(null, { status: 304, headers });
+    }
+    if (!response.ok) {
+      throw new Error(`Backend responded with ${response.status}`);
+    }
 
-    // Convert Buffer -> base64 string
-    const formattedRows = result.rows.map((row) => ({
-      person_id: row.person_id,
-      face_thumb_bytes: row.face_thumb_bytes
-        ? Buffer.from(row.face_thumb_bytes).toString("base64")
-        : "",
-    }));
-
-    return NextResponse.json(formattedRows, { status: 200 });
+    // [{ person_id, face_thumb_bytes (base64) }]
+    const persons = await response.json();
+    return NextResponse.json(persons, { status: 200, headers });
   } catch (err) {
     console.error("Error fetching person IDs:", err);
     return NextResponse.json(
@@ -1,80 +1,19 @@
 import { NextResponse } from "next/server";
-import { Pool } from "pg";
 
-const pool = new Pool({
-  connectionString: process.env.DATABASE,
-});
+const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
 export async function GET() {
   try {
-    const client = await pool.connect();
-
-    const query = `
-      SELECT 
-        main_person.person_id,
-        main_person.face_thumb_bytes as thumbnail,
-        JSON_AGG(
-          JSON_BUILD_OBJECT(
-            'sim_person_id', sf.similar_person_id,
-            'thumb_img_byte', similar_person.face_thumb_bytes
-          )
-        ) as sim_faces
-      FROM (
-        -- Get best thumbnail for each main person
-        SELECT DISTINCT
-          person_id,
-          FIRST_VALUE(face_thumb_bytes) OVER (
-            PARTITION BY person_id 
-            ORDER BY quality_score DESC NULLS LAST, id
-          ) as face_thumb_bytes
-        FROM faces
-        WHERE person_id IN (SELECT DISTINCT person_id::uuid FROM similar_faces)
-          AND face_thumb_bytes IS NOT NULL
-      ) main_person
-      JOIN similar_faces sf ON sf.person_id::uuid = main_person.person_id
-      JOIN (
-        -- Get best thumbnail for each similar person
-        SELECT DISTINCT
-          person_id::uuid,
-          FIRST_VALUE(encode(face_thumb_bytes,'base64')) OVER (
-            PARTITION BY person_id 
-            ORDER BY quality_score DESC NULLS LAST, id
-          ) as face_thumb_bytes
-        FROM faces
-        WHERE face_thumb_bytes IS NOT NULL
-      ) similar_person ON similar_person.person_id = sf.similar_person_id::uuid
-      GROUP BY main_person.person_id, main_person.face_thumb_bytes
-      ORDER BY main_person.person_id; 
-    `;
-
-    const result = await client.query(query);
-    client.release();
-
-    // Define types for better TypeScript support
-    interface SimFace {
-      sim_person_id: string;
-      thumb_img_byte: Buffer | null;
+    // Thumbnails come from the backend best-face cache instead of a
+    // FIRST_VALUE scan over every face on each request
+    const response = await fetch(`${API_URL}/persons/similar`, { cache: "no-store" });
+    if (!response.ok) {
+      throw new Error(`Backend responded with ${response.status}`);
     }
 
-    interface QueryRow {
-      person_id: string;
-      thumbnail: Buffer | null;
-      sim_faces: SimFace[];
-    }
-
-    // Format the response according to desired structure
-    const formattedData = result.rows.map((row: QueryRow) => ({
-      person_id: row.person_id,
-      thumbnail: row.thumbnail 
-        ? Buffer.from(row.thumbnail).toString("base64")
-        : "",
-      sim_faces: (row.sim_faces || []).map((simFace: SimFace) => ({
-        sim_person_id: simFace.sim_person_id,
-        thumb_img_byte: simFace.thumb_img_byte
-      }))
-    }));
-
-    return NextResponse.json({ data: formattedData });
+    // { data: [{ person_id, thumbnail, sim_faces: [{ sim_person_id, thumb_img_byte }] }] }
+    const result = await response.json();
+    return NextResponse.json({ data: result.data });
   } catch (error) {
     console.error("Error fetching similar faces:", error);
     return NextResponse.json(
@@ -82,4 +21,4 @@ export async function GET() {
       { status: 500 }
     );
   }
-}
\ No newline at end of file
+}
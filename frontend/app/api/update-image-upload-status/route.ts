@@ -8,48 +8,40 @@ const pool = new Pool({
 export async function POST(req: NextRequest) {
   try {
     const { userId, groupId, images } = await req.json();
-    const client = await pool.connect();
+    if (images.length > 500) {
+      return NextResponse.json({ message: 'At most 500 images per request' }, { status: 400 });
+    }
 
-   const insertQuery = `
-  INSERT INTO images (
-    id,
-    group_id, 
-    filename, 
-    location, 
-    delete_at, 
-    status, 
-    json_meta_data, 
-    thumb_byte, 
-    image_byte, 
-    uploaded_at, 
-    last_accessed_at, 
-    last_downloaded_at,  
-    created_by_user,
-    size
-  )
-  VALUES ($1, $2, $3, $4, $5, $6, $7 , $8 , $9 , $10 , $11 , $12 , $13 , $14)
-`;
+    // One multi-row INSERT per request instead of one round-trip per image
+    const values: any[] = [];
+    const rows = images.map((img: any, i: number) => {
+      const base = i * 7;
+      values.push(img.id, groupId, img.filename, img.location, img.uploaded_at, userId, img.size);
+      return `($${base + 1}, $${base + 2}, $${base + 3}, $${base + 4}, 'hot', $${base + 5}, $${base + 6}, $${base + 7})`;
+    });
 
-for (const img of images) {
-  await client.query(insertQuery, [
-    img.id,
-    groupId,             
-    img.filename,        
-    img.location,        
-    null,                
-    "hot",               
-    null,                
-    null,                
-    null,                
-    img.uploaded_at,     
-    null,                
-    null,                       
-    userId,
-    img.size                    
-  ]);
-}
+    if (rows.length > 0) {
+      const client = await pool.connect();
+      try {
+        await client.query(
+          `INSERT INTO images (
+            id,
+            group_id,
+            filename,
+            location,
+            status,
+            uploaded_at,
+            created_by_user,
+            size
+          )
+          VALUES ${rows.join(", ")}`,
+          values
+        );
+      } finally {
+        client.release();
+      }
+    }
 
-    client.release();
     return NextResponse.json({ message: 'Uploaded metadata stored successfully' });
   } catch (error) {
     console.error(error);
@@ -6,6 +6,7 @@ import Image from "next/image";
 import ImageGallery, { ReactImageGalleryItem } from "react-image-gallery";
 import "react-image-gallery/styles/css/image-gallery.css";
 
+const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
 type ImageItem = {
     id: string;
@@ -84,6 +85,15 @@ export default function GroupGallery() {
         }
     }, [groupId, page, hasMore, loading, preloadImage]);
 
+    // Views and downloads keep an image in the hot storage tier
+    const recordAccess = useCallback((imageId: string, downloaded: boolean) => {
+        fetch(`${API_URL}/images/access`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ image_ids: [imageId], downloaded }),
+        }).catch((err) => console.error("Failed to record access", err));
+    }, []);
+
     // Helper function to download from Firebase URL with CORS handling
     const downloadFromFirebaseUrl = useCallback(async (url: string, filename: string) => {
         try {
@@ -108,43 +118,13 @@ export default function GroupGallery() {
     // Download compressed image via backend proxy
     const downloadCompressed = useCallback(async () => {
         try {
-            const response = await fetch('/api/images/download', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    filename: 'compressed_' + images[currentIndex].id,
-                })
-            });
+            recordAccess(images[currentIndex].id, true);
 
-            const { downloadUrl } = await response.json();
-
-            // Fetch the actual file as blob
-            const fileResp = await fetch(downloadUrl);
-            const blob = await fileResp.blob();
-            const url = window.URL.createObjectURL(blob);
-
-            // Trigger download
-            const link = document.createElement('a');
-            link.href = url;
-            link.download = images[currentIndex].filename || "image.jpg";
-            document.body.appendChild(link);
-            link.click();
-            document.body.removeChild(link);
-
-            window.URL.revokeObjectURL(url);
-        } catch (error) {
-            console.error('Download failed:', error);
-        }
-    }, [images, currentIndex]);
-
-    // Download original image via backend proxy
-    const downloadOriginal = useCallback(async () => {
-        try {
             const response = await fetch('/api/images/download', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
-                    filename: images[currentIndex].id,
+                    filename: 'compressed_' + images[currentIndex].id,
                 })
             });
 
@@ -167,6 +147,17 @@ export default function GroupGallery() {
         } catch (error) {
             console.error('Download failed:', error);
         }
+    }, [images, currentIndex, recordAccess]);
+
+    // Download the original through the backend: it redirects to whichever copy
+    // tiering left in storage and records the download
+    const downloadOriginal = useCallback(() => {
+        const link = document.createElement('a');
+        link.href = `${API_URL}/images/images/${images[currentIndex].id}/original`;
+        link.download = images[currentIndex].filename || "image.jpg";
+        document.body.appendChild(link);
+        link.click();
+        document.body.removeChild(link);
     }, [images, currentIndex]);
 
 
@@ -190,6 +181,13 @@ export default function GroupGallery() {
         };
     }, [fetchImages, loading]);
 
+    // Record a view for each image shown in the carousel
+    useEffect(() => {
+        if (isOpen && images[currentIndex]) {
+            recordAccess(images[currentIndex].id, false);
+        }
+    }, [isOpen, currentIndex, images, recordAccess]);
+
     // ✅ Close on Esc
     useEffect(() => {
         const handleEsc = (e: KeyboardEvent) => {
@@ -127,8 +127,9 @@ export default function ImageUploader() {
 
             setFilesMeta(filtered);
 
-            // Send metadata in chunks of 20
-            const chunkSize = 20;
+            // The route stores each request with one multi-row INSERT; 500 rows
+            // (7 parameters each) stay well under Postgres' 65535-parameter limit
+            const chunkSize = 500;
             for (let i = 0; i < filtered.length; i += chunkSize) {
                 const chunk = filtered.slice(i, i + chunkSize);
                 try {